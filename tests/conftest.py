@@ -0,0 +1,67 @@
+"""Shared fixtures for xeen tests."""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from xeen.session_store import get_meta_cache, save_session_meta
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Osobny katalog danych xeen (XEEN_DATA_DIR) na test, z pustym cache metadanych."""
+    d = tmp_path / "xeen"
+    d.mkdir()
+    monkeypatch.setenv("XEEN_DATA_DIR", str(d))
+    get_meta_cache().clear()
+    yield d
+    get_meta_cache().clear()
+
+
+@pytest.fixture
+def make_frame(data_dir):
+    """Zapisz klatkę PNG do ``sessions/<name>/frames/``; zwraca jej ścieżkę."""
+    def make(name: str = "s1", filename: str = "frame_0000.png", image: Image.Image | None = None,
+             size=(640, 360), color="blue") -> Path:
+        frames = data_dir / "sessions" / name / "frames"
+        frames.mkdir(parents=True, exist_ok=True)
+        path = frames / filename
+        (image or Image.new("RGB", size, color)).save(path, "PNG")
+        return path
+    return make
+
+
+@pytest.fixture
+def make_session(data_dir, make_frame):
+    """Sesja z klatkami ``frame_NNNN.png`` i metadanymi; zwraca jej katalog.
+
+    ``frames`` holds one color or ``Image`` per frame. Each frame entry gets
+    its index, filename and size, merged with ``frame_meta[i]``; other
+    keyword arguments go into the session metadata. ``legacy=True`` writes a
+    single-file session.json instead of the split layout.
+    """
+    def make(name: str = "s1", frames=("red", "green", "blue"), size=(40, 30),
+             frame_meta: list[dict] | None = None, legacy: bool = False, **meta) -> Path:
+        entries = []
+        for i, frame in enumerate(frames):
+            image = frame if isinstance(frame, Image.Image) else Image.new("RGB", size, frame)
+            filename = f"frame_{i:04d}.png"
+            make_frame(name, filename, image)
+            entries.append({"index": i, "filename": filename, "width": image.width,
+                            "height": image.height, **(frame_meta[i] if frame_meta else {})})
+        doc = {"name": name, "created_at": "2025-01-01T00:00:00", "duration": float(len(entries)),
+               "frame_count": len(entries), "settings": {"source": "test"}, "frames": entries, **meta}
+        sdir = data_dir / "sessions" / name
+        sdir.mkdir(parents=True, exist_ok=True)
+        if legacy:
+            (sdir / "session.json").write_text(json.dumps(doc))
+        else:
+            save_session_meta(name, doc)
+        return sdir
+    return make
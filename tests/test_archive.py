@@ -0,0 +1,114 @@
+"""Tests for archive.py — packed single-file session archives."""
+
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from xeen.archive import (
+    ARCHIVE_FILENAME,
+    available_frames,
+    cold_sessions,
+    is_packed,
+    open_frame_image,
+    pack_session,
+    read_frame_bytes,
+    unpack_session,
+)
+
+
+@pytest.fixture
+def packable(make_session):
+    """Jednoplikowa sesja z miniaturami i podglądem (pliki pochodne poza archiwum)."""
+    def make(name="s1"):
+        sdir = make_session(name, legacy=True)
+        (sdir / "thumbs").mkdir()
+        (sdir / "preview").mkdir()
+        for i in range(3):
+            (sdir / "thumbs" / f"frame_{i:04d}_thumb.webp").write_bytes(b"thumb%d" % i)
+        (sdir / "preview" / "crop_0000.png").write_bytes(b"derived")
+        return sdir
+    return make
+
+
+class TestPackUnpack:
+    def test_pack_moves_frames_into_archive(self, packable):
+        sdir = packable()
+        original = (sdir / "frames" / "frame_0001.png").read_bytes()
+
+        result = pack_session("s1")
+        assert result["members"] == 6
+        assert is_packed("s1")
+        assert not (sdir / "frames").exists()
+        assert not (sdir / "thumbs").exists()
+        assert not (sdir / "preview").exists()
+        assert (sdir / "session.json").exists()
+
+        assert read_frame_bytes("s1", "frame_0001.png") == original
+        assert read_frame_bytes("s1", "frame_0002_thumb.webp", "thumbs") == b"thumb2"
+        assert open_frame_image("s1", "frame_0000.png").size == (40, 30)
+        assert available_frames("s1") == {f"frame_{i:04d}.png" for i in range(3)}
+
+    def test_repack_merges_new_loose_frames(self, packable):
+        sdir = packable()
+        pack_session("s1")
+        (sdir / "frames").mkdir()
+        Image.new("RGB", (40, 30), "white").save(sdir / "frames" / "frame_0003.png", "PNG")
+        assert "frame_0003.png" in available_frames("s1")
+
+        pack_session("s1")
+        assert available_frames("s1") == {f"frame_{i:04d}.png" for i in range(4)}
+        assert not (sdir / "frames").exists()
+
+    def test_unpack_restores_loose_files(self, packable):
+        sdir = packable()
+        original = (sdir / "frames" / "frame_0002.png").read_bytes()
+        pack_session("s1")
+
+        assert unpack_session("s1")["members"] == 6
+        assert not (sdir / ARCHIVE_FILENAME).exists()
+        assert (sdir / "frames" / "frame_0002.png").read_bytes() == original
+        assert (sdir / "thumbs" / "frame_0000_thumb.webp").read_bytes() == b"thumb0"
+
+    def test_missing_frame_raises(self, packable):
+        packable()
+        pack_session("s1")
+        with pytest.raises(FileNotFoundError):
+            read_frame_bytes("s1", "nope.png")
+
+    def test_cold_sessions(self, packable):
+        sdir = packable("old")
+        packable("new")
+        past = time.time() - 40 * 86400
+        for p in [sdir / "session.json", *(sdir / "frames").iterdir()]:
+            os.utime(p, (past, past))
+        assert cold_sessions(30) == ["old"]
+
+
+class TestServePacked:
+    def test_api_serves_packed_session(self, packable):
+        from fastapi.testclient import TestClient
+        from xeen.server import app
+
+        sdir = packable()
+        original = (sdir / "frames" / "frame_0000.png").read_bytes()
+        pack_session("s1")
+        client = TestClient(app)
+
+        res = client.get("/api/sessions/s1/frames/frame_0000.png")
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "image/png"
+        assert res.headers["content-length"] == str(len(original))
+        assert res.content == original
+
+        res = client.get("/api/sessions/s1/thumbs/frame_0001_thumb.webp")
+        assert res.content == b"thumb1"
+
+        meta = client.get("/api/sessions/s1").json()
+        assert "_missing_frames" not in meta
+
+        res = client.post("/api/sessions/s1/crop-preview",
+                          json={"preset": None, "custom_w": 20, "custom_h": 20})
+        assert res.status_code == 200
+        assert len(res.json()["previews"]) == 3
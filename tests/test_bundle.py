@@ -0,0 +1,126 @@
+"""Tests for bundle.py — streaming session import/export."""
+
+import gzip
+import io
+import os
+import json
+import tarfile
+
+import pytest
+from PIL import Image
+
+from xeen.bundle import BundleError, import_bundle, iter_bundle, write_bundle
+from xeen.session_store import ALL_FIELDS, load_session_meta
+
+
+@pytest.fixture
+def session(make_session):
+    """Sesja s1 ze wszystkimi częściami metadanych (OCR, zdarzenia, napisy, środki)."""
+    return make_session(
+        frames=("red", "green"), size=(32, 24),
+        frame_meta=[{"ocr_text": f"ocr {i}", "input_events": [{"kind": "mouse_click"}]} for i in range(2)],
+        input_log=[{"kind": "key_press"}],
+        captions=[{"id": "c1", "text": "hello"}],
+        custom_centers={"0": {"x": 5, "y": 6}},
+    )
+
+
+def _bundle_bytes(name="s1") -> bytes:
+    buf = io.BytesIO()
+    write_bundle(name, buf)
+    return buf.getvalue()
+
+
+class TestBundleRoundTrip:
+    def test_export_import_preserves_metadata_and_frames(self, session, data_dir):
+        data = _bundle_bytes()
+
+        result = import_bundle(io.BytesIO(data), name="copy")
+        assert result == {"name": "copy", "frame_count": 2, "source": "s1"}
+
+        meta = load_session_meta("copy", fields=ALL_FIELDS)
+        assert meta["name"] == "copy"
+        assert meta["captions"] == [{"id": "c1", "text": "hello"}]
+        assert meta["custom_centers"]["0"] == {"x": 5, "y": 6}
+        assert meta["frames"][1]["ocr_text"] == "ocr 1"
+        assert meta["input_log"] == [{"kind": "key_press"}]
+        assert len(meta["frames"][0]["sha256"]) == 64
+        src = data_dir / "sessions" / "s1" / "frames" / "frame_0001.png"
+        dst = data_dir / "sessions" / "copy" / "frames" / "frame_0001.png"
+        assert src.read_bytes() == dst.read_bytes()
+
+    def test_export_is_chunked(self, session, data_dir):
+        noise = Image.frombytes("RGB", (256, 256), os.urandom(256 * 256 * 3))
+        noise.save(data_dir / "sessions" / "s1" / "frames" / "frame_0000.png", "PNG")
+        chunks = list(iter_bundle("s1"))
+        assert len(chunks) > 2
+        assert gzip.decompress(b"".join(chunks))
+
+    def test_missing_session_raises(self, data_dir):
+        with pytest.raises(FileNotFoundError):
+            iter_bundle("nope")
+
+    def test_existing_target_is_rejected(self, session):
+        with pytest.raises(FileExistsError):
+            import_bundle(io.BytesIO(_bundle_bytes()))
+
+
+class TestBundleValidation:
+    def _staging_left(self, data_dir):
+        return [p.name for p in (data_dir / "sessions").iterdir() if p.name.startswith(".")]
+
+    def test_truncated_bundle_leaves_nothing(self, session, data_dir):
+        data = _bundle_bytes()
+        with pytest.raises(BundleError):
+            import_bundle(io.BytesIO(data[: len(data) // 2]), name="copy")
+        assert not (data_dir / "sessions" / "copy").exists()
+        assert self._staging_left(data_dir) == []
+
+    def test_tampered_frame_fails_checksum(self, session, data_dir):
+        raw = gzip.decompress(_bundle_bytes())
+        src = tarfile.open(fileobj=io.BytesIO(raw))
+        out = io.BytesIO()
+        with tarfile.open(fileobj=out, mode="w") as dst:
+            for m in src.getmembers():
+                data = src.extractfile(m).read()
+                if m.name == "frames/frame_0000.png":
+                    data = data[:-1] + bytes([data[-1] ^ 0xFF])
+                dst.addfile(m, io.BytesIO(data))
+        with pytest.raises(BundleError, match="Checksum"):
+            import_bundle(io.BytesIO(out.getvalue()), name="copy")
+        assert self._staging_left(data_dir) == []
+
+    def test_path_traversal_is_rejected(self, data_dir):
+        out = io.BytesIO()
+        with tarfile.open(fileobj=out, mode="w:gz") as tar:
+            manifest = json.dumps({"version": 1, "name": "evil",
+                                   "frames": [{"filename": "../../x.png", "size": 1}]}).encode()
+            info = tarfile.TarInfo("xeen-bundle.json")
+            info.size = len(manifest)
+            tar.addfile(info, io.BytesIO(manifest))
+        with pytest.raises(BundleError):
+            import_bundle(io.BytesIO(out.getvalue()))
+
+    def test_not_a_bundle(self, data_dir):
+        with pytest.raises(BundleError):
+            import_bundle(io.BytesIO(b"definitely not a tarball"))
+
+
+class TestBundleAPI:
+    def test_http_round_trip(self, session):
+        from fastapi.testclient import TestClient
+        from xeen.server import app
+
+        client = TestClient(app)
+        res = client.get("/api/sessions/s1/bundle")
+        assert res.status_code == 200
+        assert "s1.xeen.tgz" in res.headers["content-disposition"]
+
+        res2 = client.post("/api/sessions/import?name=moved", content=res.content)
+        assert res2.status_code == 200
+        assert res2.json()["frame_count"] == 2
+        assert client.get("/api/sessions/moved").json()["captions"][0]["text"] == "hello"
+
+        assert client.post("/api/sessions/import?name=moved", content=res.content).status_code == 409
+        assert client.post("/api/sessions/import", content=b"garbage").status_code == 400
+        assert client.get("/api/sessions/nope/bundle").status_code == 404
@@ -0,0 +1,133 @@
+"""Tests for camera.py and ffmpeg_pipe.py — virtual camera rendered into a raw pipe."""
+
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from xeen import camera, ffmpeg_pipe
+from xeen.crop_plan import plan_crops
+
+
+def _cat_command(output: Path) -> list[str]:
+    """Zamiast ffmpeg: proces kopiujący stdin do pliku wyjściowego."""
+    script = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+    return [sys.executable, "-c", script, str(output)]
+
+
+class TestEasing:
+    @pytest.mark.parametrize("name", sorted(camera.EASINGS))
+    def test_endpoints_and_monotonic(self, name):
+        ease = camera.EASINGS[name]
+        values = [ease(i / 20) for i in range(21)]
+        assert values[0] == pytest.approx(0) and values[-1] == pytest.approx(1)
+        assert values == sorted(values)
+
+    def test_ease_in_out_is_symmetric(self):
+        ease = camera.EASINGS["ease_in_out"]
+        assert ease(0.5) == pytest.approx(0.5)
+        assert ease(0.2) == pytest.approx(1 - ease(0.8))
+
+
+class TestCameraPath:
+    def test_hold_then_pan_to_next_shot(self):
+        a = camera.Shot("a.png", 100, 100, 200, 100)
+        b = camera.Shot("b.png", 300, 100, 100, 50)
+        path = list(camera.camera_path([a, b], fps=10, hold=1.0, pan=0.4, easing="linear"))
+        assert len(path) == 20
+        assert [mix for _, mix, _ in path[:6]] == [0.0] * 6
+        moving = path[6:10]
+        assert [i for i, _, _ in moving] == [0] * 4
+        assert [round(mix, 2) for _, mix, _ in moving] == [0.2, 0.4, 0.6, 0.8]
+        xs = [w[0] for _, _, w in moving]
+        assert xs == sorted(xs) and 100 < xs[0] < xs[-1] < 300
+        # Zoom geometrycznie: połowa drogi = średnia geometryczna szerokości
+        assert camera._between(a, b, 0.5)[2] == pytest.approx((200 * 100) ** 0.5)
+        assert all(i == 1 and mix == 0.0 for i, mix, _ in path[10:])
+
+    def test_window_box_stays_inside_image(self):
+        assert camera.window_box((10, 10, 100, 50), (400, 200)) == (0.0, 0.0, 100.0, 50.0)
+        assert camera.window_box((390, 190, 100, 50), (400, 200)) == (300.0, 150.0, 400.0, 200.0)
+        left, top, right, bottom = camera.window_box((200, 100, 800, 400), (400, 200))
+        assert (left, top, right, bottom) == (0.0, 0.0, 400.0, 200.0)
+
+    def test_pointer_centers_prefer_last_click(self):
+        frames = [
+            {"filename": "a.png", "input_events": [
+                {"kind": "mouse_click", "x": 10, "y": 20},
+                {"kind": "mouse_move", "x": 30, "y": 40},
+                {"kind": "key_press", "key": "a"},
+            ]},
+            {"filename": "b.png", "input_events": [{"kind": "mouse_move", "x": 5, "y": 6}]},
+            {"filename": "c.png", "input_events": [{"kind": "key_press", "key": "b"}]},
+        ]
+        assert camera.pointer_centers(frames, [0, 1, 2, 7]) == {
+            "0": {"x": 10, "y": 20}, "1": {"x": 5, "y": 6},
+        }
+
+    def test_shots_from_plan_apply_custom_zoom(self):
+        frames = [{"filename": "a.png", "width": 400, "height": 200}]
+        custom = {"0": {"x": 200, "y": 100, "zoom": 2}}
+        plan = plan_crops(frames, [0], 100, 50, custom_centers=custom)
+        (shot,) = camera.shots_from_plan(plan, frames, custom)
+        assert (shot.cx, shot.cy, shot.w, shot.h) == (200, 100, 200, 100)
+
+
+class TestRenderCamera:
+    def test_decodes_each_source_once_and_reuses_held_frames(self, make_session, monkeypatch):
+        make_session(frames=((255, 0, 0), (0, 0, 255)), size=(400, 200))
+        decodes = []
+        real = camera.open_frame_image
+
+        def counting(name, filename, *args):
+            decodes.append(filename)
+            return real(name, filename, *args)
+
+        monkeypatch.setattr(camera, "open_frame_image", counting)
+        shots = [camera.Shot("frame_0000.png", 200, 100, 400, 200),
+                 camera.Shot("missing.png", 200, 100, 400, 200),
+                 camera.Shot("frame_0001.png", 200, 100, 400, 200)]
+        shots = camera.available_shots("s1", shots)
+        assert [s.filename for s in shots] == ["frame_0000.png", "frame_0001.png"]
+        assert camera.path_length(shots, fps=10, hold=0.5) == 10
+        finished = []
+        frames = list(camera.render_camera("s1", shots, (40, 20), fps=10, hold=0.5, pan=0.2,
+                                           finish=lambda img: finished.append(img) or img))
+        # Nagłówki (sprawdzenie źródeł) + jedno pełne dekodowanie na klatkę
+        assert decodes.count("frame_0000.png") == 2 and decodes.count("frame_0001.png") == 2
+        assert len(frames) == 10
+        assert frames[0] is frames[2]
+        assert len(finished) == 1 + 2 + 1  # trzymanie, 2 klatki przejazdu, trzymanie
+        assert frames[0].getpixel((20, 10)) == (255, 0, 0)
+        r, _, b = frames[3].getpixel((20, 10))
+        assert 0 < r < 255 and 0 < b < 255
+        assert frames[-1].getpixel((20, 10)) == (0, 0, 255)
+
+
+class TestRawVideoWriter:
+    def test_frames_streamed_to_stdin(self, tmp_path):
+        out = tmp_path / "raw.bin"
+        frames = [Image.new("RGB", (4, 2), (i, i, i)) for i in range(3)]
+        count = ffmpeg_pipe.encode_frames(frames, out, (4, 2), 25, [], cmd=_cat_command(out))
+        assert count == 3
+        assert out.read_bytes() == b"".join(f.tobytes() for f in frames)
+
+    def test_rawvideo_command(self, tmp_path):
+        cmd = ffmpeg_pipe.rawvideo_command(tmp_path / "o.mp4", (1080, 1920), 25, ["-c:v", "libx264"])
+        assert cmd[cmd.index("-f") + 1] == "rawvideo"
+        assert cmd[cmd.index("-s") + 1] == "1080x1920"
+        assert cmd[cmd.index("-i") + 1] == "-"
+
+    def test_encoder_failure_raises(self, tmp_path):
+        cmd = [sys.executable, "-c", "import sys; sys.stderr.write('bad codec'); sys.exit(3)"]
+        with pytest.raises(RuntimeError, match="bad codec"):
+            with ffmpeg_pipe.RawVideoWriter(cmd, (4, 2)) as writer:
+                for _ in range(10000):
+                    writer.write(bytes(24))
+
+    def test_wrong_frame_size_rejected(self, tmp_path):
+        out = tmp_path / "raw.bin"
+        with pytest.raises(ValueError):
+            ffmpeg_pipe.encode_frames([Image.new("RGB", (3, 3))], out, (4, 2), 25, [],
+                                      cmd=_cat_command(out))
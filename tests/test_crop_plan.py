@@ -0,0 +1,93 @@
+"""Tests for crop_plan.py — vectorized crop-rectangle planning."""
+
+import random
+
+import pytest
+
+from xeen.crop_plan import plan_crops
+
+
+def _reference(frame, iw, ih, target_w, target_h, focus_mode, zoom, padding, custom):
+    """Poprzednia (skalarna) implementacja z crop_preview — punkt odniesienia."""
+    if custom:
+        cx, cy = custom["x"], custom["y"]
+    elif focus_mode == "mouse":
+        cx, cy = frame.get("mouse_x", iw // 2), frame.get("mouse_y", ih // 2)
+    elif focus_mode == "keyboard":
+        cx, cy = frame.get("suggested_center_x", iw // 2), int(ih * 0.75)
+    elif focus_mode == "application":
+        cx, cy = frame.get("suggested_center_x", iw // 2), int(ih * 0.25)
+    else:
+        cx = frame.get("suggested_center_x", iw // 2)
+        cy = frame.get("suggested_center_y", ih // 2)
+    aspect = target_w / target_h
+    if focus_mode == "mouse":
+        base = (padding / 100.0) * min(iw, ih) / zoom
+        if aspect >= 1:
+            crop_h = int(base)
+            crop_w = int(crop_h * aspect)
+        else:
+            crop_w = int(base)
+            crop_h = int(crop_w / aspect)
+    elif iw / ih > aspect:
+        crop_h = int(ih / zoom)
+        crop_w = int(crop_h * aspect)
+    else:
+        crop_w = int(iw / zoom)
+        crop_h = int(crop_w / aspect)
+    if crop_w > iw:
+        crop_w = iw
+        crop_h = int(crop_w / aspect)
+    if crop_h > ih:
+        crop_h = ih
+        crop_w = int(crop_h * aspect)
+    crop_w, crop_h = max(1, crop_w), max(1, crop_h)
+    left = max(0, min(cx - crop_w // 2, iw - crop_w))
+    top = max(0, min(cy - crop_h // 2, ih - crop_h))
+    return left, top, left + crop_w, top + crop_h
+
+
+@pytest.mark.parametrize("focus_mode", ["screen", "mouse", "keyboard", "application"])
+@pytest.mark.parametrize("target", [(1920, 1080), (1080, 1920), (1080, 1080)])
+def test_matches_scalar_reference(focus_mode, target):
+    rng = random.Random(42)
+    frames, custom = [], {}
+    for i in range(60):
+        iw, ih = rng.choice([(1920, 1080), (2560, 1440), (1280, 1024), (800, 1280)])
+        frame = {"index": i, "filename": f"frame_{i:04d}.png", "width": iw, "height": ih}
+        if rng.random() < 0.8:
+            frame.update(mouse_x=rng.randrange(iw), mouse_y=rng.randrange(ih),
+                         suggested_center_x=rng.randrange(iw), suggested_center_y=rng.randrange(ih))
+        if rng.random() < 0.2:
+            custom[str(i)] = {"x": rng.randrange(iw), "y": rng.randrange(ih)}
+        frames.append(frame)
+
+    for zoom, padding in [(1.0, 100), (2.5, 40), (7.0, 300)]:
+        plan = plan_crops(frames, list(range(len(frames))), *target, focus_mode=focus_mode,
+                          zoom_level=zoom, mouse_padding=padding, custom_centers=custom)
+        for idx, box in plan:
+            f = frames[idx]
+            expected = _reference(f, f["width"], f["height"], *target, focus_mode, zoom,
+                                  padding, custom.get(str(idx)))
+            assert box == expected, (idx, zoom)
+
+
+def test_out_of_range_indices_dropped_and_sizes_fallback():
+    frames = [{"filename": "a.png"}, {"filename": "b.png", "width": 100, "height": 100}]
+    seen = []
+
+    def size_of(frame):
+        seen.append(frame["filename"])
+        return 400, 200
+
+    plan = plan_crops(frames, [0, 1, 5], 100, 100, size_of=size_of)
+    assert plan.indices.tolist() == [0, 1]
+    assert seen == ["a.png"]
+    assert plan.box(0) == (100, 0, 300, 200)
+    assert plan.rect(1) == {"index": 1, "crop": {"left": 0, "top": 0, "w": 100, "h": 100},
+                            "center": {"x": 50, "y": 50}}
+
+
+def test_empty_plan():
+    plan = plan_crops([], [0, 1], 1920, 1080)
+    assert len(plan) == 0 and list(plan) == []
@@ -0,0 +1,111 @@
+"""Tests for crop_render.py — decode-once fan-out rendering of crops."""
+
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from xeen import crop_render
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(crop_render, "_executor", pool)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def decodes(monkeypatch, thread_pool):
+    calls = []
+    real = crop_render.open_frame_image
+
+    def counting(name, filename, *args):
+        calls.append(filename)
+        return real(name, filename, *args)
+
+    monkeypatch.setattr(crop_render, "open_frame_image", counting)
+    return calls
+
+
+@pytest.fixture
+def session(make_session):
+    """Sesja s1 z ``frames`` klatkami 400×200 i pustym katalogem preview/."""
+    def make(frames=2):
+        sdir = make_session(frames=[(i * 80, 100, 200) for i in range(frames)], size=(400, 200))
+        (sdir / "preview").mkdir()
+        return sdir
+    return make
+
+
+def _outputs(sdir: Path, filename: str):
+    stem = filename[:-4]
+    return [
+        crop_render.output_spec(sdir / "preview" / f"{stem}_sq.png", (100, 0, 300, 200), (50, 50), f"{stem}-sq"),
+        crop_render.output_spec(sdir / "preview" / f"{stem}_wide.png", (0, 0, 400, 200), (80, 40), f"{stem}-wide"),
+        crop_render.output_spec(sdir / "preview" / f"{stem}_tall.png", (150, 0, 250, 200), (20, 40), f"{stem}-tall"),
+    ]
+
+
+class TestRenderFrames:
+    def test_each_frame_decoded_once_for_all_outputs(self, session, decodes):
+        sdir = session()
+        jobs = {fn: _outputs(sdir, fn) for fn in ("frame_0000.png", "frame_0001.png")}
+        done = crop_render.render_frames("s1", jobs)
+        assert sorted(decodes) == ["frame_0000.png", "frame_0001.png"]
+        assert done["frame_0000.png"] == [crop_render.RENDERED] * 3
+        assert Image.open(sdir / "preview" / "frame_0001_tall.png").size == (20, 40)
+
+        decodes.clear()
+        again = crop_render.render_frames("s1", jobs)
+        assert decodes == []
+        assert again["frame_0001.png"] == [crop_render.REUSED] * 3
+
+    def test_process_pool_renders_in_order(self, session, monkeypatch):
+        monkeypatch.setattr(crop_render.config, "RENDER_POOL", "process")
+        monkeypatch.setattr(crop_render.config, "RENDER_WORKERS", 2)
+        monkeypatch.setattr(crop_render, "_executor", None)
+        sdir = session(frames=3)
+        names = [f"frame_{i:04d}.png" for i in range(3)] + ["nope.png"]
+        try:
+            done = crop_render.render_frames("s1", {fn: _outputs(sdir, fn) for fn in names})
+        finally:
+            crop_render.render_pool().shutdown()
+        assert list(done) == names
+        assert done["frame_0002.png"] == [crop_render.RENDERED] * 3
+        assert done["nope.png"] == [crop_render.MISSING] * 3
+        assert Image.open(sdir / "preview" / "frame_0002_sq.png").getpixel((0, 0)) == (160, 100, 200)
+
+    def test_missing_source(self, session):
+        sdir = session(frames=0)
+        done = crop_render.render_frames("s1", {"nope.png": _outputs(sdir, "nope.png")})
+        assert done["nope.png"] == [crop_render.MISSING] * 3
+
+
+class TestReducedResampling:
+    def test_large_downscale_matches_full_lanczos(self):
+        import numpy as np
+
+        ramp = np.tile(np.linspace(0, 255, 3840, dtype=np.uint8), (2160, 1))
+        img = Image.fromarray(np.stack([ramp, ramp[::-1], ramp], axis=-1), "RGB")
+        box, size = (0, 0, 3840, 2160), (480, 270)
+        fast = np.asarray(crop_render.crop_resize(img, box, size), dtype=int)
+        full = np.asarray(img.crop(box).resize(size, Image.LANCZOS), dtype=int)
+        assert np.abs(fast - full).mean() < 1.0
+
+    def test_reduction_factor(self):
+        assert crop_render.reduction_factor((0, 0, 1920, 1080), (192, 108)) == 4
+        assert crop_render.reduction_factor((0, 0, 1920, 1080), (480, 270)) == 2
+        assert crop_render.reduction_factor((0, 0, 1920, 1080), (1080, 608)) == 1
+
+    def test_working_copy_decoded_once(self, session, decodes):
+        session(frames=1)
+        first = crop_render.working_copy("s1", "frame_0000.png", "v1", 4)
+        again = crop_render.working_copy("s1", "frame_0000.png", "v1", 4)
+        assert first is again and first.size == (100, 50)
+        assert decodes == ["frame_0000.png"]
+        crop_render.working_copy("s1", "frame_0000.png", "v2", 4)
+        assert len(decodes) == 2
@@ -2,7 +2,6 @@
 
 import os
 import sys
-import json
 import shutil
 import tempfile
 import base64
@@ -126,7 +125,7 @@ class TestBrowserCaptureE2E:
 
         # 7. Export as GIF
         res = client.post(
-            f"/api/sessions/{session_name}/export",
+            f"/api/sessions/{session_name}/export?wait=true",
             json={
                 "preset": "ig_square",
                 "frame_indices": [0, 2],
@@ -175,7 +174,7 @@ class TestBrowserCaptureE2E:
 
         # 3. Export as ZIP
         res = client.post(
-            f"/api/sessions/{session_name}/export",
+            f"/api/sessions/{session_name}/export?wait=true",
             json={
                 "preset": "ig_square",
                 "format": "zip",
@@ -248,10 +247,11 @@ class TestCaptureSessionWithMockBackend:
         assert summary["frame_count"] > 0
         assert Path(summary["path"]).exists()
 
-        # Verify session.json exists
+        # Verify session.json exists (frames live in the frames.json sidecar)
+        from xeen.session_store import load_session_meta
         meta_path = Path(summary["path"]) / "session.json"
         assert meta_path.exists()
-        meta = json.loads(meta_path.read_text())
+        meta = load_session_meta("mock_test_session")
         assert meta["name"] == "mock_test_session"
         assert len(meta["frames"]) > 0
 
@@ -0,0 +1,124 @@
+"""Tests for focus.py — activity-based auto-focus (input events + screen damage)."""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from xeen import focus
+from xeen.crop_plan import plan_crops
+from xeen.session_store import load_session_meta, save_session_meta
+
+
+def _click(x, y):
+    return {"ts": 0.0, "kind": "mouse_click", "x": x, "y": y, "button": "left", "key": ""}
+
+
+def _key(k="a"):
+    return {"ts": 0.0, "kind": "key_press", "x": 0, "y": 0, "button": "", "key": k}
+
+
+def _session(make_session, events=None, edits=((1200, 600, 1400, 680),)):
+    """Trzy klatki 1600×900: biała, z czarnym prostokątem (``edits``), jak druga."""
+    base = Image.new("RGB", (1600, 900), "white")
+    changed = base.copy()
+    for box in edits:
+        ImageDraw.Draw(changed).rectangle(box, fill="black")
+    events = events or [[], [], []]
+    make_session(frames=(base, changed, changed), input_log=[], frame_meta=[
+        {"suggested_center_x": 800, "suggested_center_y": 450, "input_events": e} for e in events])
+
+
+class TestSignals:
+    def test_damage_region_ignores_noise(self):
+        a = np.zeros((90, 160), dtype=np.int16)
+        b = a.copy()
+        b[60:68, 120:140] = 200
+        cx, cy, box, fraction = focus.damage_region(a, b, (1600, 900))
+        assert 1200 <= cx <= 1400 and 600 <= cy <= 680
+        assert box[0] >= 1190 and box[2] <= 1410
+        noisy = a.copy()
+        noisy[0, 0] = 255
+        assert focus.damage_region(a, noisy, (1600, 900)) is None
+        assert focus.damage_region(None, b, (1600, 900)) is None
+
+    def test_densest_click_cluster_wins(self):
+        events = [_click(100, 100), _click(1000, 500), _click(1010, 510), _click(990, 505)]
+        cx, cy, box, count = focus.click_cluster(events, radius=90)
+        assert count == 3
+        assert cx == pytest.approx(1000) and cy == pytest.approx(505)
+        assert box == (990.0, 500.0, 1010.0, 510.0)
+
+    def test_typing_without_damage_uses_last_pointer(self):
+        events = [_click(300, 200), {"kind": "mouse_move", "x": 310, "y": 210}, _key(), _key("b")]
+        assert focus.typing_point(events, None)[:2] == (310.0, 210.0)
+        assert focus.typing_point([_click(1, 1)], None) is None
+
+    def test_small_activity_zooms_in_full_change_does_not(self):
+        frame = {"input_events": [_click(400, 300), _click(420, 310)]}
+        spot = focus.frame_focus(frame, (1600, 900), None)
+        assert spot["source"] == "clicks"
+        assert (spot["x"], spot["y"]) == (410, 305)
+        assert 1.5 < spot["zoom"] <= focus.MAX_ZOOM
+        scene_change = (800.0, 450.0, (0.0, 0.0, 1600.0, 900.0), 0.9)
+        assert focus.frame_focus(frame, (1600, 900), scene_change)["zoom"] == 1.0
+        assert focus.frame_focus({"input_events": []}, (1600, 900), None) is None
+
+    def test_distant_weak_signal_does_not_drag_focus(self):
+        damage = (1500.0, 850.0, (1450.0, 800.0, 1550.0, 900.0), 0.01)
+        spot = focus.frame_focus({"input_events": [_click(100, 100), _click(110, 100)]}, (1600, 900), damage)
+        assert spot["x"] < 200 and spot["y"] < 200
+
+
+class TestSessionFocus:
+    def test_typing_into_changed_region(self, make_session, data_dir):
+        _session(make_session, events=[[], [_click(1300, 640), _key(), _key()], []])
+        points = focus.session_focus("s1")
+        assert set(points) == {"1"}  # klatka 0: brak poprzedniej, klatka 2: bez zmian
+        assert abs(points["1"]["x"] - 1300) < 40 and abs(points["1"]["y"] - 640) < 40
+        assert points["1"]["zoom"] > 1.5
+        assert (data_dir / "sessions" / "s1" / focus.FOCUS_FILENAME).exists()
+
+    def test_stored_result_reused_and_updated_incrementally(self, make_session, data_dir, monkeypatch):
+        _session(make_session)
+        analysed = []
+        real = focus.small_gray
+        monkeypatch.setattr(focus, "small_gray",
+                            lambda name, fn: analysed.append(fn) or real(name, fn))
+        first = focus.session_focus("s1")
+        assert sorted(analysed) == ["frame_0000.png", "frame_0001.png", "frame_0002.png"]
+        assert first["1"]["x"] == pytest.approx(1300, abs=40)
+
+        analysed.clear()
+        assert focus.session_focus("s1") == first
+        assert analysed == []
+
+        # Zapis samego session.json (zaznaczenie, napisy, środki) nie unieważnia focus.json
+        stored = (data_dir / "sessions" / "s1" / focus.FOCUS_FILENAME).stat().st_mtime_ns
+        meta = load_session_meta("s1", mutable=True)
+        meta["selected_frames"] = [1, 2]
+        save_session_meta("s1", {k: v for k, v in meta.items() if k != "frames"})
+        assert focus.session_focus("s1") == first
+        assert (data_dir / "sessions" / "s1" / focus.FOCUS_FILENAME).stat().st_mtime_ns == stored
+
+        # Nowe zdarzenia w jednej klatce → tylko ona (i jej poprzedniczka) analizowane
+        meta = load_session_meta("s1", fields=("input_events",), mutable=True)
+        meta["frames"][2]["input_events"] = [_click(200, 200)]
+        save_session_meta("s1", meta)
+        points = focus.session_focus("s1")
+        assert sorted(analysed) == ["frame_0001.png", "frame_0002.png"]
+        assert (points["2"]["x"], points["2"]["y"]) == (200, 200)
+        assert points["1"] == first["1"]
+
+
+class TestAutoPlan:
+    def test_auto_uses_focus_center_and_zoom(self):
+        frames = [{"filename": f"f{i}.png", "width": 1600, "height": 900,
+                   "suggested_center_x": 800, "suggested_center_y": 450} for i in range(2)]
+        points = {"0": {"x": 1300, "y": 640, "zoom": 2.0}}
+        plan = plan_crops(frames, [0, 1], 160, 90, focus_mode="auto", focus=points)
+        assert plan.box(0) == (800, 415, 1600, 865)  # 800×450 przesunięty do krawędzi
+        assert plan.box(1) == (0, 0, 1600, 900)  # brak aktywności → jak "screen"
+        plan = plan_crops(frames, [0], 160, 90, focus_mode="auto", focus=points, zoom_level=1.5)
+        assert plan.box(0)[2] - plan.box(0)[0] == 533
+        # Inne tryby ignorują wynik analizy
+        assert plan_crops(frames, [0], 160, 90, focus=points).box(0) == (0, 0, 1600, 900)
@@ -0,0 +1,87 @@
+"""Tests for frame_store.py — content-addressed frame storage."""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from xeen import config
+from xeen.frame_store import (
+    blob_path,
+    blob_stats,
+    gc_blobs,
+    normalize_png,
+    release_blob,
+    store_frame,
+)
+
+
+@pytest.fixture
+def data_dir(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "BLOB_STORE", True)
+    return data_dir
+
+
+def _png(color="red", size=(64, 48)) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class TestBlobStore:
+    def test_identical_frames_share_one_blob(self, data_dir):
+        data = _png()
+        a = data_dir / "sessions" / "a" / "frames"
+        b = data_dir / "sessions" / "b" / "frames"
+        sha_a = store_frame(a, "frame_0000.png", data)
+        sha_b = store_frame(b, "frame_0003.png", data)
+        assert sha_a == sha_b
+        assert (a / "frame_0000.png").stat().st_ino == (b / "frame_0003.png").stat().st_ino
+        assert blob_stats() == {"blobs": 1, "bytes": len(data), "references": 2}
+
+    def test_release_only_when_unreferenced(self, data_dir):
+        data = _png()
+        a = data_dir / "sessions" / "a" / "frames"
+        b = data_dir / "sessions" / "b" / "frames"
+        sha = store_frame(a, "f.png", data)
+        store_frame(b, "f.png", data)
+
+        (a / "f.png").unlink()
+        assert release_blob(sha) is False
+        (b / "f.png").unlink()
+        assert release_blob(sha) is True
+        assert not blob_path(sha).exists()
+
+    def test_gc_removes_orphans(self, data_dir):
+        frames = data_dir / "sessions" / "a" / "frames"
+        store_frame(frames, "keep.png", _png("red"))
+        store_frame(frames, "drop.png", _png("blue"))
+        (frames / "drop.png").unlink()
+
+        assert gc_blobs(dry_run=True)["removed"] == 1
+        assert blob_stats()["blobs"] == 2
+        result = gc_blobs()
+        assert result["removed"] == 1 and result["kept"] == 1
+        assert blob_stats()["blobs"] == 1
+
+    def test_disabled_store_writes_plain_files(self, data_dir, monkeypatch):
+        monkeypatch.setattr(config, "BLOB_STORE", False)
+        frames = data_dir / "sessions" / "a" / "frames"
+        store_frame(frames, "f.png", _png())
+        assert (frames / "f.png").stat().st_nlink == 1
+        assert blob_stats()["blobs"] == 0
+
+
+class TestNormalizePng:
+    def test_png_passthrough_keeps_bytes(self):
+        data = _png()
+        out, w, h = normalize_png(data)
+        assert out is data
+        assert (w, h) == (64, 48)
+
+    def test_jpeg_is_converted(self):
+        buf = BytesIO()
+        Image.new("RGB", (10, 10), "green").save(buf, "JPEG")
+        out, w, h = normalize_png(buf.getvalue())
+        assert Image.open(BytesIO(out)).format == "PNG"
+        assert (w, h) == (10, 10)
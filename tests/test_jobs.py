@@ -0,0 +1,207 @@
+"""Tests for jobs.py — background job queue: progress, cancellation, persistence."""
+
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from xeen import jobs
+
+
+def _stored(data_dir: Path, job_id: str) -> dict:
+    return json.loads((data_dir / "jobs" / f"{job_id}.json").read_text())
+
+
+class TestProgress:
+    def test_stage_weights(self, data_dir):
+        job = jobs.Job("export", "s1", {})
+        assert job.progress == 0.0
+        job.set_stage("render", 0.5)
+        assert job.progress == pytest.approx(0.05 + 0.35 / 2)
+        job.set_stage("encode")
+        job.update(2.0)  # przycięte do 1
+        assert job.progress == pytest.approx(0.95)
+        assert _stored(data_dir, job.id)["stage"] == "encode"
+
+    def test_ffmpeg_progress_blocks(self, data_dir):
+        job = jobs.Job("export", "s1", {})
+        job.set_stage("encode")
+        by_frames = job.ffmpeg_progress(total_frames=50)
+        by_frames({"frame": "10", "progress": "continue"})
+        assert job.stage_progress == pytest.approx(0.2)
+        by_time = job.ffmpeg_progress(total_seconds=4.0)
+        by_time({"out_time_us": "3000000", "progress": "continue"})
+        assert job.stage_progress == pytest.approx(0.75)
+        by_time({"out_time_us": "N/A", "progress": "end"})
+        assert job.stage_progress == 1.0
+
+
+class TestQueue:
+    def test_runs_job_and_persists_result(self, data_dir):
+        queue = jobs.JobQueue(workers=1)
+        queue.register("echo", lambda job: {"session": job.session, **job.params})
+        job, _ = queue.submit("echo", "s1", {"x": 1})
+        job.future.result(timeout=5)
+        assert job.status == jobs.DONE
+        stored = _stored(data_dir, job.id)
+        assert stored["status"] == "done" and stored["result"] == {"session": "s1", "x": 1}
+        assert jobs.JobQueue().get(job.id).result == {"session": "s1", "x": 1}
+
+    def test_failure_recorded(self, data_dir):
+        queue = jobs.JobQueue(workers=1)
+        queue.register("boom", lambda job: 1 / 0)
+        job, _ = queue.submit("boom", "s1", {})
+        job.future.result(timeout=5)
+        assert job.status == jobs.FAILED and "division" in job.error
+
+    def test_workers_bound_concurrency_and_queued_job_cancels(self, data_dir):
+        release = threading.Event()
+        started = []
+        queue = jobs.JobQueue(workers=1)
+        queue.register("block", lambda job: started.append(job.id) or release.wait(5) and {})
+        first, _ = queue.submit("block", "s1", {})
+        second, _ = queue.submit("block", "s1", {})
+        queue.cancel(second.id)
+        release.set()
+        first.future.result(timeout=5)
+        assert started == [first.id]
+        assert second.status == jobs.CANCELLED
+
+    def test_same_key_attaches_or_reuses(self, data_dir):
+        release = threading.Event()
+        queue = jobs.JobQueue(workers=1)
+        queue.register("block", lambda job: release.wait(5) and {"n": 1})
+        first, reused = queue.submit("block", "s1", {}, key="k")
+        second, reused_second = queue.submit("block", "s1", {}, key="k")
+        assert second is first and not reused and reused_second
+        release.set()
+        first.future.result(timeout=5)
+        assert queue.submit("block", "s1", {}, key="k") == (first, True)
+        fresh, reused = queue.submit("block", "s1", {}, key="k", reuse=lambda job: False)
+        assert fresh is not first and not reused
+        fresh.future.result(timeout=5)
+        assert queue.submit("block", "s1", {}, key="other")[0] not in (first, fresh)
+
+    def test_cancel_kills_attached_process(self, data_dir):
+        attached = threading.Event()
+
+        def runner(job):
+            proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+            job.attach(proc)
+            attached.set()
+            if proc.wait() != 0:
+                raise RuntimeError("ffmpeg failed")
+
+        queue = jobs.JobQueue(workers=1)
+        queue.register("encode", runner)
+        job, _ = queue.submit("encode", "s1", {})
+        assert attached.wait(5)
+        queue.cancel(job.id)
+        job.future.result(timeout=5)
+        assert job.status == jobs.CANCELLED
+
+    def test_restore_requeues_interrupted_jobs(self, data_dir):
+        old = jobs.Job("echo", "s1", {"x": 2})
+        old.status, old.stage = jobs.RUNNING, "encode"
+        old.save()
+        done = jobs.Job("echo", "s1", {})
+        done.status, done.finished_at = jobs.DONE, 0  # starsze niż JOB_RETENTION
+        done.save()
+
+        queue = jobs.JobQueue(workers=1)
+        queue.register("echo", lambda job: dict(job.params))
+        assert queue.restore() == 1
+        job = queue.get(old.id)
+        job.future.result(timeout=5)
+        assert job.status == jobs.DONE and job.result == {"x": 2} and job.restarts == 1
+        assert not (data_dir / "jobs" / f"{done.id}.json").exists()
+
+
+class TestWorkers:
+    """Kilka procesów serwera na jednym katalogu — tu dwie kolejki (osobne blokady flock)."""
+
+    def _sleeper(self, attached: threading.Event):
+        def runner(job):
+            proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+            job.attach(proc)
+            attached.set()
+            while proc.poll() is None:
+                job.update(0.1)  # postęp ffmpeg — tu właściciel widzi znacznik anulowania
+                time.sleep(0.05)
+            if proc.returncode != 0:
+                raise RuntimeError("ffmpeg failed")
+        return runner
+
+    def test_cancel_from_other_worker_reaches_owner(self, data_dir):
+        attached = threading.Event()
+        owner, other = jobs.JobQueue(workers=1), jobs.JobQueue(workers=1)
+        owner.register("encode", self._sleeper(attached))
+        job, _ = owner.submit("encode", "s1", {})
+        assert attached.wait(5)
+        assert other.cancel(job.id).status == jobs.RUNNING  # tylko prośba do właściciela
+        job.future.result(timeout=5)
+        assert job.status == jobs.CANCELLED
+        assert _stored(data_dir, job.id)["status"] == "cancelled"
+        assert not (data_dir / "jobs" / f"{job.id}.cancel").exists()
+
+    def test_restore_skips_jobs_owned_by_live_worker(self, data_dir):
+        attached = threading.Event()
+        owner, other = jobs.JobQueue(workers=1), jobs.JobQueue(workers=1)
+        owner.register("encode", self._sleeper(attached))
+        other.register("encode", self._sleeper(threading.Event()))
+        job, _ = owner.submit("encode", "s1", {})
+        assert attached.wait(5)
+        assert other.restore() == 0
+        owner.cancel(job.id)
+        job.future.result(timeout=5)
+        assert job.status == jobs.CANCELLED
+
+    def test_cancel_orphaned_job(self, data_dir):
+        orphan = jobs.Job("encode", "s1", {})
+        orphan.status = jobs.RUNNING  # worker padł w trakcie
+        orphan.save()
+        queue = jobs.JobQueue(workers=1)
+        assert queue.cancel(orphan.id).status == jobs.CANCELLED
+        assert _stored(data_dir, orphan.id)["status"] == "cancelled"
+
+    def test_same_key_deduplicated_across_workers(self, data_dir):
+        release = threading.Event()
+        owner, other = jobs.JobQueue(workers=1), jobs.JobQueue(workers=1)
+        for queue in (owner, other):
+            queue.register("block", lambda job: release.wait(5) and {"n": 1})
+        first, _ = owner.submit("block", "s1", {}, key="k")
+        attached, reused = other.submit("block", "s1", {}, key="k")
+        assert reused and attached.id == first.id and attached.future is None
+        release.set()
+        assert other.wait(attached, poll=0.05).status == jobs.DONE
+        done, reused = other.submit("block", "s1", {}, key="k")
+        assert reused and done.id == first.id and done.result == {"n": 1}
+        fresh, reused = other.submit("block", "s1", {}, key="k", reuse=lambda job: False)
+        assert not reused and fresh.id != first.id
+        fresh.future.result(timeout=5)
+
+    def test_list_shows_jobs_of_all_workers(self, data_dir):
+        owner, other = jobs.JobQueue(workers=1), jobs.JobQueue(workers=1)
+        for queue in (owner, other):
+            queue.register("echo", lambda job: {})
+        mine, _ = owner.submit("echo", "s1", {})
+        theirs, _ = other.submit("echo", "s2", {})
+        mine.future.result(timeout=5)
+        theirs.future.result(timeout=5)
+        assert {j.id for j in owner.list()} == {mine.id, theirs.id} == {j.id for j in other.list()}
+        assert [j.id for j in owner.list("s2")] == [theirs.id]
+
+    def test_expired_jobs_dropped_from_memory(self, data_dir, monkeypatch):
+        queue = jobs.JobQueue(workers=1)
+        queue.register("echo", lambda job: {})
+        old, _ = queue.submit("echo", "s1", {})
+        old.future.result(timeout=5)
+        monkeypatch.setattr(jobs, "JOB_RETENTION", 0)
+        time.sleep(0.01)
+        fresh, _ = queue.submit("echo", "s1", {})
+        fresh.future.result(timeout=5)
+        assert old.id not in queue._jobs and old.id not in {j.id for j in queue.list()}
@@ -0,0 +1,76 @@
+"""Tests for render_cache.py — memory + disk LRU for rendered images."""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from xeen.render_cache import RenderCache, make_key, png_render_key, save_keyed_png
+
+
+class TestRenderCache:
+    def test_identical_keys_hit(self, data_dir):
+        cache = RenderCache("t", 1024, 4096)
+        calls = []
+        render = lambda: calls.append(1) or b"jpeg"
+        key = make_key("a", {"x": 0.5}, 80)
+        assert cache.get_or_render(key, render) == (b"jpeg", False)
+        assert cache.get_or_render(key, render) == (b"jpeg", True)
+        assert len(calls) == 1
+        assert cache.get_or_render(make_key("a", {"x": 0.6}, 80), render)[1] is False
+
+    def test_key_is_order_independent(self):
+        assert make_key({"a": 1, "b": 2}) == make_key({"b": 2, "a": 1})
+
+    def test_memory_budget_and_disk_fallback(self, data_dir):
+        cache = RenderCache("t", 100, 4096)
+        cache.put("k1", b"x" * 60)
+        cache.put("k2", b"y" * 60)
+        assert cache.stats()["bytes"] <= 100
+        assert cache.get("k1") == b"x" * 60  # z dysku
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_disk_budget_trims_oldest(self, data_dir):
+        cache = RenderCache("t", 0, 250)
+        for i in range(5):
+            cache.put(f"k{i}", bytes([i]) * 100)
+        files = list((data_dir / "cache" / "t").iterdir())
+        assert sum(f.stat().st_size for f in files) <= 250
+        assert cache.get("k4") == bytes([4]) * 100
+
+    def test_concurrent_misses_render_once(self, data_dir):
+        cache = RenderCache("t", 1024, 0)
+        gate = threading.Event()
+        calls = []
+
+        def render():
+            calls.append(1)
+            gate.wait(5)
+            return b"out"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_render("k", render)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        gate.set()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert [r[0] for r in results] == [b"out"] * 4
+
+
+def _save_red(path: str, key: str) -> None:
+    save_keyed_png(Image.new("RGB", (64, 64), "red"), Path(path), key)
+
+
+class TestKeyedPng:
+    def test_concurrent_writers_leave_valid_file(self, data_dir):
+        path = data_dir / "crop.png"
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            list(pool.map(_save_red, [str(path)] * 8, ["k"] * 8))
+        assert png_render_key(path) == "k"
+        with Image.open(path) as img:
+            assert img.getpixel((0, 0)) == (255, 0, 0)
+        assert [p.name for p in data_dir.iterdir()] == ["crop.png"]
@@ -112,6 +112,52 @@ class TestSessionsAPI:
         assert data["name"] == "sess1"
         assert data["frame_count"] == 3
 
+    def test_get_session_fields_projection(self, client):
+        _create_test_session("sess1")
+        res = client.get("/api/sessions/sess1?fields=name,frame_count")
+        assert res.status_code == 200
+        assert res.json() == {"name": "sess1", "frame_count": 3}
+
+        res = client.get("/api/sessions/sess1?fields=core,frames")
+        data = res.json()
+        assert len(data["frames"]) == 3
+        assert "input_events" not in data["frames"][0]
+        assert "input_log" not in data
+
+    def test_get_session_frame_window(self, client):
+        _create_test_session("sess1")
+        data = client.get("/api/sessions/sess1?frame_offset=1&frame_limit=1").json()
+        assert [f["index"] for f in data["frames"]] == [1]
+        assert data["frames_total"] == 3
+        assert "_missing_frames" not in data
+
+    def test_list_sessions_pagination(self, client):
+        for i in range(5):
+            _create_test_session(f"sess{i}")
+        res = client.get("/api/sessions?limit=2")
+        assert [s["name"] for s in res.json()] == ["sess4", "sess3"]
+        cursor = res.headers["x-next-cursor"]
+
+        res = client.get(f"/api/sessions?limit=2&after={cursor}")
+        assert [s["name"] for s in res.json()] == ["sess2", "sess1"]
+        res = client.get(f"/api/sessions?limit=2&after={res.headers['x-next-cursor']}")
+        assert [s["name"] for s in res.json()] == ["sess0"]
+        assert "x-next-cursor" not in res.headers
+
+    def test_list_sessions_filters_and_sort(self, client):
+        _create_test_session("a")
+        _create_test_session("b")
+        client.post("/api/sessions/b/captions", json={"captions": [
+            {"id": "c1", "frame_start": 0, "frame_end": 0, "text": "hi"}]})
+        res = client.get("/api/sessions?has_captions=true")
+        assert [s["name"] for s in res.json()] == ["b"]
+        res = client.get("/api/sessions?source=test&sort=created_at&order=asc")
+        assert [s["name"] for s in res.json()] == ["a", "b"]
+        assert client.get("/api/sessions?created_from=2026").json() == []
+        assert len(client.get("/api/sessions?created_to=2025-01-01").json()) == 2
+        assert client.get("/api/sessions?sort=bogus").status_code == 400
+        assert client.get("/api/sessions?after=!!!").status_code == 400
+
     def test_get_session_not_found(self, client):
         res = client.get("/api/sessions/nonexistent")
         assert res.status_code == 404
@@ -207,6 +253,299 @@ class TestCropPreviewAPI:
         assert "previews" in data
         assert len(data["previews"]) == 3  # all frames
 
+    def test_crop_renders_are_reused(self, client):
+        _create_test_session("sess1")
+        body = {"preset": None, "custom_w": 50, "custom_h": 50}
+        first = client.post("/api/sessions/sess1/crop-preview", json=body).json()
+        assert first["reused"] == 0
+        path = Path(_test_data_dir) / "sessions" / "sess1" / "preview" / first["previews"][0]["filename"]
+        mtime = path.stat().st_mtime_ns
+
+        second = client.post("/api/sessions/sess1/crop-preview", json=body).json()
+        assert second["reused"] == 3
+        assert path.stat().st_mtime_ns == mtime
+
+        # Inny środek → inny prostokąt → nowy render tylko tej klatki
+        moved = {**body, "custom_centers": {"0": {"x": 10, "y": 10}}, "zoom_level": 2.0}
+        third = client.post("/api/sessions/sess1/crop-preview", json=moved).json()
+        assert third["reused"] == 0
+        assert client.post("/api/sessions/sess1/crop-preview", json=moved).json()["reused"] == 3
+
+    def test_generate_versions_decodes_each_frame_once(self, client, monkeypatch):
+        from concurrent.futures import ThreadPoolExecutor
+        from xeen import crop_render
+
+        # Licznik dekodowań działa tylko w procesie testu — renderuj w wątkach
+        monkeypatch.setattr(crop_render, "_executor", ThreadPoolExecutor(max_workers=2))
+        _create_test_session("sess1")
+        decodes = []
+        real = crop_render.open_frame_image
+        monkeypatch.setattr(crop_render, "open_frame_image",
+                            lambda name, fn, *a: decodes.append(fn) or real(name, fn, *a))
+        presets = ["instagram_post", "instagram_story", "twitter_post", "linkedin_post", "youtube_thumb"]
+        res = client.post("/api/sessions/sess1/generate-versions", json={"presets": presets})
+        assert res.status_code == 200
+        data = res.json()
+        assert set(data) == set(presets)
+        assert all(len(v["previews"]) == 3 for v in data.values())
+        assert sorted(decodes) == ["frame_0000.png", "frame_0001.png", "frame_0002.png"]
+
+    @staticmethod
+    def _events(body: str) -> list[tuple[str, dict]]:
+        events = []
+        for block in body.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((lines["event"], json.loads(lines["data"])))
+        return events
+
+    def test_crop_preview_stream(self, client):
+        _create_test_session("sess1")
+        body = {"preset": None, "custom_w": 50, "custom_h": 50, "frame_indices": [2, 0, 1]}
+        res = client.post("/api/sessions/sess1/crop-preview/stream?order=request", json=body)
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/event-stream")
+        events = self._events(res.text)
+        assert events[0] == ("start", {"count": 3, "target": {"w": 50, "h": 50}, "order": "request"})
+        previews = [data for kind, data in events if kind == "preview"]
+        assert [p["index"] for p in previews] == [2, 0, 1]
+        assert previews[0]["url"].startswith("/api/sessions/sess1/preview/crop_0002_50x50.png?v=")
+        assert {"crop", "center", "filename"} <= set(previews[0])
+        assert events[-1][0] == "done" and events[-1][1]["count"] == 3
+        assert client.get(previews[0]["url"]).status_code == 200
+
+        # Ten sam zestaw ponownie → wszystko z cache renderu
+        again = self._events(client.post("/api/sessions/sess1/crop-preview/stream", json=body).text)
+        assert again[-1][1]["reused"] == 3
+
+    def test_new_stream_supersedes_previous(self, client):
+        import asyncio
+        from xeen import server
+
+        _create_test_session("sess1")
+        old = asyncio.Event()
+        server._crop_streams["editor-1"] = old
+        client.post("/api/sessions/sess1/crop-preview/stream?stream=editor-1",
+                    json={"custom_w": 50, "custom_h": 50})
+        assert old.is_set()
+        assert "editor-1" not in server._crop_streams
+
+    def test_auto_focus_precomputed_once(self, client, monkeypatch):
+        from xeen import focus
+
+        _create_test_session("sess1")
+        calls = []
+        real = focus.compute_focus
+        monkeypatch.setattr(focus, "compute_focus", lambda name: calls.append(name) or real(name))
+        body = {"preset": None, "custom_w": 50, "custom_h": 50, "focus_mode": "auto"}
+        first = client.post("/api/sessions/sess1/crop-preview", json=body).json()
+        assert len(first["previews"]) == 3
+        assert first["previews"][0]["focus_mode"] == "auto"
+        assert (Path(_test_data_dir) / "sessions" / "sess1" / "focus.json").exists()
+        client.post("/api/sessions/sess1/crop-preview", json=body)
+        assert calls == ["sess1"]
+
+    def test_watermarked_crops_cached_separately(self, client):
+        _create_test_session("sess1")
+        client.post("/api/branding", json={"footer_text": "xeen"})
+        body = {"preset": None, "custom_w": 50, "custom_h": 50}
+        plain = client.post("/api/sessions/sess1/crop-preview", json=body).json()
+        marked = client.post("/api/sessions/sess1/crop-preview", json={**body, "watermark": True}).json()
+        assert marked["previews"][0]["filename"].endswith("_wm.png")
+        assert marked["reused"] == 0
+        assert client.post("/api/sessions/sess1/crop-preview", json=body).json()["reused"] == 3
+        assert plain["previews"][0]["filename"] != marked["previews"][0]["filename"]
+
+
+
+class TestStreamedExport:
+    @pytest.fixture
+    def tiny_preset(self, monkeypatch):
+        from xeen import server
+        monkeypatch.setitem(server.CROP_PRESETS, "tiny", {"w": 40, "h": 20, "label": "Tiny"})
+
+    def test_camera_frames_piped_without_intermediate_files(self, client, monkeypatch, tiny_preset):
+        import sys
+        from xeen import ffmpeg_pipe
+
+        script = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+        monkeypatch.setattr(ffmpeg_pipe, "rawvideo_command",
+                            lambda out, size, fps, args: [sys.executable, "-c", script, str(out)])
+        _create_test_session("sess1")
+        res = client.post("/api/sessions/sess1/export?wait=true", json={
+            "preset": "tiny", "format": "video", "camera": True,
+            "camera_fps": 10, "duration_per_frame": 0.5,
+        })
+        assert res.status_code == 200
+        data = res.json()
+        assert data["filename"].endswith("_camera.mp4")
+        raw = (Path(_test_data_dir) / "exports" / data["filename"]).read_bytes()
+        assert len(raw) == 3 * 5 * 40 * 20 * 3  # 3 klatki × 5 klatek wyjściowych × rgb24
+        assert not (Path(_test_data_dir) / "sessions" / "sess1" / "preview").exists()
+
+    def test_still_export_streams_raw_frames_with_transitions(self, client, monkeypatch, tiny_preset):
+        import sys
+        from xeen import ffmpeg_pipe, server
+
+        script = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+        commands = []
+        monkeypatch.setattr(ffmpeg_pipe, "rawvideo_command",
+                            lambda out, size, fps, args: commands.append((size, fps, args))
+                            or [sys.executable, "-c", script, str(out)])
+        monkeypatch.setattr(ffmpeg_pipe, "FFMPEG", "xeen-no-such-ffmpeg")
+        _create_test_session("sess1")
+        res = client.post("/api/sessions/sess1/export?wait=true", json={
+            "preset": "tiny", "format": "webm", "duration_per_frame": 0.4, "fps": 5,
+            "transitions": {"1": {"type": "fade", "duration": 0.2}},
+        })
+        assert res.status_code == 200
+        data = res.json()
+        assert data["filename"].endswith(".webm")
+        (size, fps, args), = commands
+        assert size == (40, 20) and fps == server.TRANSITION_FPS and "libvpx-vp9" in args
+        raw = (Path(_test_data_dir) / "exports" / data["filename"]).read_bytes()
+        frame = 40 * 20 * 3
+        hold, fade = round(0.4 * fps), round(0.2 * fps)
+        assert len(raw) == (3 * hold) * frame  # przejście zabiera klatki z trzymania
+        frames = [raw[i:i + frame] for i in range(0, len(raw), frame)]
+        red, green = frames[0][:3], frames[hold][:3]
+        assert red == bytes((255, 0, 0)) and green == bytes((0, 128, 0))
+        mixed = frames[hold - fade][:3]
+        assert mixed not in (red, green)
+        assert not list((Path(_test_data_dir) / "sessions" / "sess1" / "preview").glob("*.png"))
+
+    def test_camera_falls_back_to_still_export(self, client, monkeypatch, tiny_preset):
+        from xeen import ffmpeg_pipe
+
+        monkeypatch.setattr(ffmpeg_pipe, "FFMPEG", "xeen-no-such-ffmpeg")
+        _create_test_session("sess1")
+        res = client.post("/api/sessions/sess1/export?wait=true",
+                          json={"preset": "tiny", "format": "video", "camera": True})
+        assert res.status_code == 200
+        assert res.json()["filename"].endswith(".gif")
+
+
+def _poll_job(client, job_id, until=("done", "failed", "cancelled"), timeout=20.0):
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in until:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} stuck in {job['status']}")
+
+
+class TestExportJobs:
+    def test_export_returns_job_and_reports_result(self, client):
+        _create_test_session("sess1")
+        res = client.post("/api/sessions/sess1/export", json={"preset": "square", "format": "zip"})
+        assert res.status_code == 202
+        job_id = res.json()["job_id"]
+        assert res.json()["status_url"] == f"/api/jobs/{job_id}"
+        job = _poll_job(client, job_id)
+        assert job["status"] == "done" and job["progress"] == 1.0
+        assert job["stage"] == "finalize"
+        filename = job["result"]["filename"]
+        assert job_id in filename and filename.endswith(".zip")
+        assert client.get(job["result"]["download_url"]).status_code == 200
+        assert any(j["id"] == job_id for j in client.get("/api/jobs?session=sess1").json()["jobs"])
+
+    def test_concurrent_exports_get_distinct_files(self, client):
+        _create_test_session("sess1")
+        ids = [client.post("/api/sessions/sess1/export",
+                           json={"preset": "square", "format": "zip", "quality": q}).json()["job_id"]
+               for q in (50, 60, 70)]
+        names = {_poll_job(client, job_id)["result"]["filename"] for job_id in ids}
+        assert len(names) == 3
+
+    def test_identical_export_reuses_job_and_result(self, client, monkeypatch):
+        import threading
+        from xeen import server
+
+        release = threading.Event()
+        real = server._run_export
+
+        async def gated(name, req, job):
+            release.wait(10)
+            return await real(name, req, job)
+
+        monkeypatch.setattr(server, "_run_export", gated)
+        _create_test_session("sess1")
+        body = {"preset": "square", "format": "zip"}
+        first = client.post("/api/sessions/sess1/export", json=body)
+        second = client.post("/api/sessions/sess1/export", json=body)
+        assert first.status_code == second.status_code == 202
+        assert second.json()["job_id"] == first.json()["job_id"] and second.json()["reused"]
+        release.set()
+        job = _poll_job(client, first.json()["job_id"])
+
+        again = client.post("/api/sessions/sess1/export", json=body)
+        assert again.status_code == 200 and again.json()["reused"]
+        assert again.json()["result"] == job["result"]
+        waited = client.post("/api/sessions/sess1/export?wait=true", json=body).json()
+        assert waited["filename"] == job["result"]["filename"] and waited["reused"]
+        assert len(list((Path(_test_data_dir) / "exports").glob("sess1_*.zip"))) == 1
+
+    def test_changed_inputs_or_missing_file_start_new_export(self, client):
+        _create_test_session("sess1")
+        body = {"preset": "square", "format": "zip"}
+        first = client.post("/api/sessions/sess1/export?wait=true", json=body).json()
+        client.post("/api/sessions/sess1/centers", json={"marks": [{"frame_index": 0, "center_x": 10, "center_y": 10}]})
+        moved = client.post("/api/sessions/sess1/export?wait=true", json=body).json()
+        assert not moved["reused"] and moved["job_id"] != first["job_id"]
+        (Path(_test_data_dir) / "exports" / moved["filename"]).unlink()
+        fresh = client.post("/api/sessions/sess1/export?wait=true", json=body).json()
+        assert not fresh["reused"] and fresh["job_id"] != moved["job_id"]
+
+    def test_file_export_ignores_concurrent_preview_writes(self, client, monkeypatch):
+        import zipfile
+        from xeen import server
+
+        real = server._render_crop_outputs
+
+        async def then_editor_rewrites(name, items):
+            statuses = await real(name, items)
+            # edytor (SSE) w tym czasie podmienia podglądy o tych samych nazwach (jak save_keyed_png)
+            for f in (Path(_test_data_dir) / "sessions" / name / "preview").glob("crop_*.png"):
+                Image.new("RGB", (5, 5), "white").save(f.with_suffix(".tmp"), "PNG")
+                os.replace(f.with_suffix(".tmp"), f)
+            return statuses
+
+        _create_test_session("sess1")
+        client.post("/api/sessions/sess1/crop-preview", json={"preset": "square"})
+        monkeypatch.setattr(server, "_render_crop_outputs", then_editor_rewrites)
+        res = client.post("/api/sessions/sess1/export?wait=true",
+                          json={"preset": "square", "format": "zip"}).json()
+        with zipfile.ZipFile(Path(_test_data_dir) / "exports" / res["filename"]) as zf:
+            sizes = {Image.open(BytesIO(zf.read(n))).size for n in zf.namelist()}
+        assert sizes == {(1080, 1080)}
+        assert not list((Path(_test_data_dir) / "exports").glob(".*"))  # katalog zadania usunięty
+
+    def test_cancel_kills_running_ffmpeg(self, client, monkeypatch):
+        import sys
+        from xeen import ffmpeg_pipe, server
+
+        monkeypatch.setitem(server.CROP_PRESETS, "tiny", {"w": 40, "h": 20, "label": "Tiny"})
+        # "ffmpeg", który nie czyta stdin — zapis klatek blokuje się na pełnym potoku
+        monkeypatch.setattr(ffmpeg_pipe, "rawvideo_command",
+                            lambda out, size, fps, args: [sys.executable, "-c", "import time; time.sleep(60)"])
+        _create_test_session("sess1")
+        res = client.post("/api/sessions/sess1/export", json={
+            "preset": "tiny", "format": "video", "camera": True,
+            "camera_fps": 25, "duration_per_frame": 10,
+        })
+        job_id = res.json()["job_id"]
+        _poll_job(client, job_id, until=("running",))
+        assert client.delete(f"/api/jobs/{job_id}").status_code == 200
+        job = _poll_job(client, job_id)
+        assert job["status"] == "cancelled"
+        assert not list((Path(_test_data_dir) / "exports").glob(f"*{job_id}*"))
+
+    def test_unknown_job_and_session(self, client):
+        assert client.get("/api/jobs/deadbeef").status_code == 404
+        assert client.delete("/api/jobs/deadbeef").status_code == 404
+        res = client.post("/api/sessions/nope/export", json={"preset": "square", "format": "zip"})
+        assert res.status_code == 404
 
 # ─── Browser Capture API ────────────────────────────────────────────────────
 
@@ -277,6 +616,116 @@ class TestBrowserCaptureAPI:
         assert "browser" in names
 
 
+# ─── HTTP caching ────────────────────────────────────────────────────────────
+
+class TestHTTPCaching:
+    def test_frame_etag_and_304(self, client):
+        _create_test_session("sess1")
+        res = client.get("/api/sessions/sess1/frames/frame_0000.png")
+        etag = res.headers["etag"]
+        assert res.headers["cache-control"] == "no-cache"
+        assert "last-modified" in res.headers
+
+        res2 = client.get("/api/sessions/sess1/frames/frame_0000.png",
+                          headers={"If-None-Match": etag})
+        assert res2.status_code == 304
+        assert res2.content == b""
+
+    def test_versioned_frame_url_is_immutable(self, client):
+        res = client.post("/api/sessions/upload",
+                          files=[("files", ("a.png", _create_test_image(), "image/png"))])
+        name = res.json()["name"]
+        thumbs = client.get(f"/api/sessions/{name}/thumbnails").json()["thumbnails"]
+        url = thumbs[0]["url"]
+        assert "?v=" in url
+        res = client.get(url)
+        assert "immutable" in res.headers["cache-control"]
+        assert res.headers["etag"].startswith('"' + url.split("?v=")[1])
+        # Nieaktualna wersja → zwykła rewalidacja
+        stale = client.get(url.split("?v=")[0] + "?v=deadbeefdeadbeef")
+        assert stale.headers["cache-control"] == "no-cache"
+
+    def test_watermarked_preview_is_cached(self, client):
+        _create_test_session("sess1")
+        client.post("/api/sessions/sess1/crop-preview",
+                    json={"preset": None, "custom_w": 50, "custom_h": 50})
+        url = "/api/sessions/sess1/preview/crop_0000_50x50.png?watermark=1&wm_text=hi&wm_px=0.5"
+        first = client.get(url)
+        assert first.status_code == 200
+        assert first.headers["x-cache"] == "MISS"
+        second = client.get(url.replace("0.5", "0.50000"))
+        assert second.headers["x-cache"] == "HIT"
+        assert second.content == first.content
+        assert client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+        assert client.get(url.replace("hi", "other")).headers["x-cache"] == "MISS"
+
+    def test_frame_served_as_webp_when_accepted(self, client):
+        import numpy as np
+        from xeen import variants
+        from xeen.archive import source_version
+
+        _create_test_session("sess1")
+        session_dir = Path(_test_data_dir) / "sessions" / "sess1"
+        rng = np.random.default_rng(0)
+        noise = rng.integers(0, 32, (100, 100, 3), dtype=np.uint8) + 96
+        Image.fromarray(noise, "RGB").save(session_dir / "frames" / "frame_0000.png", "PNG")
+        url = "/api/sessions/sess1/frames/frame_0000.png"
+        accept = {"Accept": "image/webp,*/*"}
+
+        first = client.get(url, headers=accept)
+        assert first.headers["content-type"] == "image/png"
+        assert "Accept" in first.headers["vary"]
+        version = source_version("sess1", "frame_0000.png")
+        variants.request_variant("sess1", "frames", "frame_0000.png", version,
+                                 variants.WEBP).result(timeout=10)
+
+        res = client.get(url, headers=accept)
+        assert res.headers["content-type"] == "image/webp"
+        assert "Accept" in res.headers["vary"]
+        assert len(res.content) < len(first.content)
+        assert client.get(url, headers={**accept, "If-None-Match": res.headers["etag"]}).status_code == 304
+        # Bez jawnego Accept → oryginał PNG
+        assert client.get(url).headers["content-type"] == "image/png"
+
+    def test_export_range_requests(self, client):
+        exports = Path(_test_data_dir) / "exports"
+        exports.mkdir(parents=True, exist_ok=True)
+        (exports / "clip.mp4").write_bytes(bytes(range(256)) * 4)
+
+        res = client.get("/api/exports/clip.mp4", headers={"Range": "bytes=10-19"})
+        assert res.status_code == 206
+        assert res.content == bytes(range(10, 20))
+        assert res.headers["content-range"] == "bytes 10-19/1024"
+
+        res = client.get("/api/exports/clip.mp4", headers={"Range": "bytes=-4"})
+        assert res.content == bytes(range(252, 256))
+        assert client.get("/api/exports/clip.mp4",
+                          headers={"Range": "bytes=5000-"}).status_code == 416
+
+        full = client.get("/api/exports/clip.mp4")
+        assert full.status_code == 200 and len(full.content) == 1024
+        assert full.headers["accept-ranges"] == "bytes"
+        stale = client.get("/api/exports/clip.mp4",
+                           headers={"Range": "bytes=0-1", "If-Range": '"stale"'})
+        assert stale.status_code == 200
+
+
+# ─── Storage API ─────────────────────────────────────────────────────────────
+
+class TestStorageAPI:
+    def test_storage_stats_after_preview(self, client):
+        _create_test_session("sess1")
+        client.post("/api/sessions/sess1/crop-preview",
+                    json={"preset": None, "custom_w": 50, "custom_h": 50})
+        data = client.get("/api/storage").json()
+        assert data["categories"]["preview"]["files"] == 3
+        assert data["sources"]["frames_bytes"] > 0
+
+        res = client.post("/api/storage/enforce?budget_mb=1&dry_run=true")
+        assert res.status_code == 200
+        assert res.json()["evicted"] == 0  # świeże podglądy są chronione
+
+
 # ─── Frontend Routes ────────────────────────────────────────────────────────
 
 class TestFrontendRoutes:
@@ -285,3 +734,40 @@ class TestFrontendRoutes:
         assert res.status_code == 200
         assert "getDisplayMedia" in res.text
         assert "xeen" in res.text
+
+
+class TestSprites:
+    def test_sprite_layout_and_atlas(self, client):
+        _create_test_session("sess1")
+        _create_test_session("sess2")
+        layout = client.get("/api/sprites?names=sess1,sess2,missing&per_session=2").json()
+        assert list(layout["sessions"]) == ["sess1", "sess2"]
+        assert layout["width"] == 2 * layout["cell"] and layout["height"] == 2 * layout["cell"]
+        cell = layout["sessions"]["sess2"][1]
+        assert (cell["x"], cell["y"]) == (layout["cell"], layout["cell"])
+
+        res = client.get(layout["url"])
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "image/webp"
+        assert "immutable" in res.headers["cache-control"]
+        atlas = Image.open(BytesIO(res.content))
+        assert atlas.size == (layout["width"], layout["height"])
+        # Klatka 1 sesji sess2 jest zielona
+        r, g, b = atlas.convert("RGB").getpixel((cell["x"] + 80, cell["y"] + 80))
+        assert g > 100 and r < 60
+        assert client.get(layout["url"]).headers["x-cache"] == "HIT"
+        assert client.get(layout["url"], headers={"If-None-Match": res.headers["etag"]}).status_code == 304
+
+    def test_sprite_invalidated_when_frames_change(self, client):
+        _create_test_session("sess1")
+        before = client.get("/api/sessions/sess1/sprite").json()
+        assert len(before["sessions"]["sess1"]) == 3
+        assert client.delete("/api/sessions/sess1/frames/frame_0000.png").status_code == 200
+        after = client.get("/api/sessions/sess1/sprite").json()
+        assert after["key"] != before["key"]
+        assert len(after["sessions"]["sess1"]) == 2
+        stale = client.get(before["url"])
+        assert stale.headers["cache-control"] == "no-cache"
+
+    def test_session_sprite_not_found(self, client):
+        assert client.get("/api/sessions/nope/sprite").status_code == 404
@@ -0,0 +1,192 @@
+"""Tests for session_store.py — metadata cache and session.json access."""
+
+import json
+
+import pytest
+
+from xeen.session_store import (
+    MetaCache,
+    load_session_meta,
+    save_session_meta,
+    forget_session,
+    get_meta_cache,
+)
+
+
+@pytest.fixture
+def write_session(make_session):
+    """Pusta jednoplikowa sesja (bez klatek); zwraca ścieżkę jej session.json."""
+    def write(name: str, **extra):
+        return make_session(name, frames=(), legacy=True, **extra) / "session.json"
+    return write
+
+
+# ─── MetaCache ───────────────────────────────────────────────────────────────
+
+class TestMetaCache:
+    def test_second_read_is_hit(self, write_session):
+        write_session("s1")
+        load_session_meta("s1")
+        load_session_meta("s1")
+        stats = get_meta_cache().stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_external_write_invalidates(self, write_session):
+        path = write_session("s1")
+        assert load_session_meta("s1")["frame_count"] == 0
+        path.write_text(json.dumps({"name": "s1", "frame_count": 12345, "frames": []}))
+        assert load_session_meta("s1")["frame_count"] == 12345
+
+    def test_missing_session_raises(self, data_dir):
+        with pytest.raises(FileNotFoundError):
+            load_session_meta("nope")
+
+    def test_mutable_copy_does_not_touch_cache(self, write_session):
+        write_session("s1")
+        meta = load_session_meta("s1", mutable=True)
+        meta["frame_count"] = 99
+        assert load_session_meta("s1")["frame_count"] == 0
+
+    def test_save_primes_cache(self, write_session):
+        write_session("s1")
+        save_session_meta("s1", {"name": "s1", "frame_count": 7, "frames": []})
+        cache = get_meta_cache()
+        misses = cache.stats()["misses"]
+        assert load_session_meta("s1")["frame_count"] == 7
+        assert cache.stats()["misses"] == misses
+
+    def test_lru_eviction_by_bytes(self, tmp_path):
+        cache = MetaCache(max_bytes=300)
+        paths = []
+        for i in range(4):
+            p = tmp_path / f"m{i}.json"
+            p.write_text(json.dumps({"pad": "x" * 100}))
+            paths.append(p)
+            cache.get(p)
+        stats = cache.stats()
+        assert stats["bytes"] <= 300
+        assert stats["entries"] < 4
+
+    def test_forget_session(self, write_session):
+        write_session("s1")
+        load_session_meta("s1")
+        forget_session("s1")
+        assert get_meta_cache().stats()["entries"] == 0
+
+
+# ─── Atomic, locked updates ──────────────────────────────────────────────────
+
+class TestSessionUpdates:
+    def test_concurrent_updates_are_not_lost(self, write_session):
+        import threading
+        from xeen.session_store import update_session_meta
+
+        write_session("s1", counter=0)
+
+        def bump(meta):
+            meta["counter"] += 1
+
+        threads = [
+            threading.Thread(target=lambda: [update_session_meta("s1", bump) for _ in range(10)])
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        get_meta_cache().clear()
+        assert load_session_meta("s1")["counter"] == 80
+
+    def test_async_update_returns_mutator_result(self, write_session):
+        import asyncio
+        from xeen.session_store import aupdate_session_meta
+
+        write_session("s1")
+        result = asyncio.run(aupdate_session_meta("s1", lambda m: m.setdefault("x", 5)))
+        assert result == 5
+        assert load_session_meta("s1")["x"] == 5
+
+    def test_update_missing_session_raises(self, data_dir):
+        from xeen.session_store import update_session_meta
+        with pytest.raises(FileNotFoundError):
+            update_session_meta("nope", lambda m: None)
+
+    def test_atomic_write_leaves_no_temp_files(self, write_session):
+        path = write_session("s1")
+        save_session_meta("s1", {"name": "s1", "frames": []})
+        leftovers = [p.name for p in path.parent.iterdir() if p.name.endswith(".tmp")]
+        assert leftovers == []
+
+    def test_compact_serialization(self, write_session):
+        path = write_session("s1")
+        save_session_meta("s1", {"name": "s1"}, compact=True)
+        assert path.read_text() == '{"name":"s1","layout":2}'
+
+
+# ─── Core + sidecar layout ───────────────────────────────────────────────────
+
+def _full_meta(name="s1"):
+    return {
+        "name": name,
+        "frame_count": 2,
+        "frames": [
+            {"index": i, "filename": f"frame_{i:04d}.png", "mouse_x": 1,
+             "ocr_text": f"text {i}", "input_events": [{"kind": "mouse_click", "x": i}]}
+            for i in range(2)
+        ],
+        "input_log": [{"kind": "key_press"}],
+    }
+
+
+class TestSidecarLayout:
+    def test_save_splits_into_sidecars(self, data_dir):
+        (data_dir / "sessions" / "s1").mkdir(parents=True)
+        save_session_meta("s1", _full_meta())
+        sdir = data_dir / "sessions" / "s1"
+        core = json.loads((sdir / "session.json").read_text())
+        assert "frames" not in core and "input_log" not in core
+        frames = json.loads((sdir / "frames.json").read_text())
+        assert "ocr_text" not in frames[0] and "input_events" not in frames[0]
+        assert json.loads((sdir / "ocr.json").read_text())["frame_0001.png"] == "text 1"
+
+    def test_lazy_projection(self, data_dir):
+        from xeen.session_store import OCR, EVENTS, INPUT_LOG
+        (data_dir / "sessions" / "s1").mkdir(parents=True)
+        save_session_meta("s1", _full_meta())
+        get_meta_cache().clear()
+
+        core = load_session_meta("s1", fields=())
+        assert "frames" not in core
+        light = load_session_meta("s1")
+        assert "ocr_text" not in light["frames"][0]
+        assert get_meta_cache().stats()["entries"] == 2  # session.json + frames.json
+
+        full = load_session_meta("s1", fields=(OCR, EVENTS, INPUT_LOG))
+        assert full["frames"][1]["ocr_text"] == "text 1"
+        assert full["frames"][0]["input_events"][0]["x"] == 0
+        assert full["input_log"] == [{"kind": "key_press"}]
+
+    def test_light_update_keeps_sidecars(self, data_dir):
+        from xeen.session_store import update_session_meta, ALL_FIELDS
+        (data_dir / "sessions" / "s1").mkdir(parents=True)
+        save_session_meta("s1", _full_meta())
+        update_session_meta("s1", lambda m: m.update(captions=[{"text": "x"}]))
+        full = load_session_meta("s1", fields=ALL_FIELDS)
+        assert full["captions"] == [{"text": "x"}]
+        assert full["frames"][0]["ocr_text"] == "text 0"
+        assert full["input_log"]
+
+    def test_legacy_session_loads_and_migrates(self, data_dir):
+        from xeen.session_store import migrate_session, ALL_FIELDS
+        sdir = data_dir / "sessions" / "old"
+        sdir.mkdir(parents=True)
+        (sdir / "session.json").write_text(json.dumps(_full_meta("old")))
+
+        assert load_session_meta("old")["frames"][0]["ocr_text"] == "text 0"
+        assert migrate_session("old") is True
+        assert migrate_session("old") is False
+        assert (sdir / "frames.json").exists()
+        get_meta_cache().clear()
+        assert load_session_meta("old", fields=ALL_FIELDS) == {**_full_meta("old"), "layout": 2}
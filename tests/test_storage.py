@@ -0,0 +1,67 @@
+"""Tests for storage.py — LRU budget for derived artifacts."""
+
+import os
+import time
+from pathlib import Path
+
+from xeen.storage import enforce_budget, scan_derived, storage_stats, touch
+
+
+def _file(path: Path, size: int, age: float) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    t = time.time() - age
+    os.utime(path, (t, t))
+    return path
+
+
+class TestStorageBudget:
+    def test_stats_by_category(self, data_dir):
+        s = data_dir / "sessions" / "s1"
+        _file(s / "frames" / "frame_0000.png", 500, 0)
+        _file(s / "preview" / "crop_0000.png", 100, 0)
+        _file(s / "thumbs" / "frame_0000_thumb.webp", 10, 0)
+        _file(data_dir / "exports" / "s1.mp4", 1000, 0)
+
+        stats = storage_stats()
+        assert stats["derived_bytes"] == 1110
+        assert stats["categories"]["preview"] == {"files": 1, "bytes": 100}
+        assert stats["categories"]["exports"]["bytes"] == 1000
+        assert stats["sources"]["frames_bytes"] == 500
+
+    def test_evicts_least_recently_used_first(self, data_dir):
+        s = data_dir / "sessions" / "s1"
+        old = _file(s / "preview" / "old.jpg", 100, 3000)
+        mid = _file(data_dir / "exports" / "mid.gif", 100, 2000)
+        new = _file(s / "preview" / "new.jpg", 100, 1000)
+        frame = _file(s / "frames" / "frame_0000.png", 1000, 9000)
+
+        result = enforce_budget(budget=150, min_age=0)
+        assert result["evicted"] == 2
+        assert not old.exists() and not mid.exists()
+        assert new.exists() and frame.exists()
+
+    def test_touch_protects_recently_served_file(self, data_dir):
+        s = data_dir / "sessions" / "s1"
+        served = _file(s / "preview" / "a.jpg", 100, 3000)
+        other = _file(s / "preview" / "b.jpg", 100, 2000)
+        touch(served)
+
+        enforce_budget(budget=150, min_age=0)
+        assert served.exists() and not other.exists()
+
+    def test_young_files_and_dry_run_are_kept(self, data_dir):
+        s = data_dir / "sessions" / "s1"
+        young = _file(s / "preview" / "young.jpg", 100, 10)
+        old = _file(s / "preview" / "old.jpg", 100, 3000)
+
+        assert enforce_budget(budget=1, dry_run=True, min_age=0)["evicted"] == 2
+        assert young.exists() and old.exists()
+        result = enforce_budget(budget=1, min_age=600)
+        assert result["evicted"] == 1
+        assert young.exists() and not old.exists()
+        assert len(scan_derived()) == 1
+
+    def test_zero_budget_is_unlimited(self, data_dir):
+        _file(data_dir / "exports" / "a.mp4", 100, 3000)
+        assert enforce_budget(budget=0, min_age=0)["evicted"] == 0
@@ -0,0 +1,70 @@
+"""Tests for thumbs.py — background thumbnail service."""
+
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from xeen import thumbs
+
+
+class TestThumbService:
+    def test_render_thumb(self, make_frame):
+        make_frame()
+        path = thumbs.request_thumb("s1", "frame_0000.png").result(timeout=10)
+        assert path.name == "frame_0000_thumb.webp"
+        assert Image.open(path).size == (320, 180)
+
+    def test_concurrent_requests_share_one_job(self, make_frame, monkeypatch):
+        make_frame()
+        calls = []
+        gate = threading.Event()
+        real = thumbs.render_thumb
+
+        def slow_render(name, filename):
+            calls.append(filename)
+            gate.wait(5)
+            return real(name, filename)
+
+        monkeypatch.setattr(thumbs, "render_thumb", slow_render)
+        futures = [thumbs.request_thumb("s1", "frame_0000.png") for _ in range(5)]
+        assert all(f is futures[0] for f in futures)
+        gate.set()
+        futures[0].result(timeout=10)
+        assert calls == ["frame_0000.png"]
+
+    def test_missing_frame(self, data_dir):
+        with pytest.raises(FileNotFoundError):
+            thumbs.request_thumb("s1", "nope.png").result(timeout=10)
+
+
+class TestThumbAPI:
+    def test_placeholder_then_real_thumb(self, make_frame, monkeypatch):
+        from fastapi.testclient import TestClient
+        from xeen.server import app
+
+        make_frame()
+        gate = threading.Event()
+        real = thumbs.render_thumb
+        monkeypatch.setattr(thumbs, "render_thumb",
+                            lambda n, f: (gate.wait(5), real(n, f))[1])
+        client = TestClient(app)
+
+        res = client.get("/api/sessions/s1/thumbs/frame_0000_thumb.webp?wait=0")
+        assert res.status_code == 200
+        assert res.headers["x-thumb-status"] == "pending"
+        assert res.headers["cache-control"] == "no-store"
+
+        gate.set()
+        res = client.get("/api/sessions/s1/thumbs/frame_0000_thumb.webp?wait=5000")
+        assert "x-thumb-status" not in res.headers
+        assert Image.open(BytesIO(res.content)).size == (320, 180)
+
+    def test_missing_frame_is_404(self, data_dir):
+        from fastapi.testclient import TestClient
+        from xeen.server import app
+
+        (data_dir / "sessions" / "s1").mkdir(parents=True)
+        res = TestClient(app).get("/api/sessions/s1/thumbs/frame_0009_thumb.webp")
+        assert res.status_code == 404
@@ -0,0 +1,83 @@
+"""Tests for tiles.py — deep-zoom tile pyramid."""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from xeen.archive import source_version
+from xeen.tiles import TILE_SIZE, level_size, render_tile, tile_info, tile_levels
+
+
+def _image(size=(1000, 600)) -> Image.Image:
+    """Biała klatka z czerwonym narożnikiem (prawy dolny róg)."""
+    img = Image.new("RGB", size, "white")
+    img.paste(Image.new("RGB", (100, 100), "red"), (900, 500))
+    return img
+
+
+class TestPyramid:
+    def test_levels(self):
+        assert tile_levels(100, 80) == 1
+        assert tile_levels(256, 256) == 1
+        assert tile_levels(257, 10) == 2
+        assert tile_levels(3840, 2160) == 5
+        assert level_size(3840, 2160, 0, 5) == (240, 135)
+        assert level_size(3840, 2160, 4, 5) == (3840, 2160)
+
+    def test_info(self, make_frame):
+        make_frame(image=_image())
+        info = tile_info("s1", "frame_0000.png")
+        assert info["levels"] == 3
+        assert info["sizes"][-1] == (1000, 600)
+        assert info["sizes"][0] == (250, 150)
+
+    def test_full_res_edge_tile(self, make_frame):
+        make_frame(image=_image())
+        v = source_version("s1", "frame_0000.png")
+        path = render_tile("s1", "frame_0000.png", v, 2, 3, 2)
+        tile = Image.open(path)
+        assert tile.size == (1000 - 3 * TILE_SIZE, 600 - 2 * TILE_SIZE)
+        assert tile.convert("RGB").getpixel((tile.width - 1, tile.height - 1))[1] < 50  # red corner
+
+    def test_lowest_level_is_whole_frame(self, make_frame):
+        make_frame(image=_image())
+        v = source_version("s1", "frame_0000.png")
+        assert Image.open(render_tile("s1", "frame_0000.png", v, 0, 0, 0)).size == (250, 150)
+
+    def test_out_of_range(self, make_frame):
+        make_frame(image=_image())
+        v = source_version("s1", "frame_0000.png")
+        with pytest.raises(ValueError):
+            render_tile("s1", "frame_0000.png", v, 0, 1, 0)
+        with pytest.raises(ValueError):
+            render_tile("s1", "frame_0000.png", v, 3, 0, 0)
+
+    def test_version_changes_with_source(self, make_frame):
+        path = make_frame(image=_image())
+        v1 = source_version("s1", "frame_0000.png")
+        Image.new("RGB", (10, 10)).save(path, "PNG")
+        assert source_version("s1", "frame_0000.png") != v1
+
+
+class TestTilesAPI:
+    def test_tile_etag_and_304(self, make_frame):
+        from fastapi.testclient import TestClient
+        from xeen.server import app
+
+        make_frame(image=_image())
+        client = TestClient(app)
+        info = client.get("/api/sessions/s1/frames/frame_0000.png/tiles").json()
+        assert info["tile_size"] == TILE_SIZE and info["levels"] == 3
+
+        res = client.get("/api/sessions/s1/frames/frame_0000.png/tiles/1/0/0")
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "image/webp"
+        etag = res.headers["etag"]
+        assert Image.open(BytesIO(res.content)).size == (256, 256)
+
+        res2 = client.get("/api/sessions/s1/frames/frame_0000.png/tiles/1/0/0",
+                          headers={"If-None-Match": etag})
+        assert res2.status_code == 304
+        assert client.get("/api/sessions/s1/frames/frame_0000.png/tiles/9/0/0").status_code == 404
+        assert client.get("/api/sessions/s1/frames/nope.png/tiles/0/0/0").status_code == 404
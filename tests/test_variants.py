@@ -0,0 +1,77 @@
+"""Tests for variants.py — Accept negotiation and AVIF/WebP frame variants."""
+
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from xeen import variants
+from xeen.archive import source_version
+
+
+def _image(noise=True) -> Image.Image:
+    if noise:
+        # Zaszumiony gradient: PNG słabo się kompresuje, WebP wyraźnie lepiej
+        base = np.tile(np.linspace(0, 255, 320, dtype=np.uint8), (180, 1))
+        rgb = np.stack([base, base[::-1], base], axis=-1)
+        rgb = rgb + np.random.default_rng(0).integers(0, 16, rgb.shape, dtype=np.uint8)
+        img = Image.fromarray(rgb, "RGB")
+    else:
+        # Szachownica 1 px: PNG ~1 KB, stratny WebP kilkanaście razy więcej
+        board = ((np.indices((256, 256)).sum(0) % 2) * 255).astype(np.uint8)
+        img = Image.fromarray(np.stack([board] * 3, axis=-1), "RGB")
+    return img
+
+
+class TestNegotiate:
+    def test_explicit_types_only(self):
+        assert variants.negotiate(None) is None
+        assert variants.negotiate("*/*") is None
+        assert variants.negotiate("image/*,*/*;q=0.8") is None
+        assert variants.negotiate("image/webp,*/*") == variants.WEBP
+
+    def test_q_values_and_source_type(self):
+        assert variants.negotiate("image/webp;q=0") is None
+        assert variants.negotiate("image/webp", source_type="image/webp") is None
+
+    def test_avif_preferred_when_supported(self, monkeypatch):
+        monkeypatch.setattr(variants, "_avif", True)
+        assert variants.negotiate("image/avif,image/webp,*/*") == variants.AVIF
+        assert variants.negotiate("image/avif;q=0.5,image/webp") == variants.WEBP
+        monkeypatch.setattr(variants, "_avif", False)
+        assert variants.negotiate("image/avif,image/webp") == variants.WEBP
+        assert variants.negotiate("image/avif") is None
+
+
+class TestVariants:
+    def test_lookup_schedules_then_serves(self, make_frame):
+        original = make_frame(image=_image())
+        before = original.read_bytes()
+        assert variants.lookup("s1", "frames", "frame_0000.png", variants.WEBP) is None
+
+        version = source_version("s1", "frame_0000.png")
+        variants.request_variant("s1", "frames", "frame_0000.png", version,
+                                 variants.WEBP).result(timeout=10)
+        path = variants.lookup("s1", "frames", "frame_0000.png", variants.WEBP)
+        assert path is not None and path.parent.name == "variants"
+        assert Image.open(path).format == "WEBP"
+        assert path.stat().st_size * 3 < len(before)
+        assert original.read_bytes() == before
+
+    def test_unprofitable_variant_leaves_marker(self, make_frame):
+        make_frame(image=_image(noise=False))
+        version = source_version("s1", "frame_0000.png")
+        marker = variants.render_variant("s1", "frames", "frame_0000.png", version, variants.WEBP)
+        assert marker.stat().st_size == 0
+        assert variants.lookup("s1", "frames", "frame_0000.png", variants.WEBP) is None
+
+    def test_new_source_gets_new_version(self, make_frame):
+        original = make_frame(image=_image())
+        v1 = source_version("s1", "frame_0000.png")
+        os.utime(original, ns=(0, 1_000_000_000))
+        assert source_version("s1", "frame_0000.png") != v1
+
+    def test_missing_source(self, data_dir):
+        with pytest.raises(FileNotFoundError):
+            variants.lookup("s1", "frames", "nope.png", variants.WEBP)
@@ -0,0 +1,307 @@
+"""Packed session archives: frames and thumbnails in one mmap-able file.
+
+A packed session keeps its small JSON metadata as loose files (so it stays
+editable) and moves ``frames/`` and ``thumbs/`` into ``frames.xpk``::
+
+    b"XPK1" | blob | blob | ... | index JSON | u64 index length | b"XPK1"
+
+The index maps member names (``frames/frame_0000.png``) to ``[offset, length]``.
+Readers mmap the file once and hand out ``memoryview`` slices, so serving a
+frame is a zero-copy slice of the page cache. Derived artifacts (previews,
+auto-crop leftovers) are dropped when packing; they are regenerated on demand.
+
+All frame reads go through :func:`open_frame_image` / :func:`frame_source`,
+which prefer loose files (new captures, unpacked sessions) and fall back to
+the archive. :func:`source_version` / :func:`frame_version` are the single
+source of frame versions for cache keys and ETags (tiles, variants, sprites,
+crops, focus).
+"""
+
+import hashlib
+import io
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from xeen.session_store import (
+    session_dir,
+    session_lock,
+    load_session_meta,
+    list_frame_files,
+)
+
+ARCHIVE_FILENAME = "frames.xpk"
+MAGIC = b"XPK1"
+_TRAILER = struct.Struct("<Q4s")
+PACKED_DIRS = ("frames", "thumbs")
+DERIVED_DIRS = ("preview", "auto_crop", "tiles", "variants")
+
+
+class SessionArchive:
+    """Read-only, mmap-backed view of a ``frames.xpk`` file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mm)
+        if size < len(MAGIC) + _TRAILER.size or self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a xeen archive: {path}")
+        index_len, magic = _TRAILER.unpack_from(self._mm, size - _TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError(f"Corrupt xeen archive trailer: {path}")
+        start = size - _TRAILER.size - index_len
+        self.index: dict[str, list[int]] = json.loads(self._mm[start:start + index_len])["entries"]
+
+    def __contains__(self, member: str) -> bool:
+        return member in self.index
+
+    def get(self, member: str) -> memoryview | None:
+        entry = self.index.get(member)
+        if entry is None:
+            return None
+        offset, length = entry
+        return memoryview(self._mm)[offset:offset + length]
+
+    def names(self, prefix: str = "") -> list[str]:
+        return [n for n in self.index if n.startswith(prefix)]
+
+    def total_bytes(self) -> int:
+        return len(self._mm)
+
+
+def write_archive(path: Path, members: list[tuple[str, Path]]) -> dict:
+    """Write ``members`` (name, source file) to ``path`` atomically. Returns the index."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    entries = {}
+    with open(tmp, "wb") as out:
+        out.write(MAGIC)
+        for member, src in members:
+            offset = out.tell()
+            with open(src, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+            entries[member] = [offset, out.tell() - offset]
+        index = json.dumps({"version": 1, "entries": entries}, separators=(",", ":")).encode()
+        out.write(index)
+        out.write(_TRAILER.pack(len(index), MAGIC))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    return entries
+
+
+# ─── Process-wide cache of open archives ─────────────────────────────────────
+
+_MAX_OPEN = 32
+_open: OrderedDict[str, tuple[tuple, SessionArchive]] = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def archive_path(name: str) -> Path:
+    return session_dir(name) / ARCHIVE_FILENAME
+
+
+def open_archive(name: str) -> SessionArchive | None:
+    """Zwróć otwarte archiwum sesji (z cache) albo None, gdy sesja nie jest spakowana."""
+    path = archive_path(name)
+    key = str(path)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        with _open_lock:
+            _open.pop(key, None)
+        return None
+    sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _open_lock:
+        cached = _open.get(key)
+        if cached and cached[0] == sig:
+            _open.move_to_end(key)
+            return cached[1]
+    archive = SessionArchive(path)
+    with _open_lock:
+        # Nie zamykamy jawnie wypartych archiwów — mogą mieć aktywne memoryview;
+        # mmap zostanie zwolniony przez GC po ostatniej referencji.
+        _open[key] = (sig, archive)
+        while len(_open) > _MAX_OPEN:
+            _open.popitem(last=False)
+    return archive
+
+
+# ─── Frame access (loose files first, then archive) ──────────────────────────
+
+def frame_source(name: str, filename: str, folder: str = "frames") -> Path | memoryview | None:
+    """Locate a frame/thumb: a Path for loose files, a memoryview for packed ones."""
+    path = session_dir(name) / folder / filename
+    if path.exists():
+        return path
+    archive = open_archive(name)
+    if archive is not None:
+        return archive.get(f"{folder}/{filename}")
+    return None
+
+
+def source_version(name: str, filename: str, folder: str = "frames") -> str:
+    """Krótki identyfikator wersji źródła (stat pliku lub archiwum). Raises FileNotFoundError."""
+    src = frame_source(name, filename, folder)
+    if src is None:
+        raise FileNotFoundError(f"{name}/{folder}/{filename}")
+    st = src.stat() if isinstance(src, Path) else archive_path(name).stat()
+    sig = f"{folder}/{filename}:{st.st_mtime_ns}:{st.st_size}:{st.st_ino}"
+    return hashlib.blake2s(sig.encode(), digest_size=6).hexdigest()
+
+
+def frame_version(name: str, frame: dict) -> str | None:
+    """Wersja klatki z metadanych: skrót treści (sha256), inaczej stat źródła; None gdy brak pliku."""
+    if frame.get("sha256"):
+        return frame["sha256"]
+    try:
+        return source_version(name, frame["filename"])
+    except FileNotFoundError:
+        return None
+
+
+def frame_exists(name: str, filename: str, folder: str = "frames") -> bool:
+    return frame_source(name, filename, folder) is not None
+
+
+def read_frame_bytes(name: str, filename: str, folder: str = "frames") -> bytes:
+    src = frame_source(name, filename, folder)
+    if src is None:
+        raise FileNotFoundError(f"{name}/{folder}/{filename}")
+    return src.read_bytes() if isinstance(src, Path) else bytes(src)
+
+
+def open_frame_image(name: str, filename: str, folder: str = "frames") -> Image.Image:
+    """Otwórz klatkę jako PIL Image (plik lub archiwum). Raises FileNotFoundError."""
+    src = frame_source(name, filename, folder)
+    if src is None:
+        raise FileNotFoundError(f"{name}/{folder}/{filename}")
+    if isinstance(src, Path):
+        return Image.open(src)
+    return Image.open(io.BytesIO(src))
+
+
+def available_frames(name: str) -> set[str]:
+    """Nazwy klatek dostępnych na dysku lub w archiwum."""
+    names = list_frame_files(name)
+    archive = open_archive(name)
+    if archive is not None:
+        names |= {n.split("/", 1)[1] for n in archive.names("frames/")}
+    return names
+
+
+# ─── pack / unpack ───────────────────────────────────────────────────────────
+
+def is_packed(name: str) -> bool:
+    return archive_path(name).exists()
+
+
+def pack_session(name: str) -> dict:
+    """Spakuj frames/ i thumbs/ sesji do frames.xpk; usuń luźne pliki i artefakty pochodne.
+
+    Frames already in an existing archive are carried over, so re-packing a
+    session that received new frames merges both. Raises FileNotFoundError
+    when the session does not exist.
+    """
+    from xeen.frame_store import release_frames
+
+    sdir = session_dir(name)
+    with session_lock(name):
+        old = open_archive(name)
+        members: list[tuple[str, Path]] = []
+        carried: dict[str, bytes] = {}
+        loose_count = 0
+        for folder in PACKED_DIRS:
+            d = sdir / folder
+            if d.is_dir():
+                for f in sorted(d.iterdir()):
+                    if f.is_file():
+                        members.append((f"{folder}/{f.name}", f))
+                        loose_count += 1
+        if old is not None:
+            have = {m for m, _ in members}
+            for member in old.names():
+                if member not in have:
+                    carried[member] = bytes(old.get(member))
+
+        tmp_dir = None
+        if carried:
+            tmp_dir = sdir / ".pack_tmp"
+            tmp_dir.mkdir(exist_ok=True)
+            for i, (member, data) in enumerate(carried.items()):
+                p = tmp_dir / f"{i:06d}"
+                p.write_bytes(data)
+                members.append((member, p))
+        members.sort(key=lambda m: m[0])
+
+        entries = write_archive(archive_path(name), members)
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        try:
+            frames = load_session_meta(name).get("frames", [])
+        except FileNotFoundError:
+            frames = []
+        for folder in PACKED_DIRS + DERIVED_DIRS:
+            shutil.rmtree(sdir / folder, ignore_errors=True)
+        release_frames(frames)
+
+    return {
+        "name": name,
+        "members": len(entries),
+        "packed_files": loose_count,
+        "bytes": archive_path(name).stat().st_size,
+    }
+
+
+def unpack_session(name: str) -> dict:
+    """Rozpakuj frames.xpk z powrotem do frames/ i thumbs/ (pliki luźne mają pierwszeństwo)."""
+    from xeen.frame_store import store_frame
+
+    sdir = session_dir(name)
+    with session_lock(name):
+        archive = open_archive(name)
+        if archive is None:
+            return {"name": name, "members": 0}
+        count = 0
+        for member in archive.names():
+            folder, filename = member.split("/", 1)
+            target = sdir / folder / filename
+            if target.exists():
+                continue
+            data = bytes(archive.get(member))
+            if folder == "frames":
+                store_frame(target.parent, filename, data)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+            count += 1
+        archive_path(name).unlink()
+        open_archive(name)  # wyczyść wpis z cache
+    return {"name": name, "members": count}
+
+
+def cold_sessions(older_than_days: float) -> list[str]:
+    """Sesje bez zmian od ``older_than_days`` dni, które mają jeszcze luźne klatki."""
+    from xeen.config import get_data_dir
+
+    cutoff = time.time() - older_than_days * 86400
+    result = []
+    for d in sorted((get_data_dir() / "sessions").iterdir()):
+        meta = d / "session.json"
+        if not d.is_dir() or not meta.exists() or not (d / "frames").is_dir():
+            continue
+        newest = max(
+            [meta.stat().st_mtime] + [f.stat().st_mtime for f in (d / "frames").iterdir()]
+        )
+        if newest < cutoff:
+            result.append(d.name)
+    return result
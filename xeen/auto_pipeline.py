@@ -1,4 +1,4 @@
-"""xeen auto — zero-click pipeline: capture → deduplicate → center → crop → export.
+"""xeen auto — zero-click pipeline: capture → deduplicate → focus → crop → export.
 
 Usage:
     xeen auto                           # capture 10s → widescreen MP4
@@ -7,7 +7,6 @@ Usage:
     xeen auto --session existing_name   # skip capture, process existing session
 """
 
-import json
 import shutil
 import subprocess
 import tempfile
@@ -17,7 +16,12 @@ from pathlib import Path
 
 from PIL import Image
 
+from xeen.archive import open_frame_image
 from xeen.config import get_data_dir, CROP_PRESETS
+from xeen.crop_plan import header_size_reader, plan_crops
+from xeen.crop_render import crop_resize
+from xeen.focus import session_focus
+from xeen.session_store import load_session_meta
 
 
 def auto_pipeline(
@@ -41,10 +45,10 @@ def auto_pipeline(
     # ─── Step 1: Capture (or use existing session) ────────────────────────
     if session_name:
         session_dir = data / "sessions" / session_name
-        meta_file = session_dir / "session.json"
-        if not meta_file.exists():
+        try:
+            meta = load_session_meta(session_name)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Sesja '{session_name}' nie istnieje")
-        meta = json.loads(meta_file.read_text())
         if verbose:
             print(f"  📂 Używam istniejącej sesji: {session_name}")
     else:
@@ -69,7 +73,7 @@ def auto_pipeline(
         summary = session.summary()
         session_name = summary["name"]
         session_dir = Path(summary["path"])
-        meta = json.loads((session_dir / "session.json").read_text())
+        meta = load_session_meta(session_name)
 
         if verbose:
             print(f"  ✅ {summary['frame_count']} klatek | {summary['duration']:.1f}s")
@@ -96,12 +100,17 @@ def auto_pipeline(
     if verbose and removed > 0:
         print(f"     Usunięto {removed} duplikatów → {len(unique_indices)} klatek")
 
-    # ─── Step 3: Auto-center (from mouse cursor positions) ────────────────
+    # ─── Step 3: Auto-focus (kliknięcia, pisanie, zmiany ekranu) ─────────
     if verbose:
-        print(f"  🎯 Auto-center z pozycji kursora...")
+        print(f"  🎯 Auto-focus z aktywności (wejście + zmiany ekranu)...")
+
+    focus_points = session_focus(session_name)
 
+    # Klatki bez aktywności: środek z pozycji kursora, jak dotąd
     custom_centers = {}
     for idx in unique_indices:
+        if str(idx) in focus_points:
+            continue
         f = frames[idx]
         mx = f.get("mouse_x", 0) or f.get("suggested_center_x", 0)
         my = f.get("mouse_y", 0) or f.get("suggested_center_y", 0)
@@ -112,6 +121,10 @@ def auto_pipeline(
             my = f.get("height", 1080) // 2
         custom_centers[str(idx)] = {"x": mx, "y": my}
 
+    if verbose:
+        active = len(unique_indices) - len(custom_centers)
+        print(f"     Aktywność w {active}/{len(unique_indices)} klatkach, reszta: pozycja kursora")
+
     # ─── Step 4: Crop to preset ───────────────────────────────────────────
     if preset not in CROP_PRESETS:
         print(f"  ⚠️  Nieznany preset '{preset}', używam 'widescreen'")
@@ -119,7 +132,6 @@ def auto_pipeline(
 
     target_w = CROP_PRESETS[preset]["w"]
     target_h = CROP_PRESETS[preset]["h"]
-    aspect = target_w / target_h
 
     if verbose:
         print(f"  ✂️  Crop: {CROP_PRESETS[preset]['label']} ({target_w}×{target_h})")
@@ -127,31 +139,20 @@ def auto_pipeline(
     crop_dir = session_dir / "auto_crop"
     crop_dir.mkdir(exist_ok=True)
 
+    # Prostokąty z metadanych (ten sam planer co podgląd w GUI), dekodowanie tylko do renderu
+    plan = plan_crops(frames, unique_indices, target_w, target_h, focus_mode="auto",
+                      focus=focus_points, custom_centers=custom_centers,
+                      size_of=header_size_reader(session_name))
+
     cropped_files = []
-    for idx in unique_indices:
+    for idx, box in plan:
         f = frames[idx]
-        filepath = session_dir / "frames" / f["filename"]
-        if not filepath.exists():
+        try:
+            img = open_frame_image(session_name, f["filename"])
+        except FileNotFoundError:
             continue
 
-        img = Image.open(filepath)
-        iw, ih = img.size
-
-        center = custom_centers.get(str(idx), {"x": iw // 2, "y": ih // 2})
-        cx, cy = center["x"], center["y"]
-
-        if iw / ih > aspect:
-            crop_h = ih
-            crop_w = int(ih * aspect)
-        else:
-            crop_w = iw
-            crop_h = int(iw / aspect)
-
-        left = max(0, min(cx - crop_w // 2, iw - crop_w))
-        top = max(0, min(cy - crop_h // 2, ih - crop_h))
-
-        cropped = img.crop((left, top, left + crop_w, top + crop_h))
-        cropped = cropped.resize((target_w, target_h), Image.LANCZOS)
+        cropped = crop_resize(img, box, (target_w, target_h))
 
         # Apply watermark/branding if configured
         try:
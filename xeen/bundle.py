@@ -0,0 +1,323 @@
+"""Session bundles: a streaming tar.gz with metadata and frames.
+
+Layout (members in this order)::
+
+    xeen-bundle.json      manifest: version, session name, frame list with sizes
+    session.json          full metadata (core + frames + OCR + events, captions, centers)
+    frames/frame_0000.png ...
+    xeen-checksums.json   sha256 of every frame, computed while streaming
+
+Both directions are single-pass: :func:`iter_bundle` yields compressed chunks
+as frames are read (no temp file), and :func:`import_bundle` reads any
+file-like object sequentially (``tarfile`` stream mode), hashing frames as
+they arrive. The import lands in a hidden staging directory and is renamed
+into place only after every check passed, so a truncated or tampered upload
+never leaves a half-imported session behind.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import queue
+import re
+import shutil
+import tarfile
+import time
+import uuid
+import zlib
+
+from xeen.archive import frame_source
+from xeen.config import get_data_dir
+from xeen.frame_store import release_frames, store_frame
+from xeen.session_store import (
+    ALL_FIELDS,
+    forget_session,
+    load_session_meta,
+    save_session_meta,
+)
+
+BUNDLE_VERSION = 1
+MANIFEST = "xeen-bundle.json"
+CHECKSUMS = "xeen-checksums.json"
+META = "session.json"
+BUNDLE_SUFFIX = ".xeen.tgz"
+
+MAX_META_BYTES = 64 * 1024 * 1024
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+_READ_CHUNK = 1 << 20
+
+_SAFE_NAME = re.compile(r"^\w[\w.\-]*$")
+
+
+class BundleError(ValueError):
+    """Niepoprawny lub uszkodzony bundle."""
+
+
+def valid_session_name(name: str) -> bool:
+    return bool(name) and len(name) <= 128 and _SAFE_NAME.match(name) is not None
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+
+class _ChunkSink:
+    """File-like sink collecting compressed output between yields."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+class _HashingReader:
+    def __init__(self, raw, digest):
+        self._raw = raw
+        self._digest = digest
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._raw.read(n)
+        self._digest.update(data)
+        return data
+
+
+def _add_bytes(tar: tarfile.TarFile, member: str, data: bytes, mtime: float) -> None:
+    info = tarfile.TarInfo(member)
+    info.size = len(data)
+    info.mtime = int(mtime)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def iter_bundle(name: str):
+    """Yield a session bundle as gzip chunks. Raises FileNotFoundError before the first chunk."""
+    meta = load_session_meta(name, fields=ALL_FIELDS)
+    now = time.time()
+
+    sources = []
+    for f in meta.get("frames", []):
+        src = frame_source(name, f["filename"])
+        if src is None:
+            continue
+        size = src.stat().st_size if not isinstance(src, memoryview) else len(src)
+        sources.append((f["filename"], src, size))
+
+    def generate():
+        sink = _ChunkSink()
+        gz = gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=1, mtime=0)
+        tar = tarfile.open(fileobj=gz, mode="w|", format=tarfile.PAX_FORMAT)
+        manifest = {
+            "version": BUNDLE_VERSION,
+            "name": name,
+            "exported_at": now,
+            "frames": [{"filename": fn, "size": size} for fn, _, size in sources],
+        }
+        _add_bytes(tar, MANIFEST, json.dumps(manifest).encode(), now)
+        _add_bytes(tar, META, json.dumps(meta, ensure_ascii=False).encode(), now)
+        yield sink.drain()
+
+        checksums = {}
+        for filename, src, size in sources:
+            digest = hashlib.sha256()
+            info = tarfile.TarInfo(f"frames/{filename}")
+            info.size = size
+            info.mtime = int(now)
+            if isinstance(src, memoryview):
+                tar.addfile(info, _HashingReader(io.BytesIO(src), digest))
+            else:
+                with open(src, "rb") as fh:
+                    tar.addfile(info, _HashingReader(fh, digest))
+            checksums[filename] = digest.hexdigest()
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+
+        _add_bytes(tar, CHECKSUMS, json.dumps(checksums).encode(), now)
+        tar.close()
+        gz.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def write_bundle(name: str, fileobj) -> int:
+    """Zapisz bundle sesji do pliku; zwraca liczbę bajtów."""
+    total = 0
+    for chunk in iter_bundle(name):
+        fileobj.write(chunk)
+        total += len(chunk)
+    return total
+
+
+# ─── Import ──────────────────────────────────────────────────────────────────
+
+def _read_member(tar: tarfile.TarFile, member: tarfile.TarInfo, limit: int) -> bytes:
+    if member.size > limit:
+        raise BundleError(f"{member.name}: too large ({member.size} bytes)")
+    return tar.extractfile(member).read()
+
+
+def _read_json(tar: tarfile.TarFile, member: tarfile.TarInfo):
+    try:
+        return json.loads(_read_member(tar, member, MAX_META_BYTES))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise BundleError(f"{member.name}: invalid JSON ({e})")
+
+
+def import_bundle(fileobj, name: str | None = None) -> dict:
+    """Zaimportuj bundle z dowolnego strumienia (czytanego sekwencyjnie).
+
+    Raises BundleError for malformed/corrupt bundles and FileExistsError when
+    the target session already exists.
+    """
+    sessions = get_data_dir() / "sessions"
+    staging_name = f".import-{uuid.uuid4().hex[:12]}"
+    staging = sessions / staging_name
+    (staging / "frames").mkdir(parents=True)
+    stored: list[dict] = []
+    try:
+        try:
+            tar = tarfile.open(fileobj=fileobj, mode="r|*")
+        except tarfile.TarError as e:
+            raise BundleError(f"Not a bundle: {e}")
+
+        manifest = meta = checksums = None
+        expected: dict[str, int] = {}
+        hashes: dict[str, str] = {}
+        try:
+            for member in tar:
+                if manifest is None:
+                    if member.name != MANIFEST or not member.isfile():
+                        raise BundleError(f"First member must be {MANIFEST}")
+                    manifest = _read_json(tar, member)
+                    if not isinstance(manifest, dict) or manifest.get("version") != BUNDLE_VERSION:
+                        raise BundleError("Unsupported bundle version")
+                    target = name or manifest.get("name", "")
+                    if not valid_session_name(target):
+                        raise BundleError(f"Invalid session name: {target!r}")
+                    if (sessions / target).exists():
+                        raise FileExistsError(target)
+                    try:
+                        expected = {f["filename"]: int(f["size"]) for f in manifest.get("frames", [])}
+                    except (KeyError, TypeError, ValueError):
+                        raise BundleError("Malformed manifest frame list")
+                    if not all(valid_session_name(fn) for fn in expected):
+                        raise BundleError("Invalid frame filename in manifest")
+                    continue
+
+                if not member.isfile():
+                    raise BundleError(f"Unexpected member type: {member.name}")
+                if member.name == META:
+                    meta = _read_json(tar, member)
+                    if not isinstance(meta, dict):
+                        raise BundleError("session.json must be an object")
+                elif member.name == CHECKSUMS:
+                    checksums = _read_json(tar, member)
+                elif member.name.startswith("frames/"):
+                    filename = member.name[len("frames/"):]
+                    if filename not in expected or filename in hashes:
+                        raise BundleError(f"Unexpected frame: {filename}")
+                    if member.size != expected[filename] or member.size > MAX_FRAME_BYTES:
+                        raise BundleError(f"{filename}: size mismatch")
+                    data = tar.extractfile(member).read()
+                    hashes[filename] = hashlib.sha256(data).hexdigest()
+                    sha = store_frame(staging / "frames", filename, data)
+                    stored.append({"filename": filename, "sha256": sha})
+                else:
+                    raise BundleError(f"Unexpected member: {member.name}")
+        except (tarfile.TarError, EOFError, OSError, zlib.error) as e:
+            if isinstance(e, FileExistsError):
+                raise
+            raise BundleError(f"Truncated or corrupt bundle: {e}")
+
+        if manifest is None or meta is None:
+            raise BundleError("Bundle is missing manifest or session.json")
+        if checksums is None:
+            raise BundleError("Bundle is truncated (no checksums)")
+        if set(hashes) != set(expected):
+            raise BundleError(f"Missing frames: {sorted(set(expected) - set(hashes))}")
+        bad = [fn for fn, h in hashes.items() if checksums.get(fn) != h]
+        if bad:
+            raise BundleError(f"Checksum mismatch: {bad}")
+        frames = meta.get("frames", [])
+        if not isinstance(frames, list) or not all(isinstance(f, dict) for f in frames):
+            raise BundleError("session.json: frames must be a list of objects")
+        unknown = [f.get("filename") for f in frames if f.get("filename") not in hashes]
+        if unknown:
+            raise BundleError(f"session.json references frames not in bundle: {unknown}")
+
+        by_name = {s["filename"]: s["sha256"] for s in stored}
+        for f in frames:
+            f["sha256"] = by_name[f["filename"]]
+        meta["name"] = target
+        save_session_meta(staging_name, meta)
+        forget_session(staging_name)
+        if (sessions / target).exists():
+            raise FileExistsError(target)
+        os.rename(staging, sessions / target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        forget_session(staging_name)
+        release_frames(stored)
+        raise
+
+    return {"name": target, "frame_count": len(hashes), "source": manifest.get("name")}
+
+
+# ─── Streaming body adapter (async producer → sync tarfile reader) ───────────
+
+class StreamReader:
+    """Blocking file-like fed chunk by chunk from another thread/event loop.
+
+    The queue is bounded, so a fast client can't buffer more than
+    ``maxsize`` chunks in memory while the importer is busy writing frames.
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._buf = b""
+        self._eof = False
+        self.closed = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """Podaj fragment danych; False, gdy czytelnik już skończył (dalsze dane są zbędne)."""
+        while not self.closed:
+            try:
+                self._q.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def feed_eof(self) -> None:
+        self._eof = True
+
+    def close(self) -> None:
+        self.closed = True
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            parts = []
+            while chunk := self.read(_READ_CHUNK):
+                parts.append(chunk)
+            return b"".join(parts)
+        while not self._buf:
+            try:
+                self._buf = self._q.get(timeout=0.1)
+            except queue.Empty:
+                if self._eof and self._q.empty():
+                    return b""
+        if n >= len(self._buf):
+            data, self._buf = self._buf, b""
+        else:
+            data, self._buf = self._buf[:n], self._buf[n:]
+        return data
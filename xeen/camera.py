@@ -0,0 +1,196 @@
+"""Virtual camera: smooth pan/zoom between per-frame crop windows.
+
+A still export shows every selected frame through its own static crop. The
+virtual camera instead treats those crops as keyframes of a moving window:
+each frame is held for ``hold`` seconds, and during the last ``pan`` seconds
+the window glides — center and size eased together — to the next frame's
+crop while the image crossfades into it. Keyframes come from ``plan_crops``
+(custom centers → focus mode), with the pointer position from each frame's
+``input_events`` as the center where no custom center is marked, and an
+optional per-frame ``zoom`` in ``custom_centers``.
+
+Output frames are rendered in memory from one decoded copy of each source
+frame and yielded as images for a raw pipe into ffmpeg (``ffmpeg_pipe``);
+nothing is written to disk. Windows are fractional, so slow pans move by
+sub-pixel steps instead of jittering, and held frames are rendered once and
+repeated.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from PIL import Image
+
+from xeen.archive import open_frame_image
+from xeen.crop_plan import CropPlan
+from xeen.crop_render import crop_resize
+
+POINTER_KINDS = ("mouse_click", "mouse_move")
+
+
+def _linear(t: float) -> float:
+    return t
+
+
+def _ease_in_out(t: float) -> float:
+    return 4 * t ** 3 if t < 0.5 else 1 - (-2 * t + 2) ** 3 / 2
+
+
+def _ease_out(t: float) -> float:
+    return 1 - (1 - t) ** 3
+
+
+EASINGS: dict[str, Callable[[float], float]] = {
+    "linear": _linear,
+    "ease_in_out": _ease_in_out,
+    "ease_out": _ease_out,
+}
+
+
+@dataclass
+class Shot:
+    """Klatka kluczowa kamery: źródło i okno (środek + rozmiar, ułamkowe)."""
+
+    filename: str
+    cx: float
+    cy: float
+    w: float
+    h: float
+
+
+def pointer_centers(frames: list[dict], indices: list[int]) -> dict:
+    """Środki z wejścia: ostatni klik klatki, w jego braku ostatni ruch myszy.
+
+    Returns ``{"<index>": {"x", "y"}}`` in the ``custom_centers`` format for
+    the frames whose ``input_events`` contain pointer activity.
+    """
+    centers = {}
+    for i in indices:
+        if not 0 <= i < len(frames):
+            continue
+        events = [e for e in frames[i].get("input_events") or [] if e.get("kind") in POINTER_KINDS]
+        if not events:
+            continue
+        clicks = [e for e in events if e["kind"] == "mouse_click"]
+        last = (clicks or events)[-1]
+        centers[str(i)] = {"x": last.get("x", 0), "y": last.get("y", 0)}
+    return centers
+
+
+def shots_from_plan(plan: CropPlan, frames: list[dict], custom_centers: dict | None = None) -> list[Shot]:
+    """Klatki kluczowe z planu przycięcia; ``custom_centers[i]["zoom"]`` dodatkowo przybliża."""
+    custom_centers = custom_centers or {}
+    shots = []
+    for idx, (left, top, right, bottom) in plan:
+        w, h = right - left, bottom - top
+        zoom = float((custom_centers.get(str(idx)) or {}).get("zoom") or 1.0)
+        zoom = max(1.0, zoom)
+        shots.append(Shot(frames[idx]["filename"], left + w / 2, top + h / 2, w / zoom, h / zoom))
+    return shots
+
+
+def _lerp(a: float, b: float, t: float) -> float:
+    return a + (b - a) * t
+
+
+def _between(a: Shot, b: Shot, t: float) -> tuple[float, float, float, float]:
+    # Rozmiar interpolowany geometrycznie — stałe tempo zoomu w odbiorze
+    w = a.w * (b.w / a.w) ** t
+    h = a.h * (b.h / a.h) ** t
+    return _lerp(a.cx, b.cx, t), _lerp(a.cy, b.cy, t), w, h
+
+
+def camera_path(shots: list[Shot], fps: float, hold: float, pan: float,
+                easing: str = "ease_in_out") -> Iterator[tuple[int, float, tuple]]:
+    """Okno kamery dla każdej klatki wyjściowej: ``(shot, mix, (cx, cy, w, h))``.
+
+    ``mix`` is the eased progress (0…1) of the move from shot ``i`` to
+    ``i + 1``; it is 0 while the camera holds. The move takes the last
+    ``pan`` seconds of each shot, the last shot only holds.
+    """
+    ease = EASINGS.get(easing, _ease_in_out)
+    pan = max(0.0, min(pan, hold))
+    per_shot = _per_shot(fps, hold)
+    pan_frames = round(pan * fps)
+    for i, shot in enumerate(shots):
+        for k in range(per_shot):
+            moving = i + 1 < len(shots) and pan_frames and k >= per_shot - pan_frames
+            if not moving:
+                yield i, 0.0, (shot.cx, shot.cy, shot.w, shot.h)
+                continue
+            u = (k - (per_shot - pan_frames) + 1) / (pan_frames + 1)
+            mix = ease(u)
+            yield i, mix, _between(shot, shots[i + 1], mix)
+
+
+def _per_shot(fps: float, hold: float) -> int:
+    return max(1, round(hold * fps))
+
+
+def path_length(shots: list[Shot], fps: float, hold: float) -> int:
+    """Liczba klatek wyjściowych ``camera_path`` dla tych kadrów."""
+    return len(shots) * _per_shot(fps, hold)
+
+
+def available_shots(name: str, shots: list[Shot]) -> list[Shot]:
+    """Kadry, których klatka źródłowa istnieje (sprawdzany tylko nagłówek)."""
+    available = []
+    for shot in shots:
+        try:
+            with open_frame_image(name, shot.filename):
+                available.append(shot)
+        except FileNotFoundError:
+            continue
+    return available
+
+
+def window_box(window: tuple, size: tuple[int, int]) -> tuple[float, float, float, float]:
+    """Okno (środek, rozmiar) → prostokąt mieszczący się w obrazie ``size``."""
+    cx, cy, w, h = window
+    iw, ih = size
+    scale = min(1.0, iw / w, ih / h)
+    w, h = w * scale, h * scale
+    left = min(max(0.0, cx - w / 2), iw - w)
+    top = min(max(0.0, cy - h / 2), ih - h)
+    return left, top, left + w, top + h
+
+
+def render_camera(name: str, shots: list[Shot], size: tuple[int, int], fps: float,
+                  hold: float, pan: float, easing: str = "ease_in_out",
+                  finish: Callable[[Image.Image], Image.Image] | None = None) -> Iterator[Image.Image]:
+    """Wyrenderuj przejazd kamery klatka po klatce (w pamięci).
+
+    Every source frame is decoded once and dropped once the camera has
+    moved past it. ``finish`` post-processes each distinct output frame
+    (e.g. the watermark); held frames are yielded again without
+    re-rendering. Every shot's source must exist — filter with
+    ``available_shots`` first.
+    """
+    decoded: dict[int, Image.Image] = {}
+
+    def source(i: int) -> Image.Image:
+        if i not in decoded:
+            with open_frame_image(name, shots[i].filename) as img:
+                decoded[i] = img.convert("RGB")
+            for old in [k for k in decoded if k < i - 1]:
+                del decoded[old]  # kamera już minęła tę klatkę
+        return decoded[i]
+
+    last_key, last = None, None
+    for i, mix, window in camera_path(shots, fps, hold, pan, easing):
+        key = (i, mix, window)
+        if key == last_key:
+            yield last
+            continue
+        img = source(i)
+        if mix == 0.0:
+            frame = crop_resize(img, window_box(window, img.size), size)
+        else:
+            nxt = source(i + 1)
+            a = crop_resize(img, window_box(window, img.size), size, Image.BICUBIC)
+            b = crop_resize(nxt, window_box(window, nxt.size), size, Image.BICUBIC)
+            frame = Image.blend(a, b, mix)
+        if finish is not None:
+            frame = finish(frame)
+        last_key, last = key, frame
+        yield frame
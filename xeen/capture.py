@@ -4,7 +4,6 @@ Uses automatic backend fallback chain:
 mss → Pillow → system tools → browser Screen Capture API
 """
 
-import json
 import subprocess
 import sys
 import time
@@ -18,6 +17,10 @@ from PIL import Image
 
 from xeen.config import get_data_dir
 from xeen.capture_backends import detect_backend, BrowserCaptureNeeded, CaptureBackend
+from xeen.frame_store import encode_png, store_frame
+from xeen.focus import request_focus
+from xeen.session_store import save_session_meta
+from xeen.thumbs import THUMB_QUALITY, make_thumbnail, thumb_name
 
 
 def _ensure_package(pip_name: str, import_name: str | None = None) -> bool:
@@ -69,6 +72,7 @@ class FrameMeta:
     ocr_text: str = ""           # tekst wyekstrahowany przez OCR
     ocr_words: int = 0           # liczba słów
     ocr_available: bool = False  # czy tesseract był dostępny
+    sha256: str = ""             # hash treści PNG (content-addressed store)
 
 
 class InputTracker:
@@ -432,7 +436,8 @@ class CaptureSession:
 
                 # ── Save frame ──────────────────────────────────────────────
                 try:
-                    img.save(filepath, "PNG", optimize=True)
+                    png = encode_png(img, optimize=True)
+                    frame_sha = store_frame(filepath.parent, filename, png)
                     file_size = filepath.stat().st_size
                     if file_size == 0:
                         print(f"  ❌ BŁĄD: Plik {filename} zapisany ale ma 0 bajtów! ({filepath})")
@@ -440,11 +445,8 @@ class CaptureSession:
                     # Save thumbnail (320px wide WebP) for fast landing page
                     thumb_dir = self.session_dir / "thumbs"
                     thumb_dir.mkdir(exist_ok=True)
-                    thumb_name = f"frame_{frame_idx:04d}_thumb.webp"
-                    thumb_w = 320
-                    thumb_h = int(img.height * (thumb_w / img.width))
-                    thumb = img.resize((thumb_w, thumb_h), Image.LANCZOS)
-                    thumb.save(thumb_dir / thumb_name, "WEBP", quality=75)
+                    thumb = make_thumbnail(img)
+                    thumb.save(thumb_dir / thumb_name(filename), "WEBP", quality=THUMB_QUALITY)
                 except Exception as save_err:
                     print(f"  ❌ BŁĄD ZAPISU klatki {frame_idx+1}: {save_err}")
                     print(f"     Ścieżka: {filepath}")
@@ -476,6 +478,7 @@ class CaptureSession:
                     ocr_text=ocr_text,
                     ocr_words=ocr_words,
                     ocr_available=ocr_ok,
+                    sha256=frame_sha,
                 )
                 self.frames.append(frame)
                 self._prev_array = arr
@@ -519,6 +522,7 @@ class CaptureSession:
         self._running = False
         self.tracker.stop()
         self._save_session_meta()
+        request_focus(self.name)  # pierwszy podgląd auto-focus nie czeka na analizę
 
     def _save_session_meta(self):
         """Zapisz metadane sesji do pliku JSON."""
@@ -538,8 +542,7 @@ class CaptureSession:
             "input_log": [asdict(e) for e in self.tracker.events],
         }
 
-        meta_path = self.session_dir / "session.json"
-        meta_path.write_text(json.dumps(meta, indent=2, ensure_ascii=False))
+        save_session_meta(self.name, meta)
 
     def summary(self) -> dict:
         return {
@@ -37,6 +37,8 @@ def main():
     srv.add_argument("--no-browser", action="store_true", help="Nie otwieraj przeglądarki")
     srv.add_argument("--data-dir", type=str, default=None,
                      help="Katalog danych (domyślnie: ~/.xeen)")
+    srv.add_argument("-w", "--workers", type=int, default=1,
+                     help="Liczba procesów uvicorn (domyślnie: 1)")
 
     # xeen auto
     auto = sub.add_parser("auto", aliases=["a"], help="Zero-click: capture → crop → export (jeden krok)")
@@ -67,6 +69,37 @@ def main():
     # xeen list
     sub.add_parser("list", aliases=["l"], help="Lista sesji nagrywania")
 
+    # xeen migrate
+    mig = sub.add_parser("migrate", help="Rozdziel stare session.json na core + sidecary")
+    mig.add_argument("sessions", nargs="*", help="Nazwy sesji (domyślnie: wszystkie)")
+    mig.add_argument("--compact", action="store_true", help="Zapisz JSON bez wcięć")
+
+    # xeen gc
+    gc = sub.add_parser("gc", help="Usuń nieużywane bloby klatek (content-addressed store)")
+    gc.add_argument("--dry-run", action="store_true", help="Tylko pokaż, co zostałoby usunięte")
+
+    # xeen pack / unpack
+    pk = sub.add_parser("pack", help="Spakuj klatki sesji do jednego pliku frames.xpk")
+    pk.add_argument("sessions", nargs="*", help="Nazwy sesji (domyślnie: nieaktywne sesje)")
+    pk.add_argument("--older-than", type=float, default=30.0,
+                    help="Pakuj sesje bez zmian od N dni (gdy nie podano nazw, domyślnie: 30)")
+    upk = sub.add_parser("unpack", help="Rozpakuj frames.xpk z powrotem do luźnych plików")
+    upk.add_argument("sessions", nargs="+", help="Nazwy sesji")
+
+    # xeen storage
+    st = sub.add_parser("storage", help="Użycie dysku i budżet plików pochodnych (podglądy, eksporty)")
+    st.add_argument("--enforce", action="store_true", help="Usuń najdawniej używane pliki ponad budżet")
+    st.add_argument("--budget", type=int, default=None, help="Budżet w MB (domyślnie: XEEN_STORAGE_BUDGET_MB)")
+    st.add_argument("--dry-run", action="store_true", help="Tylko pokaż, co zostałoby usunięte")
+
+    # xeen bundle / import
+    bnd = sub.add_parser("bundle", help="Zapisz sesję jako przenośny bundle (.xeen.tgz)")
+    bnd.add_argument("session", help="Nazwa sesji")
+    bnd.add_argument("-o", "--output", default=None, help="Plik wyjściowy ('-' = stdout)")
+    imp = sub.add_parser("import", help="Zaimportuj sesję z bundla (.xeen.tgz)")
+    imp.add_argument("file", help="Plik bundla ('-' = stdin)")
+    imp.add_argument("--name", default=None, help="Nazwa sesji (domyślnie: z bundla)")
+
     args = parser.parse_args()
 
     # Domyślnie uruchom capture
@@ -89,6 +122,20 @@ def main():
         run_desktop(args)
     elif args.command in ("list", "l"):
         run_list(args)
+    elif args.command == "migrate":
+        run_migrate(args)
+    elif args.command == "gc":
+        run_gc(args)
+    elif args.command == "pack":
+        run_pack(args)
+    elif args.command == "unpack":
+        run_unpack(args)
+    elif args.command == "storage":
+        run_storage(args)
+    elif args.command == "bundle":
+        run_bundle(args)
+    elif args.command == "import":
+        run_import(args)
     else:
         parser.print_help()
 
@@ -217,6 +264,7 @@ def run_server(args):
         "xeen.server:app",
         host=args.host,
         port=args.port,
+        workers=max(1, args.workers),
         log_level="warning",
     )
 
@@ -300,8 +348,7 @@ def run_desktop(args):
 def run_list(args):
     """Pokaż listę sesji."""
     from xeen.config import get_data_dir
-    from pathlib import Path
-    import json
+    from xeen.session_store import load_session_meta
 
     data_dir = get_data_dir() / "sessions"
     if not data_dir.exists():
@@ -315,9 +362,11 @@ def run_list(args):
 
     print(f"📋 Sesje ({len(sessions)}):\n")
     for s in sessions[:20]:
-        meta_file = s / "session.json"
-        if meta_file.exists():
-            meta = json.loads(meta_file.read_text())
+        try:
+            meta = load_session_meta(s.name, fields=())
+        except (FileNotFoundError, NotADirectoryError):
+            meta = None
+        if meta is not None:
             frames = meta.get("frame_count", "?")
             dur = meta.get("duration", 0)
             print(f"  {s.name:30s}  {frames:>3} klatek  {dur:.1f}s")
@@ -325,5 +374,135 @@ def run_list(args):
             print(f"  {s.name}")
 
 
+def run_migrate(args):
+    """Przekonwertuj sesje do układu core + sidecary (frames/ocr/events)."""
+    from xeen.config import get_data_dir
+    from xeen.session_store import migrate_session
+
+    sessions_dir = get_data_dir() / "sessions"
+    names = args.sessions or sorted(p.name for p in sessions_dir.iterdir() if p.is_dir())
+
+    migrated = 0
+    for name in names:
+        try:
+            if migrate_session(name, compact=True if args.compact else None):
+                migrated += 1
+                print(f"  ✅ {name}")
+        except FileNotFoundError:
+            print(f"  ⚠️  {name}: brak session.json")
+    print(f"\n📦 Zmigrowano {migrated}/{len(names)} sesji")
+
+
+def run_gc(args):
+    """Usuń bloby, do których nie odwołuje się już żadna sesja."""
+    from xeen.frame_store import gc_blobs, blob_stats
+
+    result = gc_blobs(dry_run=args.dry_run)
+    verb = "Do usunięcia" if args.dry_run else "Usunięto"
+    print(f"🧹 {verb}: {result['removed']} blobów ({result['freed_bytes'] / 1024 / 1024:.1f} MB)")
+    stats = blob_stats()
+    print(f"   Pozostało: {stats['blobs']} blobów, {stats['bytes'] / 1024 / 1024:.1f} MB, "
+          f"{stats['references']} referencji")
+
+
+def run_pack(args):
+    """Spakuj nieaktywne sesje do archiwów frames.xpk (mmap, jeden plik na sesję)."""
+    from xeen.archive import pack_session, cold_sessions
+
+    names = args.sessions or cold_sessions(args.older_than)
+    if not names:
+        print(f"📦 Brak sesji bez zmian od {args.older_than:g} dni")
+        return
+    for name in names:
+        try:
+            result = pack_session(name)
+        except FileNotFoundError:
+            print(f"  ⚠️  {name}: sesja nie istnieje")
+            continue
+        print(f"  📦 {name}: {result['members']} plików, {result['bytes'] / 1024 / 1024:.1f} MB")
+
+
+def run_unpack(args):
+    """Rozpakuj archiwa frames.xpk do frames/ i thumbs/."""
+    from xeen.archive import unpack_session
+
+    for name in args.sessions:
+        try:
+            result = unpack_session(name)
+        except FileNotFoundError:
+            print(f"  ⚠️  {name}: sesja nie istnieje")
+            continue
+        print(f"  📂 {name}: rozpakowano {result['members']} plików")
+
+
+def run_storage(args):
+    """Pokaż użycie dysku i (opcjonalnie) wymuś budżet plików pochodnych."""
+    from xeen.storage import storage_stats, enforce_budget
+
+    mb = 1024 * 1024
+    stats = storage_stats()
+    budget = stats["budget_bytes"]
+    print(f"💾 Pliki pochodne: {stats['derived_bytes'] / mb:.1f} MB "
+          f"({stats['derived_files']} plików), budżet: "
+          f"{f'{budget / mb:.0f} MB' if budget else 'bez limitu'}")
+    for cat, c in stats["categories"].items():
+        print(f"   {cat:10s} {c['files']:>6} plików  {c['bytes'] / mb:>8.1f} MB")
+    src = stats["sources"]
+    print(f"   Źródła (nieusuwalne): klatki {src['frames_bytes'] / mb:.1f} MB, "
+          f"archiwa {src['archives_bytes'] / mb:.1f} MB")
+
+    if args.enforce or args.dry_run or args.budget is not None:
+        result = enforce_budget(
+            budget=args.budget * mb if args.budget is not None else None,
+            dry_run=args.dry_run,
+        )
+        verb = "Do usunięcia" if args.dry_run else "Usunięto"
+        print(f"\n🧹 {verb}: {result['evicted']} plików ({result['freed_bytes'] / mb:.1f} MB), "
+              f"pozostanie {result['after_bytes'] / mb:.1f} MB")
+
+
+def run_bundle(args):
+    """Zapisz sesję jako bundle (strumieniowo, bez plików tymczasowych)."""
+    from pathlib import Path
+    from xeen.bundle import BUNDLE_SUFFIX, write_bundle
+
+    if args.output == "-":
+        try:
+            write_bundle(args.session, sys.stdout.buffer)
+        except FileNotFoundError:
+            print(f"❌ Sesja '{args.session}' nie istnieje", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    out = Path(args.output or f"{args.session}{BUNDLE_SUFFIX}")
+    try:
+        with open(out, "wb") as f:
+            size = write_bundle(args.session, f)
+    except FileNotFoundError:
+        out.unlink(missing_ok=True)
+        print(f"❌ Sesja '{args.session}' nie istnieje")
+        sys.exit(1)
+    print(f"📦 {out} ({size / 1024 / 1024:.1f} MB)")
+
+
+def run_import(args):
+    """Zaimportuj bundle jako nową sesję."""
+    from xeen.bundle import BundleError, import_bundle
+
+    try:
+        if args.file == "-":
+            result = import_bundle(sys.stdin.buffer, args.name)
+        else:
+            with open(args.file, "rb") as f:
+                result = import_bundle(f, args.name)
+    except FileExistsError as e:
+        print(f"❌ Sesja '{e}' już istnieje (użyj --name)")
+        sys.exit(1)
+    except (BundleError, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Zaimportowano {result['name']} ({result['frame_count']} klatek)")
+
+
 if __name__ == "__main__":
     main()
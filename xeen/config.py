@@ -17,6 +17,50 @@ def get_data_dir() -> Path:
     return p
 
 
+def _env_int(name: str, default: int) -> int:
+    """Odczytaj liczbę całkowitą ze zmiennej środowiskowej (z wartością domyślną)."""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# Budżet pamięci dla cache'u sparsowanych session.json (w bajtach)
+META_CACHE_BYTES = _env_int("XEEN_META_CACHE_MB", 64) * 1024 * 1024
+
+# Zapisuj session.json bez wcięć (mniejszy plik, szybszy zapis/odczyt)
+COMPACT_JSON = _env_flag("XEEN_COMPACT_JSON")
+
+# Content-addressed store klatek (~/.xeen/blobs) z deduplikacją między sesjami
+BLOB_STORE = _env_flag("XEEN_BLOB_STORE")
+
+# Budżet dyskowy dla plików pochodnych (podglądy, miniatury, eksporty); 0 = bez limitu
+STORAGE_BUDGET_BYTES = _env_int("XEEN_STORAGE_BUDGET_MB", 2048) * 1024 * 1024
+
+# Pliki pochodne młodsze niż tyle sekund nie są usuwane (chroni trwające eksporty)
+STORAGE_MIN_AGE = _env_int("XEEN_STORAGE_MIN_AGE", 600)
+
+# Pula wątków generujących miniatury i maks. czas oczekiwania handlera na miniaturę
+THUMB_WORKERS = _env_int("XEEN_THUMB_WORKERS", min(4, os.cpu_count() or 1))
+THUMB_WAIT_MS = _env_int("XEEN_THUMB_WAIT_MS", 1500)
+
+# Cache wyrenderowanych podglądów (znak wodny / rekompresja): pamięć i dysk
+RENDER_CACHE_MEM_BYTES = _env_int("XEEN_RENDER_CACHE_MB", 64) * 1024 * 1024
+RENDER_CACHE_DISK_BYTES = _env_int("XEEN_RENDER_CACHE_DISK_MB", 512) * 1024 * 1024
+
+# Równoległe renderowanie przyciętych klatek (podglądy, wersje, eksport):
+# "process" — pula procesów (skaluje się z rdzeniami), "thread" — pula wątków
+RENDER_WORKERS = _env_int("XEEN_RENDER_WORKERS", os.cpu_count() or 1)
+RENDER_POOL = os.environ.get("XEEN_RENDER_POOL", "process").strip().lower()
+
+# Liczba eksportów (zadań w tle) wykonywanych jednocześnie; reszta czeka w kolejce
+EXPORT_WORKERS = _env_int("XEEN_EXPORT_WORKERS", 2)
+
+
 # Predefiniowane rozmiary dla social media
 CROP_PRESETS = {
     "instagram_post": {"w": 1080, "h": 1080, "label": "Instagram Post (1:1)"},
@@ -0,0 +1,189 @@
+"""Crop planning: every crop rectangle of a session in one vectorized pass.
+
+The crop preview, the video preview and the auto pipeline all frame shots the
+same way: pick a center per frame (custom center → focus mode → image
+center), size a target-aspect rectangle from the zoom level (or from the
+mouse padding in ``mouse`` focus), clamp it to the frame and slide it inside
+the image. In ``auto`` focus the center and a per-frame zoom come from the
+precomputed activity analysis (``focus``), scaled by the requested zoom.
+``plan_crops`` does that for all requested frames at once with NumPy, from
+the frame table alone — sizes come from the session metadata, so nothing is
+decoded while planning. Callers only render the planned rectangles, which
+guarantees identical framing everywhere.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+import numpy as np
+
+from xeen.archive import open_frame_image
+
+DEFAULT_SIZE = (1920, 1080)
+
+
+@dataclass
+class CropPlan:
+    """Zaplanowane prostokąty przycięcia (tablice równoległe, po jednym wierszu na klatkę)."""
+
+    indices: np.ndarray
+    left: np.ndarray
+    top: np.ndarray
+    w: np.ndarray
+    h: np.ndarray
+    cx: np.ndarray
+    cy: np.ndarray
+    target: tuple[int, int]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def box(self, i: int) -> tuple[int, int, int, int]:
+        """Prostokąt i-tego wiersza w formacie ``Image.crop``."""
+        left, top = int(self.left[i]), int(self.top[i])
+        return left, top, left + int(self.w[i]), top + int(self.h[i])
+
+    def rect(self, i: int) -> dict:
+        return {
+            "index": int(self.indices[i]),
+            "crop": {"left": int(self.left[i]), "top": int(self.top[i]),
+                     "w": int(self.w[i]), "h": int(self.h[i])},
+            "center": {"x": int(self.cx[i]), "y": int(self.cy[i])},
+        }
+
+    def __iter__(self) -> Iterator[tuple[int, tuple[int, int, int, int]]]:
+        for i in range(len(self)):
+            yield int(self.indices[i]), self.box(i)
+
+
+def header_size_reader(name: str) -> Callable[[dict], tuple[int, int]]:
+    """``size_of`` dla starszych sesji bez wymiarów: czyta tylko nagłówek pliku."""
+    def size_of(frame: dict) -> tuple[int, int]:
+        try:
+            with open_frame_image(name, frame["filename"]) as img:
+                return img.size
+        except FileNotFoundError:
+            return DEFAULT_SIZE
+    return size_of
+
+
+def _value(frame: dict, key: str, default: float) -> float:
+    v = frame.get(key)
+    return default if v is None else v
+
+
+def plan_crops(
+    frames: list[dict],
+    indices: list[int],
+    target_w: int,
+    target_h: int,
+    *,
+    focus_mode: str = "screen",
+    zoom_level: float = 1.0,
+    mouse_padding: float = 100,
+    custom_centers: dict | None = None,
+    size_of: Callable[[dict], tuple[int, int]] | None = None,
+    focus: dict | None = None,
+) -> CropPlan:
+    """Zaplanuj przycięcie klatek ``indices`` do proporcji ``target_w × target_h``.
+
+    Indices outside the frame table are dropped. Frame sizes are read from
+    the ``width``/``height`` metadata; ``size_of(frame)`` is only called for
+    frames that lack them (e.g. a header-only ``Image.open``).
+    ``mouse_padding`` is a percentage of the shorter frame edge.
+    ``focus`` (``{"<index>": {"x", "y", "zoom"}}``, see ``xeen.focus``) is
+    used by ``focus_mode="auto"``; frames without an entry fall back to
+    ``screen``.
+    """
+    custom_centers = custom_centers or {}
+    focus = focus or {}
+    idx = [i for i in indices if 0 <= i < len(frames)]
+    n = len(idx)
+
+    iw = np.empty(n, dtype=np.int64)
+    ih = np.empty(n, dtype=np.int64)
+    cx = np.empty(n, dtype=np.float64)
+    cy = np.empty(n, dtype=np.float64)
+    has_custom = np.zeros(n, dtype=bool)
+    sugg_x = np.full(n, np.nan)
+    sugg_y = np.full(n, np.nan)
+    mouse_x = np.full(n, np.nan)
+    mouse_y = np.full(n, np.nan)
+    auto_x = np.full(n, np.nan)
+    auto_y = np.full(n, np.nan)
+    zoom = np.full(n, float(zoom_level))
+
+    for row, i in enumerate(idx):
+        frame = frames[i]
+        w, h = frame.get("width"), frame.get("height")
+        if not w or not h:
+            w, h = size_of(frame) if size_of else DEFAULT_SIZE
+        iw[row], ih[row] = w, h
+        custom = custom_centers.get(str(i))
+        if custom:
+            has_custom[row] = True
+            cx[row], cy[row] = custom["x"], custom["y"]
+        sugg_x[row] = _value(frame, "suggested_center_x", np.nan)
+        sugg_y[row] = _value(frame, "suggested_center_y", np.nan)
+        mouse_x[row] = _value(frame, "mouse_x", np.nan)
+        mouse_y[row] = _value(frame, "mouse_y", np.nan)
+        spot = focus.get(str(i)) if focus_mode == "auto" else None
+        if spot:
+            auto_x[row], auto_y[row] = spot["x"], spot["y"]
+            zoom[row] *= spot.get("zoom", 1.0)
+
+    # ─── Środek: custom_centers > tryb fokusu > środek obrazu ────────────
+    half_w, half_h = iw // 2, ih // 2
+    sx = np.where(np.isnan(sugg_x), half_w, sugg_x)
+    if focus_mode == "mouse":
+        mode_x = np.where(np.isnan(mouse_x), half_w, mouse_x)
+        mode_y = np.where(np.isnan(mouse_y), half_h, mouse_y)
+    elif focus_mode == "keyboard":
+        mode_x, mode_y = sx, np.floor(ih * 0.75)
+    elif focus_mode == "application":
+        mode_x, mode_y = sx, np.floor(ih * 0.25)
+    elif focus_mode == "auto":
+        sy = np.where(np.isnan(sugg_y), half_h, sugg_y)
+        mode_x = np.where(np.isnan(auto_x), sx, auto_x)
+        mode_y = np.where(np.isnan(auto_y), sy, auto_y)
+    else:  # screen
+        mode_x, mode_y = sx, np.where(np.isnan(sugg_y), half_h, sugg_y)
+    cx = np.where(has_custom, cx, mode_x).round().astype(np.int64)
+    cy = np.where(has_custom, cy, mode_y).round().astype(np.int64)
+
+    # ─── Rozmiar: zawsze proporcje targetu, zoom > 1 = mniejszy wycinek ──
+    aspect = target_w / target_h
+    if focus_mode == "mouse":
+        base = (mouse_padding / 100.0) * np.minimum(iw, ih) / zoom
+        if aspect >= 1:
+            crop_h = np.floor(base).astype(np.int64)
+            crop_w = np.floor(crop_h * aspect).astype(np.int64)
+        else:
+            crop_w = np.floor(base).astype(np.int64)
+            crop_h = np.floor(crop_w / aspect).astype(np.int64)
+    else:
+        wide = iw / ih > aspect
+        by_h = np.floor(ih / zoom).astype(np.int64)
+        by_w = np.floor(iw / zoom).astype(np.int64)
+        crop_h = np.where(wide, by_h, np.floor(by_w / aspect).astype(np.int64))
+        crop_w = np.where(wide, np.floor(by_h * aspect).astype(np.int64), by_w)
+
+    # Ogranicz do rozmiarów obrazu (zachowując aspect ratio)
+    over_w = crop_w > iw
+    crop_w = np.where(over_w, iw, crop_w)
+    crop_h = np.where(over_w, np.floor(iw / aspect).astype(np.int64), crop_h)
+    over_h = crop_h > ih
+    crop_h = np.where(over_h, ih, crop_h)
+    crop_w = np.where(over_h, np.floor(ih * aspect).astype(np.int64), crop_w)
+    crop_w = np.maximum(1, crop_w)
+    crop_h = np.maximum(1, crop_h)
+
+    # Wyśrodkuj na wybranym punkcie, nie wychodź poza obraz
+    left = np.maximum(0, np.minimum(cx - crop_w // 2, iw - crop_w))
+    top = np.maximum(0, np.minimum(cy - crop_h // 2, ih - crop_h))
+
+    return CropPlan(
+        indices=np.asarray(idx, dtype=np.int64),
+        left=left, top=top, w=crop_w, h=crop_h, cx=cx, cy=cy,
+        target=(target_w, target_h),
+    )
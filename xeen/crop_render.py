@@ -0,0 +1,195 @@
+"""Crop rendering: decode each source frame once, fan out to every output.
+
+Planning (``crop_plan``) decides the rectangles; this module turns them into
+PNG files. Work is grouped per source frame: a frame that feeds several
+outputs — e.g. every social-media preset in one ``generate-versions`` call —
+is decoded once and all its crops are cut from that in-memory image. Outputs
+whose stored render key already matches are reused without decoding at all.
+
+Large downscales (a 5760×1080 or 4K crop to a ~1080 px preset, 1/10 video
+previews) are resampled in two steps: a cheap integer box reduction
+(``Image.reduce``) followed by the final filter over an image at most
+``reducing_gap`` times the target size. With a gap of 3 the result is
+indistinguishable from a single full-resolution LANCZOS pass, at a fraction
+of the cost. Interactive previews keep reduced working copies of recent
+frames in memory, so repeated previews of one frame skip PNG decoding.
+
+Frames are rendered concurrently in a render executor: by default a process
+pool (``XEEN_RENDER_POOL=process``, ``XEEN_RENDER_WORKERS`` processes) so
+cropping and LANCZOS resampling scale with cores instead of contending for
+the GIL; ``thread`` selects a thread pool. Jobs are plain picklable dicts and
+every job carries the data directory, so workers need no shared state. If a
+process pool cannot be started (e.g. no semaphore support) or breaks, the
+executor falls back to threads.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image
+
+from xeen import config
+from xeen.archive import open_frame_image
+from xeen.config import get_data_dir
+from xeen.render_cache import png_render_key, save_keyed_png
+
+REUSED, RENDERED, MISSING = "reused", "rendered", "missing"
+
+log = logging.getLogger("xeen.crop_render")
+
+# Odstęp redukcji: końcowy filtr działa na obrazie ≤ gap × rozmiar docelowy
+QUALITY_GAP = 3.0  # wynik nieodróżnialny od pełnego LANCZOS
+FAST_GAP = 2.0  # szybkie podglądy (BILINEAR)
+
+_WORKING_MAX = 8
+_working: OrderedDict[tuple, Image.Image] = OrderedDict()
+_working_lock = threading.Lock()
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+
+
+def _start_pool(mode: str) -> Executor:
+    workers = max(1, config.RENDER_WORKERS)
+    if mode == "process":
+        # forkserver: bez dziedziczenia wątków i locków procesu serwera
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xeen-render")
+
+
+def render_pool() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            try:
+                _executor = _start_pool(config.RENDER_POOL)
+            except (OSError, NotImplementedError, ValueError) as e:
+                log.warning("Render process pool unavailable (%s), using threads", e)
+                _executor = _start_pool("thread")
+        return _executor
+
+
+def _fall_back_to_threads(error: Exception) -> Executor:
+    global _executor
+    with _executor_lock:
+        if not isinstance(_executor, ThreadPoolExecutor):
+            log.warning("Render process pool failed (%s), using threads", error)
+            broken, _executor = _executor, _start_pool("thread")
+            if broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+        return _executor
+
+
+def output_spec(path: Path, box, size, key: str, branding: dict | None = None) -> dict:
+    """Opis jednego pliku wyjściowego: prostokąt źródła, rozmiar docelowy, klucz."""
+    return {"path": str(path), "box": [int(v) for v in box], "size": [int(v) for v in size],
+            "key": key, "branding": branding}
+
+
+def crop_resize(img: Image.Image, box, size, resample=Image.LANCZOS,
+                gap: float = QUALITY_GAP) -> Image.Image:
+    """Wytnij ``box`` i przeskaluj do ``size``; duże pomniejszenia najpierw przez ``reduce``."""
+    return img.resize(tuple(size), resample, box=tuple(box), reducing_gap=gap)
+
+
+def reduction_factor(box, size, gap: float = FAST_GAP) -> int:
+    """Największy współczynnik 4/2, po którym do celu zostaje co najmniej ``gap``× pomniejszenia."""
+    scale = min((box[2] - box[0]) / size[0], (box[3] - box[1]) / size[1])
+    for factor in (4, 2):
+        if scale / factor >= gap:
+            return factor
+    return 1
+
+
+def working_copy(name: str, filename: str, version: str, factor: int) -> Image.Image:
+    """Klatka zmniejszona ``factor`` razy, trzymana w pamięci (LRU) między podglądami."""
+    key = (name, filename, version, factor)
+    with _working_lock:
+        img = _working.get(key)
+        if img is not None:
+            _working.move_to_end(key)
+            return img
+    with open_frame_image(name, filename) as src:
+        img = src.reduce(factor) if factor > 1 else src.copy()
+    with _working_lock:
+        _working[key] = img
+        while len(_working) > _WORKING_MAX:
+            _working.popitem(last=False)
+    return img
+
+
+def render_frame(name: str, filename: str, outputs: list[dict]) -> list[str]:
+    """Wyrenderuj wszystkie wyjścia jednej klatki (jedno dekodowanie).
+
+    Returns a status per output: ``reused``, ``rendered`` or ``missing``
+    (source frame not found).
+    """
+    statuses = []
+    img = None
+    for out in outputs:
+        path = Path(out["path"])
+        if png_render_key(path) == out["key"]:
+            statuses.append(REUSED)
+            continue
+        if img is None:
+            try:
+                img = open_frame_image(name, filename)
+                img.load()
+            except FileNotFoundError:
+                return statuses + [MISSING] * (len(outputs) - len(statuses))
+        cropped = crop_resize(img, out["box"], out["size"])
+        key = out["key"]
+        if out.get("branding"):
+            from xeen.branding import apply_watermark
+            try:
+                cropped = apply_watermark(cropped, out["branding"])
+            except Exception:
+                key = ""  # bez znaku wodnego — nie udawaj wersji ze znakiem w cache
+        save_keyed_png(cropped, path, key)
+        statuses.append(RENDERED)
+    return statuses
+
+
+def _render_job(data_dir: str, name: str, filename: str, outputs: list[dict]) -> list[str]:
+    """Punkt wejścia zadania w procesie workera (katalog danych z procesu serwera)."""
+    if os.environ.get("XEEN_DATA_DIR") != data_dir:
+        os.environ["XEEN_DATA_DIR"] = data_dir
+    return render_frame(name, filename, outputs)
+
+
+def submit_frame(name: str, filename: str, outputs: list[dict]) -> Future:
+    """Zleć render jednej klatki w executorze; Future zwraca statusy wyjść."""
+    pool = render_pool()
+    if isinstance(pool, ProcessPoolExecutor):
+        try:
+            return pool.submit(_render_job, str(get_data_dir()), name, filename, outputs)
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            pool = _fall_back_to_threads(e)
+    return pool.submit(render_frame, name, filename, outputs)
+
+
+def render_frames(name: str, jobs: dict[str, list[dict]]) -> dict[str, list[str]]:
+    """Wyrenderuj ``{klatka: [wyjścia]}`` równolegle po klatkach (blokująco).
+
+    A single frame is rendered in the calling thread — shipping it to a
+    worker process would only add pickling overhead.
+    """
+    if len(jobs) <= 1:
+        return {fn: render_frame(name, fn, outs) for fn, outs in jobs.items()}
+    futures = {fn: submit_frame(name, fn, outs) for fn, outs in jobs.items()}
+    done = {}
+    for fn, fut in futures.items():
+        try:
+            done[fn] = fut.result()
+        except BrokenProcessPool as e:
+            _fall_back_to_threads(e)
+            done[fn] = render_frame(name, fn, jobs[fn])
+    return done
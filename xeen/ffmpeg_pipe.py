@@ -0,0 +1,175 @@
+"""Raw-frame pipe into ffmpeg: encode in-memory frames without intermediate files.
+
+Frames rendered in-process (PIL images or raw ``rgb24`` bytes) are written
+straight to ffmpeg's stdin as ``-f rawvideo``, so a video needs neither PNG
+files on disk nor a PNG encode/decode round trip per frame. stderr goes to an
+anonymous temporary file — a full stderr pipe can never stall the encoder —
+and its tail is reported when ffmpeg fails.
+
+Every command runs with ``-progress pipe:1``: a reader thread parses the
+``key=value`` blocks from stdout and hands each one to ``on_progress``, and
+``on_process`` receives the ``Popen`` so a caller can kill the encoder
+(export job cancellation).
+"""
+
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+
+from PIL import Image
+
+FFMPEG = "ffmpeg"
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+
+ProgressCallback = Callable[[dict], None]
+ProcessCallback = Callable[[subprocess.Popen], None]
+
+
+def rawvideo_command(output_path: Path, size: tuple[int, int], fps: float,
+                     codec_args: list[str]) -> list[str]:
+    """Polecenie ffmpeg czytające klatki ``rgb24`` o rozmiarze ``size`` ze stdin."""
+    w, h = size
+    return [
+        FFMPEG, "-y", "-loglevel", "error", *PROGRESS_ARGS,
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{w}x{h}", "-r", str(fps), "-i", "-",
+        *codec_args, "-r", str(fps), str(output_path),
+    ]
+
+
+def parse_progress(lines: Iterable[str]):
+    """Bloki ``-progress`` ffmpeg jako słowniki; każdy blok kończy linia ``progress=``."""
+    block = {}
+    for line in lines:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        block[key] = value
+        if key == "progress":
+            yield block
+            block = {}
+
+
+def _watch(stream, on_progress: ProgressCallback | None) -> threading.Thread:
+    def read():
+        lines = (raw.decode(errors="replace") for raw in stream)
+        for block in parse_progress(lines):
+            if on_progress is not None:
+                try:
+                    on_progress(block)
+                except Exception:
+                    pass  # raport postępu nigdy nie przerywa kodowania
+        stream.close()
+
+    thread = threading.Thread(target=read, name="xeen-ffmpeg-progress", daemon=True)
+    thread.start()
+    return thread
+
+
+def _start(cmd: list[str], stdin, stderr, on_progress, on_process) -> tuple[subprocess.Popen, threading.Thread]:
+    try:
+        proc = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg not found")
+    if on_process is not None:
+        on_process(proc)
+    return proc, _watch(proc.stdout, on_progress)
+
+
+def _tail(stderr) -> str:
+    stderr.seek(0)
+    return stderr.read().decode(errors="replace")[-600:]
+
+
+def run(cmd: list[str], on_progress: ProgressCallback | None = None,
+        on_process: ProcessCallback | None = None) -> None:
+    """Uruchom ffmpeg i poczekaj; kod wyjścia ≠ 0 (także zabicie procesu) → RuntimeError."""
+    with tempfile.TemporaryFile() as stderr:
+        proc, watcher = _start(cmd, subprocess.DEVNULL, stderr, on_progress, on_process)
+        rc = proc.wait()
+        watcher.join()
+        if rc != 0:
+            raise RuntimeError(f"ffmpeg failed (rc={rc}): {_tail(stderr)}")
+
+
+class RawVideoWriter:
+    """Proces ffmpeg przyjmujący surowe klatki przez stdin (context manager).
+
+    ``write`` accepts a PIL image (converted to RGB) or ready ``rgb24``
+    bytes of exactly one frame. Leaving the ``with`` block normally closes
+    stdin and waits for ffmpeg — a non-zero exit raises RuntimeError; an
+    exception inside the block kills the encoder instead.
+    """
+
+    def __init__(self, cmd: list[str], size: tuple[int, int],
+                 on_progress: ProgressCallback | None = None,
+                 on_process: ProcessCallback | None = None):
+        self.size = tuple(size)
+        self.frame_bytes = self.size[0] * self.size[1] * 3
+        self.frames = 0
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._proc, self._watcher = _start(cmd, subprocess.PIPE, self._stderr,
+                                               on_progress, on_process)
+        except RuntimeError:
+            self._stderr.close()
+            raise
+
+    def write(self, frame: "Image.Image | bytes") -> None:
+        if isinstance(frame, Image.Image):
+            if frame.size != self.size:
+                raise ValueError(f"frame size {frame.size} != {self.size}")
+            frame = frame.convert("RGB").tobytes()
+        if len(frame) != self.frame_bytes:
+            raise ValueError(f"raw frame has {len(frame)} bytes, expected {self.frame_bytes}")
+        try:
+            self._proc.stdin.write(frame)
+        except BrokenPipeError:
+            self._proc.wait()
+            raise RuntimeError(f"ffmpeg exited early (rc={self._proc.returncode}): {_tail(self._stderr)}")
+        self.frames += 1
+
+    def close(self) -> None:
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        rc = self._proc.wait()
+        self._watcher.join()
+        try:
+            if rc != 0:
+                raise RuntimeError(f"ffmpeg failed (rc={rc}): {_tail(self._stderr)}")
+        finally:
+            self._stderr.close()
+
+    def kill(self) -> None:
+        self._proc.kill()
+        try:
+            self._proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self._proc.wait()
+        self._watcher.join()
+        self._stderr.close()
+
+    def __enter__(self) -> "RawVideoWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.kill()
+
+
+def encode_frames(frames: Iterable, output_path: Path, size: tuple[int, int], fps: float,
+                  codec_args: list[str], cmd: list[str] | None = None,
+                  on_progress: ProgressCallback | None = None,
+                  on_process: ProcessCallback | None = None) -> int:
+    """Zakoduj strumień klatek do ``output_path``; zwraca liczbę zapisanych klatek."""
+    cmd = cmd or rawvideo_command(output_path, size, fps, codec_args)
+    with RawVideoWriter(cmd, size, on_progress, on_process) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return writer.frames
@@ -0,0 +1,274 @@
+"""Auto-focus: a per-frame focus point and zoom from input activity and screen damage.
+
+``focus_mode="auto"`` frames every shot around what actually happened in it.
+Three signals are weighed per frame:
+
+* click clusters — the densest group of ``mouse_click`` events,
+* typing — key presses locate text entry: the changed region when there is
+  one, otherwise the last pointer position,
+* screen damage — the region that changed versus the previous frame,
+  found on ~160 px grayscale copies (the WebP thumbnail when present).
+
+The strongest signal picks the spot; weaker signals near it refine the point
+and widen the region of interest, and the zoom is whatever fits that region
+(with padding) into the frame — a small edit zooms in, a page change stays
+wide. Everything comes from metadata and downsampled arrays, computed once per
+session into ``sessions/<name>/focus.json``. Entries are keyed by the frame's
+content hash, its predecessor's and its events, so edits to a session only
+recompute the frames they touch, and crop planning reads the stored result at
+no per-request cost.
+"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import Future
+
+import numpy as np
+from PIL import Image
+
+from xeen.archive import frame_version, open_frame_image
+from xeen.session_store import (
+    EVENTS,
+    EVENTS_FILENAME,
+    FRAMES_FILENAME,
+    META_FILENAME,
+    atomic_write_bytes,
+    get_meta_cache,
+    load_session_meta,
+    session_dir,
+)
+from xeen.thumbs import thumb_name, thumb_path
+from xeen.workers import single_flight
+
+FOCUS_FILENAME = "focus.json"
+FOCUS_VERSION = 1
+
+ANALYSIS_WIDTH = 160
+DAMAGE_THRESHOLD = 24  # różnica jasności (0–255), od której komórka jest "zmieniona"
+MIN_DAMAGE = 0.0005  # ułamek komórek — mniej to szum (kursor, zegar)
+FULL_DAMAGE = 0.5  # zmiana większości ekranu = nowa scena, bez przybliżenia
+MAX_ZOOM = 3.0
+PADDING = 0.12  # margines wokół obszaru aktywności (ułamek krótszej krawędzi)
+CLUSTER_RADIUS = 0.1  # promień skupiska kliknięć (ułamek krótszej krawędzi)
+NEAR = 0.25  # sygnały bliżej niż tyle (ułamek przekątnej) wzmacniają najsilniejszy
+
+WEIGHTS = {"typing": 3.0, "clicks": 2.0, "damage": 1.0}
+
+log = logging.getLogger("xeen.focus")
+
+
+def focus_path(name: str):
+    return session_dir(name) / FOCUS_FILENAME
+
+
+def small_gray(name: str, filename: str) -> np.ndarray | None:
+    """Klatka w skali szarości, ~ANALYSIS_WIDTH px szerokości (None, gdy brak pliku)."""
+    thumb = thumb_path(name, thumb_name(filename))
+    try:
+        img = Image.open(thumb) if thumb.exists() else open_frame_image(name, filename)
+    except FileNotFoundError:
+        return None
+    with img:
+        size = (ANALYSIS_WIDTH, max(1, round(img.height * ANALYSIS_WIDTH / img.width)))
+        img.draft("L", size)
+        # Ten sam rozmiar z miniatury i z pełnej klatki — porównywalne tablice
+        gray = img.convert("L").resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return np.asarray(gray, dtype=np.int16)
+
+
+def damage_region(prev: np.ndarray | None, cur: np.ndarray | None, size: tuple[int, int]):
+    """Obszar zmiany między klatkami: ``(cx, cy, box, fraction)`` w pikselach klatki albo None.
+
+    The box spans the 2nd–98th percentile of changed cells, so a stray
+    change far away (a clock, the cursor) does not stretch it.
+    """
+    if prev is None or cur is None or prev.shape != cur.shape:
+        return None
+    mask = np.abs(cur - prev) > DAMAGE_THRESHOLD
+    fraction = float(mask.mean())
+    if fraction < MIN_DAMAGE:
+        return None
+    ys, xs = np.nonzero(mask)
+    sx, sy = size[0] / mask.shape[1], size[1] / mask.shape[0]
+    x0, x1 = np.percentile(xs, [2, 98])
+    y0, y1 = np.percentile(ys, [2, 98])
+    box = (x0 * sx, y0 * sy, (x1 + 1) * sx, (y1 + 1) * sy)
+    return float(xs.mean() + 0.5) * sx, float(ys.mean() + 0.5) * sy, box, fraction
+
+
+def click_cluster(events: list[dict], radius: float):
+    """Najgęstsze skupisko kliknięć: ``(cx, cy, box, count)`` albo None (remis → późniejsze)."""
+    clicks = np.array([(e.get("x", 0), e.get("y", 0)) for e in events if e.get("kind") == "mouse_click"],
+                      dtype=np.float64).reshape(-1, 2)
+    if not len(clicks):
+        return None
+    dist = np.linalg.norm(clicks[:, None, :] - clicks[None, :, :], axis=-1)
+    counts = (dist <= radius).sum(axis=1)
+    best = len(counts) - 1 - int(np.argmax(counts[::-1]))
+    members = clicks[dist[best] <= radius]
+    (x0, y0), (x1, y1) = members.min(axis=0), members.max(axis=0)
+    cx, cy = members.mean(axis=0)
+    return float(cx), float(cy), (float(x0), float(y0), float(x1), float(y1)), len(members)
+
+
+def typing_point(events: list[dict], damage):
+    """Miejsce pisania: zmieniony obszar, a bez niego ostatnia pozycja kursora przed pisaniem."""
+    keys = [i for i, e in enumerate(events) if e.get("kind") == "key_press"]
+    if not keys:
+        return None
+    if damage is not None:
+        return damage[0], damage[1], damage[2]
+    for e in reversed(events[:keys[-1]]):
+        if e.get("kind") in ("mouse_click", "mouse_move"):
+            x, y = e.get("x", 0), e.get("y", 0)
+            return float(x), float(y), (float(x), float(y), float(x), float(y))
+    return None
+
+
+def frame_focus(frame: dict, size: tuple[int, int], damage) -> dict | None:
+    """Połącz sygnały jednej klatki w ``{"x", "y", "zoom", "source"}`` (None = brak aktywności)."""
+    iw, ih = size
+    short = min(iw, ih)
+    events = frame.get(EVENTS) or []
+    candidates = []  # (źródło, waga, cx, cy, box)
+    typing = typing_point(events, damage)
+    if typing:
+        candidates.append(("typing", WEIGHTS["typing"], *typing))
+    clicks = click_cluster(events, CLUSTER_RADIUS * short)
+    if clicks:
+        cx, cy, box, count = clicks
+        candidates.append(("clicks", WEIGHTS["clicks"] * (1 + 0.25 * (count - 1)), cx, cy, box))
+    if damage is not None:
+        candidates.append(("damage", WEIGHTS["damage"], damage[0], damage[1], damage[2]))
+    if not candidates:
+        return None
+
+    best = max(candidates, key=lambda c: c[1])
+    near = NEAR * (iw ** 2 + ih ** 2) ** 0.5
+    used = [c for c in candidates if abs(c[2] - best[2]) + abs(c[3] - best[3]) <= near or c is best]
+    total = sum(c[1] for c in used)
+    x = sum(c[1] * c[2] for c in used) / total
+    y = sum(c[1] * c[3] for c in used) / total
+
+    if damage is not None and damage[3] >= FULL_DAMAGE:
+        zoom = 1.0
+    else:
+        pad = PADDING * short
+        x0 = min(c[4][0] for c in used) - pad
+        y0 = min(c[4][1] for c in used) - pad
+        x1 = max(c[4][2] for c in used) + pad
+        y1 = max(c[4][3] for c in used) + pad
+        zoom = min(iw / max(1.0, x1 - x0), ih / max(1.0, y1 - y0))
+        zoom = max(1.0, min(MAX_ZOOM, zoom))
+    return {"x": int(round(x)), "y": int(round(y)), "zoom": round(zoom, 3), "source": best[0]}
+
+
+def _entry_key(name: str, prev: dict | None, frame: dict) -> str:
+    prev_version = frame_version(name, prev) if prev is not None else None
+    h = hashlib.blake2s(digest_size=12)
+    h.update(f"{FOCUS_VERSION}:{prev_version or ''}:{frame_version(name, frame) or ''}:".encode())
+    h.update(json.dumps(frame.get(EVENTS) or [], sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _sources(name: str) -> list:
+    """Sygnatura plików metadanych, z których liczony jest focus (mtime, rozmiar).
+
+    Only ``frames.json`` and ``events.json`` — selection, captions and
+    centers saves rewrite ``session.json`` without touching the analysis
+    inputs. A legacy single-file session has neither, so ``session.json``
+    is signed instead.
+    """
+    sdir = session_dir(name)
+    filenames = (FRAMES_FILENAME, EVENTS_FILENAME)
+    if not (sdir / FRAMES_FILENAME).exists():
+        filenames = (META_FILENAME,)
+    sig = []
+    for filename in filenames:
+        try:
+            st = (sdir / filename).stat()
+            sig.append([filename, st.st_mtime_ns, st.st_size])
+        except FileNotFoundError:
+            sig.append(None)
+    return sig
+
+
+def _stored_doc(name: str) -> dict:
+    try:
+        doc = get_meta_cache().get(focus_path(name))
+    except (FileNotFoundError, ValueError):
+        return {}
+    return doc if doc.get("version") == FOCUS_VERSION else {}
+
+
+def compute_focus(name: str) -> dict:
+    """Przelicz (przyrostowo) i zapisz focus sesji; zwraca ``{klatka: wpis}``.
+
+    Only frames whose key changed are analysed; each analysed frame and its
+    predecessor are downsampled once. Frames without any activity get an
+    entry with ``x``/``y`` set to None, so they are not re-analysed.
+    """
+    sources = _sources(name)
+    frames = load_session_meta(name, fields=(EVENTS,)).get("frames", [])
+    previous = _stored_doc(name)
+    stored = previous.get("frames", {})
+    result, computed = {}, 0
+    small: dict[str, np.ndarray | None] = {}
+
+    def gray(filename: str):
+        if filename not in small:
+            small[filename] = small_gray(name, filename)
+        return small[filename]
+
+    for i, frame in enumerate(frames):
+        prev = frames[i - 1] if i else None
+        key = _entry_key(name, prev, frame)
+        entry = stored.get(frame["filename"])
+        if entry is None or entry.get("key") != key:
+            size = (frame.get("width") or 0, frame.get("height") or 0)
+            if not all(size):
+                try:
+                    with open_frame_image(name, frame["filename"]) as img:
+                        size = img.size
+                except FileNotFoundError:
+                    continue
+            damage = damage_region(gray(prev["filename"]) if prev else None, gray(frame["filename"]), size)
+            entry = {"key": key, **(frame_focus(frame, size, damage)
+                                    or {"x": None, "y": None, "zoom": 1.0, "source": None})}
+            computed += 1
+        result[frame["filename"]] = entry
+
+    if computed or set(result) != set(stored) or previous.get("sources") != sources:
+        path = focus_path(name)
+        doc = {"version": FOCUS_VERSION, "sources": sources, "frames": result}
+        atomic_write_bytes(path, json.dumps(doc, separators=(",", ":")).encode("utf-8"))
+        get_meta_cache().put(path, doc)
+        log.info("Auto-focus for %s: %d/%d frames analysed", name, computed, len(frames))
+    return result
+
+
+def request_focus(name: str) -> Future:
+    """Zleć przeliczenie focusu w tle; równoległe żądania dzielą jedno zadanie."""
+    return single_flight(("focus", name), compute_focus, name)
+
+
+def session_focus(name: str) -> dict:
+    """Focus wszystkich klatek sesji w formacie ``custom_centers``: ``{"<index>": {"x", "y", "zoom"}}``.
+
+    While the session metadata is unchanged since the last analysis this is
+    a read of the stored result; otherwise stale frames are recomputed first
+    (blocking).
+    """
+    doc = _stored_doc(name)
+    if doc and doc.get("sources") == _sources(name):
+        entries = doc["frames"]
+    else:
+        entries = request_focus(name).result()
+    frames = load_session_meta(name).get("frames", [])
+    focus = {}
+    for i, f in enumerate(frames):
+        entry = entries.get(f["filename"])
+        if entry and entry.get("x") is not None:
+            focus[str(i)] = {"x": entry["x"], "y": entry["y"], "zoom": entry["zoom"]}
+    return focus
@@ -0,0 +1,153 @@
+"""Frame file storage with optional content-addressed deduplication.
+
+With ``XEEN_BLOB_STORE=1`` every frame is written once to
+``~/.xeen/blobs/<sha[:2]>/<sha>.png`` and hard-linked into the session's
+``frames/`` directory, so identical screens captured or uploaded into many
+sessions share one copy on disk while every existing path and URL keeps
+working. The blob's link count is its reference count: deleting a frame or a
+session drops links, orphaned blobs are removed right away, and
+``xeen gc`` sweeps whatever is left (crashes, copy fallbacks).
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from xeen import config
+from xeen.session_store import atomic_write_bytes
+
+
+def blobs_dir() -> Path:
+    return config.get_data_dir() / "blobs"
+
+
+def blob_path(sha: str) -> Path:
+    return blobs_dir() / sha[:2] / f"{sha}.png"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def encode_png(img: Image.Image, optimize: bool = False) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, "PNG", optimize=optimize)
+    return buf.getvalue()
+
+
+def normalize_png(data: bytes, mode: str | None = "RGB") -> tuple[bytes, int, int]:
+    """Return (png_bytes, width, height) for uploaded image bytes.
+
+    PNG input already in the wanted mode is kept byte-for-byte (no decode,
+    no re-encode); anything else is converted once.
+    """
+    img = Image.open(io.BytesIO(data))
+    if img.format == "PNG" and (mode is None or img.mode == mode):
+        return data, img.width, img.height
+    if mode is not None and img.mode != mode:
+        img = img.convert(mode)
+    return encode_png(img), img.width, img.height
+
+
+def _link_blob(sha: str, data: bytes, target: Path) -> None:
+    blob = blob_path(sha)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.link")
+    for _ in range(3):
+        if not blob.exists():
+            atomic_write_bytes(blob, data)
+        try:
+            tmp.unlink(missing_ok=True)
+            os.link(blob, tmp)
+        except FileNotFoundError:
+            continue  # gc usunął blob między exists() a link() — zapisz ponownie
+        except OSError:
+            # inny system plików / brak hardlinków — zwykła kopia
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, target)
+        return
+    atomic_write_bytes(target, data)
+
+
+def store_frame(frames_dir: Path, filename: str, data: bytes) -> str:
+    """Zapisz zakodowaną klatkę jako ``frames_dir/filename``; zwraca sha256 treści."""
+    sha = sha256_bytes(data)
+    frames_dir.mkdir(parents=True, exist_ok=True)
+    target = frames_dir / filename
+    if config.BLOB_STORE:
+        _link_blob(sha, data, target)
+    else:
+        atomic_write_bytes(target, data)
+    return sha
+
+
+def release_blob(sha: str | None) -> bool:
+    """Usuń blob, jeśli żadna sesja już go nie używa. Zwraca True gdy usunięto."""
+    if not sha:
+        return False
+    blob = blob_path(sha)
+    try:
+        if blob.stat().st_nlink <= 1:
+            blob.unlink()
+            return True
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def release_frames(frames: list[dict]) -> int:
+    """Zwolnij bloby listy klatek (po usunięciu ich plików). Zwraca liczbę usuniętych."""
+    return sum(release_blob(f.get("sha256")) for f in frames)
+
+
+def gc_blobs(dry_run: bool = False) -> dict:
+    """Remove blobs no session links to any more, plus leftover temp files."""
+    removed = 0
+    freed = 0
+    kept = 0
+    root = blobs_dir()
+    if root.exists():
+        for sub in root.iterdir():
+            if not sub.is_dir():
+                continue
+            for blob in sub.iterdir():
+                st = blob.stat()
+                if blob.name.endswith(".tmp"):
+                    # niedokończony zapis — usuń dopiero gdy jest stary
+                    orphan = time.time() - st.st_mtime > 3600
+                else:
+                    orphan = st.st_nlink <= 1
+                if not orphan:
+                    kept += 1
+                    continue
+                removed += 1
+                freed += st.st_size
+                if not dry_run:
+                    blob.unlink(missing_ok=True)
+    return {"removed": removed, "freed_bytes": freed, "kept": kept, "dry_run": dry_run}
+
+
+def blob_stats() -> dict:
+    """Liczba blobów, ich rozmiar i liczba referencji (hardlinków z sesji)."""
+    count = size = refs = 0
+    root = blobs_dir()
+    if root.exists():
+        for blob in root.glob("*/*.png"):
+            st = blob.stat()
+            count += 1
+            size += st.st_size
+            refs += st.st_nlink - 1
+    return {"blobs": count, "bytes": size, "references": refs}
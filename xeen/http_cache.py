@@ -0,0 +1,183 @@
+"""HTTP conditional caching helpers: strong ETags, 304s and byte ranges.
+
+Validators are cheap — either a content hash we already store (frame
+``sha256`` in session metadata) or the file's ``mtime + size`` — so checking
+``If-None-Match`` / ``If-Modified-Since`` never reads the body. URLs that
+carry a content version (``?v=<sha prefix>``) are safe to mark
+``immutable``; everything else gets a revalidation policy.
+
+Range handling is implemented here rather than relying on the Starlette
+version in use, and supports a single ``bytes=`` range (multi-range requests
+get the full body, which RFC 9110 allows).
+"""
+
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+SHORT = "public, max-age=3600"
+
+_CHUNK = 256 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def stat_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def content_etag(sha256: str, size: int) -> str:
+    return f'"{sha256[:16]}-{size:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    bare = etag.removeprefix("W/")
+    return any(t.removeprefix("W/") == bare for t in tags)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float | None = None) -> bool:
+    """Czy klient ma aktualną wersję (If-None-Match ma pierwszeństwo przed If-Modified-Since)."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def validator_headers(etag: str, last_modified: float | None, cache_control: str) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Zwróć (start, end) włącznie dla pojedynczego zakresu; None = cała treść.
+
+    Raises ValueError for unsatisfiable ranges (→ 416).
+    """
+    if not header:
+        return None
+    m = _RANGE.match(header.strip())
+    if not m:
+        return None  # multi-range / inne jednostki → pełna odpowiedź
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _file_slice(path: Path, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _view_chunks(view: memoryview):
+    for i in range(0, len(view), _CHUNK):
+        yield view[i:i + _CHUNK]
+
+
+def _range_for(request: Request, etag: str, size: int, headers: dict):
+    """Zakres z nagłówka Range (z uwzględnieniem If-Range) albo None."""
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return None
+    try:
+        return parse_range(request.headers.get("range"), size)
+    except ValueError:
+        raise _Unsatisfiable({**headers, "Content-Range": f"bytes */{size}"})
+
+
+class _Unsatisfiable(Exception):
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    *,
+    etag: str | None = None,
+    cache_control: str = REVALIDATE,
+    ranges: bool = False,
+    filename: str | None = None,
+    headers: dict | None = None,
+) -> Response:
+    """FileResponse z walidatorami, obsługą 304 i (opcjonalnie) Range.
+
+    ``headers`` (np. ``Vary: Accept``) trafiają także do odpowiedzi 304.
+    """
+    st = path.stat()
+    etag = etag or stat_etag(st)
+    headers = {**(headers or {}), **validator_headers(etag, st.st_mtime, cache_control)}
+    if ranges:
+        headers["Accept-Ranges"] = "bytes"
+    if is_not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    if ranges:
+        try:
+            rng = _range_for(request, etag, st.st_size, headers)
+        except _Unsatisfiable as e:
+            return Response(status_code=416, headers=e.headers)
+        if rng is not None:
+            start, end = rng
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{st.st_size}",
+                "Content-Length": str(end - start + 1),
+            })
+            if filename:
+                headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return StreamingResponse(_file_slice(path, start, end), status_code=206,
+                                     media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers, filename=filename,
+                        stat_result=st)
+
+
+def bytes_response(
+    request: Request,
+    view: memoryview,
+    media_type: str,
+    *,
+    etag: str,
+    last_modified: float | None = None,
+    cache_control: str = REVALIDATE,
+    headers: dict | None = None,
+) -> Response:
+    """Odpowiedź z bufora (np. członka archiwum) jako strumień fragmentów memoryview."""
+    headers = {**(headers or {}), **validator_headers(etag, last_modified, cache_control)}
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Length"] = str(len(view))
+    return StreamingResponse(_view_chunks(view), media_type=media_type, headers=headers)
@@ -0,0 +1,494 @@
+"""Background job queue: bounded workers, stage progress, cancellation, persistence.
+
+Long operations (exports: cropping, watermarking, GIF building, ffmpeg) run as
+jobs instead of inside the HTTP request. ``submit`` returns immediately with a
+job id; ``XEEN_EXPORT_WORKERS`` worker threads run queued jobs in order. A job
+reports its current stage and progress (ffmpeg ``-progress`` output is turned
+into a fraction by ``ffmpeg_progress``), checks for cancellation between
+steps, and registers its ffmpeg processes so ``cancel`` can kill them.
+
+A job may carry a ``key`` (a fingerprint of its inputs): submitting with a
+key that matches an unfinished job attaches to that job, and one that matches
+a finished, still valid result returns it, so identical work never runs twice.
+The lookup covers jobs of every server worker (the persisted files) and runs
+under an ``flock`` on ``jobs/.submit.lock``, so two workers never start the
+same key at once.
+
+Every job is persisted as ``<data>/jobs/<id>.json`` on each state change
+(progress writes are throttled). On startup ``restore`` re-queues jobs that
+were queued or running when the server stopped; finished jobs stay queryable
+until ``JOB_RETENTION`` seconds after they finished (also in memory and in
+``list``, which reads the shared directory).
+
+Several server workers (``xeen server --workers N``) share the jobs directory.
+The process that runs a job holds an ``flock`` on ``jobs/<id>.lock`` until the
+job finishes, and ``restore`` only re-queues jobs whose lock it can take, so
+each interrupted job is resumed exactly once. A cancel that reaches another
+worker writes a ``jobs/<id>.cancel`` marker; the owner checks for it at every
+checkpoint and progress update, and then kills its ffmpeg processes.
+"""
+
+import json
+import logging
+import secrets
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows — bez blokad między procesami (jeden worker)
+    fcntl = None
+
+from xeen import config
+from xeen.config import get_data_dir
+from xeen.session_store import atomic_write_bytes
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Udział etapów w łącznym postępie (etap pominięty liczy się jako ukończony)
+STAGES = {"prepare": 0.05, "render": 0.35, "encode": 0.55, "finalize": 0.05}
+
+JOB_RETENTION = 7 * 24 * 3600
+_SAVE_INTERVAL = 0.5
+_CANCEL_POLL_INTERVAL = 0.5
+
+log = logging.getLogger("xeen.jobs")
+
+
+class JobCancelled(Exception):
+    """Zadanie anulowane — przerywa pracę w najbliższym punkcie kontrolnym."""
+
+
+def jobs_dir() -> Path:
+    return get_data_dir() / "jobs"
+
+
+@contextmanager
+def _submit_flock():
+    """Blokada zlecania między procesami (``flock`` na ``jobs/.submit.lock``)."""
+    path = jobs_dir() / ".submit.lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        yield  # zamknięcie pliku zwalnia flock
+
+
+def _cancel_marker(job_id: str) -> Path:
+    return jobs_dir() / f"{job_id}.cancel"
+
+
+def _claim(job_id: str) -> IO | None:
+    """Wyłączna własność zadania między procesami (``flock`` na ``<id>.lock``); None gdy zajęte."""
+    path = jobs_dir() / f"{job_id}.lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, "a+b")
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return handle
+
+
+class Job:
+    """Stan jednego zadania; metody wołane z wątku workera raportują postęp."""
+
+    def __init__(self, kind: str, session: str, params: dict, job_id: str | None = None,
+                 key: str | None = None):
+        self.id = job_id or secrets.token_hex(8)
+        self.kind = kind
+        self.session = session
+        self.params = params
+        self.key = key
+        self.status = QUEUED
+        self.stage: str | None = None
+        self.stage_progress = 0.0
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.restarts = 0
+        self.future: Future | None = None
+        self._cancel = threading.Event()
+        self._procs: list[subprocess.Popen] = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._saved_at = 0.0
+        self._polled_at = 0.0
+        self._claim: IO | None = None
+
+    # ─── Postęp ──────────────────────────────────────────────────────────
+    @property
+    def progress(self) -> float:
+        if self.status == DONE:
+            return 1.0
+        if self.stage not in STAGES:
+            return 0.0
+        names = list(STAGES)
+        done = sum(STAGES[s] for s in names[:names.index(self.stage)])
+        return round(min(1.0, done + STAGES[self.stage] * self.stage_progress), 4)
+
+    def set_stage(self, stage: str, progress: float = 0.0) -> None:
+        self.check()
+        self.stage, self.stage_progress = stage, progress
+        self.save()
+
+    def update(self, progress: float) -> None:
+        self.stage_progress = max(0.0, min(1.0, progress))
+        self.save(throttle=True)
+        self._poll_cancel()  # anulowanie z innego workera zabija ffmpeg już w trakcie kodowania
+
+    def ffmpeg_progress(self, total_frames: int | None = None,
+                        total_seconds: float | None = None) -> Callable[[dict], None]:
+        """Callback ``-progress`` ffmpeg: ułamek z ``frame`` albo ``out_time_us``."""
+        def on_progress(block: dict) -> None:
+            if block.get("progress") == "end":
+                self.update(1.0)
+            elif total_frames and block.get("frame", "").isdigit():
+                self.update(int(block["frame"]) / total_frames)
+            elif total_seconds and block.get("out_time_us", "").lstrip("-").isdigit():
+                self.update(int(block["out_time_us"]) / 1e6 / total_seconds)
+        return on_progress
+
+    # ─── Anulowanie ──────────────────────────────────────────────────────
+    @property
+    def cancelled(self) -> bool:
+        """Anulowane tutaj albo (znacznik ``<id>.cancel``) przez inny proces serwera."""
+        self._poll_cancel()
+        return self._cancel.is_set()
+
+    def _poll_cancel(self) -> None:
+        now = time.monotonic()
+        if self._cancel.is_set() or self._claim is None or now - self._polled_at < _CANCEL_POLL_INTERVAL:
+            return
+        self._polled_at = now
+        if _cancel_marker(self.id).exists():
+            self.cancel()
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise JobCancelled(self.id)
+
+    def attach(self, proc: subprocess.Popen) -> None:
+        """Zarejestruj proces ffmpeg zadania (zabijany przy anulowaniu)."""
+        with self._lock:
+            self._procs = [p for p in self._procs if p.poll() is None] + [proc]
+            cancelled = self._cancel.is_set()
+        if cancelled:
+            proc.kill()
+
+    def request_cancel(self) -> None:
+        """Poproś właściciela zadania (inny proces) o anulowanie."""
+        _cancel_marker(self.id).touch()
+
+    def claim(self) -> bool:
+        if self._claim is None:
+            self._claim = _claim(self.id)
+        return self._claim is not None
+
+    def release(self) -> None:
+        if self._claim is not None:
+            self._claim.close()
+            self._claim = None
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+
+    # ─── Zapis ───────────────────────────────────────────────────────────
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "session": self.session,
+            "status": self.status,
+            "stage": self.stage,
+            "stage_progress": round(self.stage_progress, 4),
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "restarts": self.restarts,
+            "key": self.key,
+            "params": self.params,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        job = cls(data["kind"], data["session"], data.get("params") or {}, data["id"],
+                  data.get("key"))
+        for key in ("status", "stage", "result", "error", "created_at", "started_at",
+                    "finished_at", "restarts"):
+            if key in data:
+                setattr(job, key, data[key])
+        job.stage_progress = data.get("stage_progress", 0.0)
+        return job
+
+    def save(self, throttle: bool = False) -> None:
+        now = time.monotonic()
+        if throttle and now - self._saved_at < _SAVE_INTERVAL:
+            return
+        path = jobs_dir() / f"{self.id}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Stan odczytany pod blokadą — ostatni zapis zawsze niesie najnowszy stan
+        with self._save_lock:
+            self._saved_at = now
+            atomic_write_bytes(path, json.dumps(self.to_dict()).encode("utf-8"))
+
+
+class JobQueue:
+    """Kolejka zadań z ograniczoną liczbą workerów; ``runners[kind](job)`` zwraca wynik."""
+
+    def __init__(self, workers: int | None = None):
+        self.workers = workers or config.EXPORT_WORKERS
+        self.runners: dict[str, Callable[[Job], dict]] = {}
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def register(self, kind: str, runner: Callable[[Job], dict]) -> None:
+        self.runners[kind] = runner
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers),
+                                                    thread_name_prefix="xeen-job")
+            return self._executor
+
+    def submit(self, kind: str, session: str, params: dict, key: str | None = None,
+               reuse: Callable[[Job], bool] | None = None) -> tuple[Job, bool]:
+        """Zleć zadanie; zwraca ``(zadanie, czy_istniejące)``.
+
+        With ``key``, a queued or running job with the same key is returned
+        instead of a new one, and so is the newest completed one if
+        ``reuse(job)`` accepts its result (e.g. the output file still exists).
+        """
+        if kind not in self.runners:
+            raise KeyError(f"no runner for job kind {kind!r}")
+        with self._submit_lock, _submit_flock():
+            if key is not None:
+                existing = self.find(lambda j: j.kind == kind and j.key == key and not j.cancelled and (
+                    j.status in (QUEUED, RUNNING) or (j.status == DONE and (reuse is None or reuse(j)))))
+                if existing is None:
+                    existing = self._find_foreign(kind, key, reuse)
+                if existing is not None:
+                    return existing, True
+            job = Job(kind, session, params, key=key)
+            job.claim()
+            return self._enqueue(job), False  # zapisane przed zwolnieniem blokady
+
+    def _find_foreign(self, kind: str, key: str,
+                      reuse: Callable[[Job], bool] | None) -> Job | None:
+        """Zadanie o tym kluczu z innego workera — trwające (z żywym właścicielem) albo gotowe."""
+        with self._lock:
+            local = set(self._jobs)
+        for job in _stored():
+            if job.id in local or job.kind != kind or job.key != key:
+                continue
+            if job.status == DONE and (reuse is None or reuse(job)):
+                return job
+            if job.status in (QUEUED, RUNNING) and not _cancel_marker(job.id).exists():
+                if not job.claim():
+                    return job  # właściciel żyje
+                job.release()  # osierocone — wznowi je restore
+        return None
+
+    def wait(self, job: Job, poll: float = 0.5) -> Job:
+        """Poczekaj na koniec zadania; cudze (z innego workera) śledzone przez jego plik."""
+        if job.future is not None:
+            job.future.result()
+            return job
+        while job.status not in FINISHED:
+            time.sleep(poll)
+            fresh = _load(job.id)
+            if fresh is None:
+                return job
+            if fresh.status not in FINISHED and fresh.claim():
+                fresh.release()  # właściciel padł bez zapisu wyniku
+                return fresh
+            job = fresh
+        return job
+
+    def _enqueue(self, job: Job) -> Job:
+        with self._lock:
+            self._jobs[job.id] = job
+        job.save()
+        job.future = self._pool().submit(self._run, job)
+        return job
+
+    def _run(self, job: Job) -> dict | None:
+        if job.cancelled:
+            return self._finish(job, CANCELLED)
+        job.status, job.started_at = RUNNING, time.time()
+        job.save()
+        try:
+            job.result = self.runners[job.kind](job)
+        except JobCancelled:
+            return self._finish(job, CANCELLED)
+        except Exception as e:
+            if job.cancelled:  # zabity ffmpeg kończy się błędem — to nadal anulowanie
+                return self._finish(job, CANCELLED)
+            log.exception("Job %s (%s) failed", job.id, job.kind)
+            job.error = str(getattr(e, "detail", None) or e)
+            return self._finish(job, FAILED)
+        return self._finish(job, DONE)
+
+    def _finish(self, job: Job, status: str) -> dict | None:
+        job.status, job.finished_at = status, time.time()
+        job.save()
+        _cancel_marker(job.id).unlink(missing_ok=True)
+        job.release()
+        self._forget_expired()
+        return job.result
+
+    def _forget_expired(self) -> None:
+        cutoff = time.time() - JOB_RETENTION
+        with self._lock:
+            for job_id in [i for i, j in self._jobs.items()
+                           if j.status in FINISHED and (j.finished_at or 0) < cutoff]:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return _load(job_id)
+
+    def find(self, predicate: Callable[[Job], bool]) -> Job | None:
+        """Pierwsze zadanie w pamięci (najnowsze najpierw) spełniające ``predicate``."""
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return next((j for j in jobs if predicate(j)), None)
+
+    def list(self, session: str | None = None) -> list[Job]:
+        """Zadania wszystkich workerów (z katalogu); własne w toku — ze stanem z pamięci."""
+        with self._lock:
+            live = dict(self._jobs)
+        jobs = [live.get(j.id, j) for j in _stored()]
+        if session is not None:
+            jobs = [j for j in jobs if j.session == session]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """Anuluj zadanie — własne od razu, cudze przez znacznik dla procesu-właściciela."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            if job.status not in FINISHED:
+                job.cancel()
+                if job.future is not None and job.future.cancel():
+                    self._finish(job, CANCELLED)  # jeszcze w kolejce — worker go nie dostanie
+            return job
+        job = _load(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.request_cancel()
+        if not job.claim():
+            return job  # właściciel zobaczy znacznik przy najbliższym postępie
+        # Nikt go nie trzyma (worker padł, restore jeszcze nie ruszył) — zamknij od razu
+        fresh = _load(job_id)
+        if fresh is not None and fresh.status in FINISHED:
+            job.release()
+            return fresh
+        self._finish(job, CANCELLED)
+        return job
+
+    def restore(self) -> int:
+        """Wczytaj zapisane zadania; przerwane (queued/running) wracają do kolejki."""
+        root = jobs_dir()
+        if not root.is_dir():
+            return 0
+        requeued = 0
+        cutoff = time.time() - JOB_RETENTION
+        for path in sorted(root.glob("*.json")):
+            try:
+                job = Job.from_dict(json.loads(path.read_text()))
+            except (OSError, ValueError, KeyError):
+                continue
+            with self._lock:
+                if job.id in self._jobs:
+                    continue
+            if job.status in FINISHED:
+                if (job.finished_at or 0) < cutoff:
+                    path.unlink(missing_ok=True)
+                    (root / f"{job.id}.lock").unlink(missing_ok=True)
+                    _cancel_marker(job.id).unlink(missing_ok=True)
+                    continue
+                with self._lock:
+                    self._jobs[job.id] = job
+                continue
+            if job.kind not in self.runners or not job.claim():
+                continue  # zajęte przez żywy proces serwera
+            # Stan po przejęciu blokady: poprzedni właściciel mógł je właśnie zakończyć
+            fresh = _load(job.id)
+            if fresh is None or fresh.status in FINISHED:
+                job.release()
+                if fresh is not None:
+                    with self._lock:
+                        self._jobs[fresh.id] = fresh
+                continue
+            fresh._claim, job._claim = job._claim, None
+            job = fresh
+            if _cancel_marker(job.id).exists():
+                self._finish(job, CANCELLED)
+                with self._lock:
+                    self._jobs[job.id] = job
+                continue
+            if job.status == RUNNING:
+                job.restarts += 1
+            job.status, job.stage, job.stage_progress = QUEUED, None, 0.0
+            self._enqueue(job)
+            requeued += 1
+        if requeued:
+            log.info("Re-queued %d interrupted job(s)", requeued)
+        return requeued
+
+
+def _stored() -> list[Job]:
+    """Zapisane zadania (wszystkich procesów), bez zakończonych dawniej niż ``JOB_RETENTION``."""
+    root = jobs_dir()
+    if not root.is_dir():
+        return []
+    cutoff = time.time() - JOB_RETENTION
+    jobs = []
+    for path in root.glob("*.json"):
+        job = _load(path.stem)
+        if job is not None and not (job.status in FINISHED and (job.finished_at or 0) < cutoff):
+            jobs.append(job)
+    return jobs
+
+
+def _load(job_id: str) -> Job | None:
+    """Zadanie z pliku (bez stanu wykonania — odczyt cudzego albo zakończonego)."""
+    path = jobs_dir() / f"{job_id}.json"
+    if not job_id.isalnum() or not path.is_file():
+        return None
+    try:
+        return Job.from_dict(json.loads(path.read_text()))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_queue = JobQueue()
+
+
+def job_queue() -> JobQueue:
+    return _queue
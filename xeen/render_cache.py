@@ -0,0 +1,232 @@
+"""Two-level (memory + disk) LRU cache for rendered image bytes.
+
+Entries are addressed by a key hashed from everything that influences the
+output — source file signature, normalized render parameters, quality — so
+identical requests are hits and any change simply produces a new key; there
+is no invalidation. Both levels have byte budgets: memory evicts LRU entries
+on insert, disk (``<data>/cache/<namespace>/``) is trimmed oldest-access-first
+when its running total overflows. Concurrent misses for the same key are
+coalesced into a single render.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+from PIL import Image, PngImagePlugin
+
+from xeen.config import get_data_dir
+
+CACHE_DIR = "cache"
+
+
+def file_signature(path: Path) -> list:
+    """Tania sygnatura wersji pliku do klucza cache (mtime, rozmiar, inode)."""
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def make_key(*parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2s(raw.encode(), digest_size=16).hexdigest()
+
+
+# ─── Keyed PNG outputs ──────────────────────────────────────────────────────
+# Pliki, które muszą leżeć pod stałą nazwą (np. podglądy przycięcia czytane
+# przez ffmpeg), niosą swój klucz renderu w chunku tEXt przed IDAT — odczyt
+# klucza to parsowanie nagłówka, bez dekodowania pikseli.
+
+PNG_KEY = "xeen-render-key"
+
+
+def png_render_key(path: Path) -> str | None:
+    """Klucz renderu zapisany w PNG albo None (brak pliku, inny plik)."""
+    try:
+        with Image.open(path) as img:
+            return img.info.get(PNG_KEY)
+    except (OSError, ValueError):
+        return None
+
+
+def save_keyed_png(img: Image.Image, path: Path, key: str) -> None:
+    """Zapisz PNG z kluczem renderu (atomowo: tmp + rename).
+
+    The temp file comes from ``mkstemp``, so it is unique across threads and
+    across render pool processes writing the same output.
+    """
+    info = PngImagePlugin.PngInfo()
+    info.add_text(PNG_KEY, key)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "PNG", pnginfo=info)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class RenderCache:
+    """Cache wyrenderowanych bajtów: LRU w pamięci + LRU na dysku."""
+
+    def __init__(self, namespace: str, mem_bytes: int, disk_bytes: int, suffix: str = ".bin"):
+        self.namespace = namespace
+        self.mem_bytes = mem_bytes
+        self.disk_bytes = disk_bytes
+        self.suffix = suffix
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_size = 0
+        self._disk_size: dict[Path, int] = {}
+        self._lock = threading.Lock()
+        self._inflight: dict[str, threading.Event] = {}
+        self.hits = self.disk_hits = self.misses = 0
+
+    # ─── storage levels ──────────────────────────────────────────────────
+
+    def _dir(self) -> Path:
+        return get_data_dir() / CACHE_DIR / self.namespace
+
+    def _path(self, key: str) -> Path:
+        return self._dir() / f"{key}{self.suffix}"
+
+    def _mem_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.mem_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_size -= len(old)
+            self._mem[key] = data
+            self._mem_size += len(data)
+            while self._mem_size > self.mem_bytes:
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_size -= len(evicted)
+
+    def _disk_get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            st = path.stat()
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        except OSError:
+            pass
+        return data
+
+    def _disk_put(self, key: str, data: bytes) -> None:
+        if not self.disk_bytes:
+            return
+        d = self._dir()
+        d.mkdir(parents=True, exist_ok=True)
+        path = d / f"{key}{self.suffix}"
+        tmp = d / f".{key}.{threading.get_ident()}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            total = self._disk_size.get(d)
+            if total is not None:
+                self._disk_size[d] = total + len(data)
+        if total is None or total + len(data) > self.disk_bytes:
+            self._trim_disk(d)
+
+    def _trim_disk(self, d: Path) -> None:
+        """Usuń najdawniej używane pliki, aż katalog zmieści się w 90% budżetu."""
+        entries = []
+        for e in os.scandir(d):
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entries.append((max(st.st_atime, st.st_mtime), st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        if total > self.disk_bytes:
+            target = self.disk_bytes * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_size[d] = total
+
+    # ─── public API ──────────────────────────────────────────────────────
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return data
+        data = self._disk_get(key)
+        if data is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._mem_put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._mem_put(key, data)
+        self._disk_put(key, data)
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> tuple[bytes, bool]:
+        """Zwróć (bajty, trafienie). Równoległe chybienia tego samego klucza renderują raz."""
+        while True:
+            data = self.get(key)
+            if data is not None:
+                return data, True
+            with self._lock:
+                event = self._inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = self._inflight[key] = threading.Event()
+            if owner:
+                break
+            event.wait()
+            # Po zakończeniu renderu właściciela: pętla → trafienie w pamięci
+
+        try:
+            # Wynik mógł pojawić się między chybieniem a przejęciem klucza
+            data = self.get(key)
+            if data is not None:
+                return data, True
+            with self._lock:
+                self.misses += 1
+            data = render()
+            self.put(key, data)
+            return data, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_size = 0
+            self._disk_size.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._mem),
+                "bytes": self._mem_size,
+                "max_bytes": self.mem_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
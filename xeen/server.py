@@ -1,10 +1,17 @@
 """FastAPI server for xeen web editor."""
 
+import asyncio
 import json
 import io
+import base64
+import binascii
 import logging
-import subprocess
+import mimetypes
+import os
 import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlencode
 from pathlib import Path
 from datetime import datetime
 from PIL import Image
@@ -87,13 +94,47 @@ except ImportError:
             return func
         return decorator
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Header
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from xeen.config import get_data_dir, CROP_PRESETS, SOCIAL_LINKS
+from xeen.render_cache import RenderCache, file_signature, make_key, png_render_key
+from xeen.crop_plan import header_size_reader, plan_crops
+from xeen.archive import (
+    archive_path,
+    available_frames,
+    frame_source,
+    frame_version,
+    open_frame_image,
+    read_frame_bytes,
+    source_version,
+)
+from xeen import (
+    camera, config, crop_render, ffmpeg_pipe, focus, http_cache, jobs, sprites, storage, thumbs,
+    tiles, variants,
+)
+from xeen.bundle import BUNDLE_SUFFIX, BundleError, StreamReader, import_bundle, iter_bundle
+from xeen.frame_store import (
+    normalize_png,
+    release_frames,
+    sha256_file,
+    store_frame,
+)
+from xeen.session_store import (
+    ALL_FIELDS,
+    DEFAULT_FIELDS,
+    EVENTS,
+    HEAVY_FRAME_FIELDS,
+    is_legacy,
+    iter_session_summaries,
+    load_session_meta,
+    save_session_meta,
+    aupdate_session_meta,
+    forget_session,
+)
 
 app = FastAPI(title="xeen", version="0.1.0")
 
@@ -149,6 +190,23 @@ def data_dir() -> Path:
     return get_data_dir()
 
 
+def _read_meta(name: str, detail: str | None = None, mutable: bool = False,
+               fields=DEFAULT_FIELDS) -> dict:
+    """Wczytaj metadane sesji przez cache; 404 gdy sesja nie istnieje."""
+    try:
+        return load_session_meta(name, fields=fields, mutable=mutable)
+    except FileNotFoundError:
+        raise HTTPException(404, detail)
+
+
+async def _update_meta(name: str, mutate, detail: str | None = None):
+    """Atomowy read-modify-write session.json pod blokadą sesji; 404 gdy brak sesji."""
+    try:
+        return await aupdate_session_meta(name, mutate)
+    except FileNotFoundError:
+        raise HTTPException(404, detail)
+
+
 # ─── Startup Event ────────────────────────────────────────────────────────────
 @app.on_event("startup")
 async def startup_event():
@@ -159,6 +217,9 @@ async def startup_event():
     logger.info(f"📁 **Data directory**: `{data_path}`")
     logger.info(f"🌐 **Server URL**: `http://127.0.0.1:7600`")
     logger.info(f"📸 **Static files**: `{_static_dir}`")
+    requeued = jobs.job_queue().restore()
+    if requeued:
+        logger.info(f"🔁 **Export jobs re-queued**: `{requeued}`")
     logger.info("✅ **Server ready to accept connections**")
     logger.info("---")
 
@@ -221,123 +282,402 @@ async def save_branding(req: BrandingRequest):
 
 # ─── API: Sessions ───────────────────────────────────────────────────────────
 
+SESSION_SORT_KEYS = ("name", "created_at", "duration", "frame_count")
+
+
+def _encode_cursor(value, name: str) -> str:
+    raw = json.dumps([value, name], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, name = json.loads(raw)
+        return value, name
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
 @app.get("/api/sessions")
 @log_request
-async def list_sessions():
-    """Lista wszystkich sesji nagrywania."""
-    sessions_dir = data_dir() / "sessions"
-    if not sessions_dir.exists():
+async def list_sessions(
+    response: Response,
+    limit: int | None = None,
+    after: str | None = None,
+    sort: str = "name",
+    order: str = "desc",
+    source: str | None = None,
+    created_from: str | None = None,
+    created_to: str | None = None,
+    has_captions: bool | None = None,
+):
+    """Lista sesji nagrywania — sortowanie, filtry i paginacja kursorem.
+
+    Kolejna strona: ``after`` = wartość nagłówka ``X-Next-Cursor`` poprzedniej odpowiedzi.
+    Zakres dat porównuje prefiks ``created_at`` (np. ``2025-01`` lub ``2025-01-31``).
+    """
+    if sort not in SESSION_SORT_KEYS:
+        raise HTTPException(400, f"sort must be one of {', '.join(SESSION_SORT_KEYS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(400, "order must be 'asc' or 'desc'")
+    if not (data_dir() / "sessions").exists():
         return []
+
     results = []
-    for s in sorted(sessions_dir.iterdir(), reverse=True):
-        meta_file = s / "session.json"
-        if meta_file.exists():
-            meta = json.loads(meta_file.read_text())
-            results.append({
-                "name": meta.get("name", s.name),
-                "created_at": meta.get("created_at", ""),
-                "frame_count": meta.get("frame_count", 0),
-                "duration": meta.get("duration", 0),
-            })
+    for item in iter_session_summaries():
+        created = item["created_at"]
+        if source is not None and item["source"] != source:
+            continue
+        if created_from and created[:len(created_from)] < created_from:
+            continue
+        if created_to and created[:len(created_to)] > created_to:
+            continue
+        if has_captions is not None and item["has_captions"] != has_captions:
+            continue
+        results.append(item)
+
+    reverse = order == "desc"
+    results.sort(key=lambda it: (it[sort], it["name"]), reverse=reverse)
+
+    if after:
+        cursor = tuple(_decode_cursor(after))
+        try:
+            if reverse:
+                results = [it for it in results if (it[sort], it["name"]) < cursor]
+            else:
+                results = [it for it in results if (it[sort], it["name"]) > cursor]
+        except TypeError:
+            raise HTTPException(400, "Cursor does not match sort key")
+
+    if limit is not None and limit >= 0 and len(results) > limit:
+        results = results[:limit]
+        if results:
+            last = results[-1]
+            response.headers["X-Next-Cursor"] = _encode_cursor(last[sort], last["name"])
     return results
 
 
+def _project_meta(meta: dict, wanted: set[str]) -> dict:
+    """Zostaw tylko żądane pola; ``core`` oznacza wszystkie pola poza sidecarami."""
+    out = {
+        k: v for k, v in meta.items()
+        if k in wanted or ("core" in wanted and k not in ALL_FIELDS)
+    }
+    if wanted & set(HEAVY_FRAME_FIELDS) and "frames" in meta:
+        out["frames"] = meta["frames"]
+    drop = [h for h in HEAVY_FRAME_FIELDS if h not in wanted]
+    if "frames" in out and drop and is_legacy(meta):
+        out["frames"] = [{k: v for k, v in f.items() if k not in drop} for f in out["frames"]]
+    return out
+
+
 @app.get("/api/sessions/{name}")
-async def get_session(name: str):
-    """Pobierz szczegóły sesji."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404, "Session not found")
-    meta = json.loads(meta_file.read_text())
-    frames_dir = data_dir() / "sessions" / name / "frames"
-    missing = []
-    for f in meta.get("frames", []):
-        fp = frames_dir / f["filename"]
-        if not fp.exists():
-            missing.append(f["filename"])
+async def get_session(
+    name: str,
+    fields: str | None = None,
+    frame_offset: int = 0,
+    frame_limit: int | None = None,
+):
+    """Pobierz szczegóły sesji.
+
+    ``fields`` — opcjonalna projekcja, np. ``core,frames`` lub ``name,frame_count``.
+    Grupy ``ocr_text``, ``input_events`` i ``input_log`` są ładowane z sidecarów
+    tylko na żądanie; bez parametru zwracany jest pełny dokument.
+    ``frame_offset``/``frame_limit`` zwracają okno klatek (+ ``frames_total``).
+    """
+    if fields:
+        wanted = {f.strip() for f in fields.split(",") if f.strip()}
+        meta = _read_meta(name, "Session not found",
+                          fields=tuple(g for g in ALL_FIELDS if g in wanted))
+        meta = _project_meta(meta, wanted)
+    else:
+        meta = _read_meta(name, "Session not found", fields=ALL_FIELDS)
+    if "frames" not in meta:
+        return meta
+
+    frames = meta["frames"]
+    if frame_offset or frame_limit is not None:
+        end = None if frame_limit is None else frame_offset + max(0, frame_limit)
+        meta = {**meta, "frames": frames[frame_offset:end], "frames_total": len(frames)}
+
+    on_disk = available_frames(name)
+    missing = [f["filename"] for f in meta["frames"] if f["filename"] not in on_disk]
     if missing:
         logger.warning("Session %s: %d/%d frames missing on disk: %s",
-                       name, len(missing), len(meta.get("frames", [])), missing)
-        meta["_missing_frames"] = missing
+                       name, len(missing), len(meta["frames"]), missing)
+        meta = {**meta, "_missing_frames": missing}
     return meta
 
 
 @app.get("/api/sessions/{name}/thumbnails")
-async def get_session_thumbnails(name: str, limit: int = 9):
-    """Pobierz pierwsze N klatek sesji jako thumbnails."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404, "Session not found")
-    meta = json.loads(meta_file.read_text())
-    frames = meta.get("frames", [])[:limit]
+async def get_session_thumbnails(name: str, limit: int = 9, offset: int = 0):
+    """Pobierz N klatek sesji (od ``offset``) jako thumbnails."""
+    meta = _read_meta(name, "Session not found")
+    frames = meta.get("frames", [])[offset:offset + limit]
     thumbs = []
     for f in frames:
         thumb_name = f["filename"].replace(".png", "_thumb.webp")
+        # ?v= (wersja treści klatki) pozwala przeglądarce cache'ować na stałe
+        version = f"?v={f['sha256'][:16]}" if f.get("sha256") else ""
         thumbs.append({
             "index": f["index"],
             "filename": f["filename"],
-            "thumb_url": f"/api/sessions/{name}/thumbs/{thumb_name}",
-            "url": f"/api/sessions/{name}/frames/{f['filename']}",
+            "thumb_url": f"/api/sessions/{name}/thumbs/{thumb_name}{version}",
+            "url": f"/api/sessions/{name}/frames/{f['filename']}{version}",
         })
     return {"name": name, "thumbnails": thumbs}
 
 
+def _sprite_names(names: str) -> list[str]:
+    return [n for n in (part.strip() for part in names.split(",")) if n]
+
+
+def _sprite_payload(names: list[str], per_session: int) -> dict:
+    layout = sprites.sprite_layout(names, per_session)
+    query = urlencode({"names": ",".join(layout["sessions"]),
+                       "per_session": layout["per_session"], "v": layout["key"]})
+    layout["url"] = f"/api/sprites/atlas.webp?{query}"
+    return layout
+
+
+@app.get("/api/sprites")
+async def get_sprite_layout(names: str, per_session: int = 9):
+    """Układ atlasu miniatur dla strony sesji (``names`` — lista po przecinku).
+
+    Zwraca współrzędne klatek w atlasie i ``url`` samego obrazu (WebP);
+    jedno żądanie obrazu zastępuje ``len(names) × per_session`` miniatur.
+    """
+    return await asyncio.to_thread(_sprite_payload, _sprite_names(names), per_session)
+
+
+@app.get("/api/sessions/{name}/sprite")
+async def get_session_sprite_layout(name: str, limit: int = 9):
+    """Atlas miniatur jednej sesji (pierwsze ``limit`` klatek)."""
+    if not (data_dir() / "sessions" / name).exists():
+        raise HTTPException(404, "Session not found")
+    return await asyncio.to_thread(_sprite_payload, [name], limit)
+
+
+@app.get("/api/sprites/atlas.webp")
+async def get_sprite_atlas(request: Request, names: str, per_session: int = 9,
+                           v: str | None = None):
+    """Obraz atlasu. ``v`` zgodne z bieżącym kluczem → ``Cache-Control: immutable``."""
+    layout = await asyncio.to_thread(sprites.sprite_layout, _sprite_names(names), per_session)
+    key = layout["key"]
+    etag = f'"{key}"'
+    policy = http_cache.IMMUTABLE if v == key else http_cache.REVALIDATE
+    headers = {"ETag": etag, "Cache-Control": policy}
+    if http_cache.is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    data, hit = await asyncio.to_thread(
+        _sprite_cache.get_or_render, key, lambda: sprites.render_sprite(layout))
+    headers["X-Cache"] = "HIT" if hit else "MISS"
+    return Response(data, media_type="image/webp", headers=headers)
+
+
+# Atlasy miniatur; klucz obejmuje wersje klatek, więc zmiana klatek = nowy atlas
+_sprite_cache = RenderCache(
+    "sprites", config.RENDER_CACHE_MEM_BYTES, config.RENDER_CACHE_DISK_BYTES, suffix=".webp")
+
+
+def _frame_sha(name: str, filename: str) -> str | None:
+    """sha256 klatki z metadanych (None dla starszych sesji bez skrótów)."""
+    try:
+        frames = load_session_meta(name).get("frames", [])
+    except FileNotFoundError:
+        return None
+    for f in frames:
+        if f.get("filename") == filename:
+            return f.get("sha256") or None
+    return None
+
+
+def _cache_policy(sha: str | None, v: str | None) -> str:
+    """immutable tylko dla URL-i z wersją zgodną z bieżącą treścią klatki."""
+    if sha and v and len(v) >= 8 and sha.startswith(v):
+        return http_cache.IMMUTABLE
+    return http_cache.REVALIDATE
+
+
+def _member_response(request: Request, name: str, member: str, view: memoryview,
+                     media_type: str, etag: str | None, cache_control: str,
+                     headers: dict | None = None) -> Response:
+    """Serve a packed archive member as zero-copy memoryview slices."""
+    st = archive_path(name).stat()
+    if etag is None:
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}-{binascii.crc32(member.encode()):x}"'
+    return http_cache.bytes_response(request, view, media_type, etag=etag,
+                                     last_modified=st.st_mtime, cache_control=cache_control,
+                                     headers=headers)
+
+
+# Odpowiedzi negocjowane po Accept (oryginał albo wariant AVIF/WebP)
+VARY_ACCEPT = {"Vary": "Accept"}
+
+
+def _negotiate_variant(request: Request, name: str, folder: str, filename: str,
+                       source_type: str) -> tuple[str | None, Path | None]:
+    """(wynegocjowany typ, gotowy plik wariantu). Brak pliku → wariant generuje się w tle."""
+    mime = variants.negotiate(request.headers.get("accept"), source_type)
+    if mime is None:
+        return None, None
+    try:
+        path = variants.lookup(name, folder, filename, mime)
+    except FileNotFoundError:
+        return None, None
+    if path is not None:
+        storage.touch(path)
+    else:
+        storage.schedule_enforce()
+    return mime, path
+
+
+def _variant_response(request: Request, path: Path, mime: str, sha: str | None,
+                      policy: str) -> Response:
+    etag = f'"{sha[:16]}-{variants.FORMATS[mime][1]}"' if sha else None
+    return http_cache.file_response(request, path, mime, etag=etag, cache_control=policy,
+                                    headers=VARY_ACCEPT)
+
+
 @app.get("/api/sessions/{name}/thumbs/{filename}")
-async def get_thumb_image(name: str, filename: str):
-    """Serve cached thumbnail (WebP). Falls back to generating on-the-fly."""
-    thumb_path = data_dir() / "sessions" / name / "thumbs" / filename
-    if thumb_path.exists():
-        return FileResponse(thumb_path, media_type="image/webp")
-
-    # Fallback: generate from original frame
-    base = filename.replace("_thumb.webp", ".png")
-    frame_path = data_dir() / "sessions" / name / "frames" / base
-    if not frame_path.exists():
+async def get_thumb_image(request: Request, name: str, filename: str,
+                          wait: int | None = None, v: str | None = None):
+    """Serve cached thumbnail (WebP).
+
+    Brakująca miniatura jest generowana w puli wątków (jedno zadanie na
+    miniaturę, niezależnie od liczby równoległych żądań). Handler czeka na nią
+    najwyżej ``wait`` ms (domyślnie XEEN_THUMB_WAIT_MS), potem zwraca placeholder.
+    """
+    base = thumbs.frame_name(filename)
+    sha = _frame_sha(name, base)
+    policy = _cache_policy(sha, v) if v else http_cache.REVALIDATE
+    src = frame_source(name, filename, "thumbs")
+    if src is not None:
+        mime, variant = _negotiate_variant(request, name, "thumbs", filename, "image/webp")
+        if variant is not None:
+            return _variant_response(request, variant, mime, sha if v else None, policy)
+        if mime is not None:
+            policy = http_cache.REVALIDATE  # wariant w drodze — nie utrwalaj oryginału
+    if isinstance(src, Path):
+        storage.touch(src)
+        return http_cache.file_response(request, src, "image/webp", cache_control=policy,
+                                        headers=VARY_ACCEPT)
+    if src is not None:
+        return _member_response(request, name, f"thumbs/{filename}", src, "image/webp",
+                                None, policy, VARY_ACCEPT)
+
+    if frame_source(name, base) is None:
         raise HTTPException(404, "Thumb not found")
 
-    from PIL import Image as PILImage
-    img = PILImage.open(frame_path)
-    tw = 320
-    th = int(img.height * (tw / img.width))
-    thumb = img.resize((tw, th), PILImage.LANCZOS)
-
-    thumb_dir = data_dir() / "sessions" / name / "thumbs"
-    thumb_dir.mkdir(exist_ok=True)
-    thumb.save(thumb_path, "WEBP", quality=75)
-    return FileResponse(thumb_path, media_type="image/webp")
+    fut = thumbs.request_thumb(name, base)
+    deadline = (config.THUMB_WAIT_MS if wait is None else max(0, wait)) / 1000
+    try:
+        path = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), deadline)
+    except asyncio.TimeoutError:
+        return Response(thumbs.placeholder_bytes(), media_type="image/webp",
+                        headers={"Cache-Control": "no-store", "Retry-After": "1",
+                                 "X-Thumb-Status": "pending"})
+    except FileNotFoundError:
+        raise HTTPException(404, "Thumb not found")
+    storage.schedule_enforce()
+    return http_cache.file_response(request, path, "image/webp", cache_control=policy,
+                                    headers=VARY_ACCEPT)
 
 
 @app.get("/api/sessions/{name}/frames/{filename}")
-async def get_frame_image(name: str, filename: str):
-    """Zwróć obraz klatki."""
-    filepath = data_dir() / "sessions" / name / "frames" / filename
-    if not filepath.exists():
+async def get_frame_image(request: Request, name: str, filename: str, v: str | None = None):
+    """Zwróć obraz klatki.
+
+    ETag pochodzi z sha256 klatki (lub mtime+rozmiar); URL z ``?v=<sha>``
+    dostaje ``Cache-Control: immutable``. Klient akceptujący ``image/avif``
+    lub ``image/webp`` dostaje gotowy wariant w tym formacie (PNG pozostaje
+    nietknięty — z niego korzysta eksport).
+    """
+    src = frame_source(name, filename)
+    if src is None:
         raise HTTPException(404, "Frame not found")
-    return FileResponse(filepath, media_type="image/png")
+    sha = _frame_sha(name, filename)
+    policy = _cache_policy(sha, v)
+    mime, variant = _negotiate_variant(request, name, "frames", filename, "image/png")
+    if variant is not None:
+        return _variant_response(request, variant, mime, sha, policy)
+    if mime is not None:
+        policy = http_cache.REVALIDATE  # wariant w drodze — nie utrwalaj PNG w cache klienta
+    if isinstance(src, Path):
+        etag = http_cache.content_etag(sha, src.stat().st_size) if sha else None
+        return http_cache.file_response(request, src, "image/png", etag=etag, cache_control=policy,
+                                        headers=VARY_ACCEPT)
+    etag = http_cache.content_etag(sha, len(src)) if sha else None
+    return _member_response(request, name, f"frames/{filename}", src, "image/png", etag, policy,
+                            VARY_ACCEPT)
+
+
+@app.get("/api/sessions/{name}/frames/{filename}/tiles")
+async def get_frame_tile_info(name: str, filename: str):
+    """Opis piramidy kafelków klatki (wymiary, poziomy, rozmiar kafelka)."""
+    try:
+        info = await asyncio.to_thread(tiles.tile_info, name, filename)
+    except FileNotFoundError:
+        raise HTTPException(404, "Frame not found")
+    info["url"] = f"/api/sessions/{name}/frames/{filename}/tiles/{{z}}/{{x}}/{{y}}"
+    return info
+
+
+@app.get("/api/sessions/{name}/frames/{filename}/tiles/{z}/{x}/{y}")
+async def get_frame_tile(request: Request, name: str, filename: str, z: int, x: int, y: int):
+    """Kafelek WebP piramidy deep-zoom (generowany leniwie, cache na dysku + ETag)."""
+    try:
+        version = source_version(name, filename)
+    except FileNotFoundError:
+        raise HTTPException(404, "Frame not found")
+    etag = tiles.tile_etag(version, z, x, y)
+    if http_cache.is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": http_cache.SHORT})
+    try:
+        path = await asyncio.to_thread(tiles.render_tile, name, filename, version, z, x, y)
+    except FileNotFoundError:
+        raise HTTPException(404, "Frame not found")
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    storage.touch(path)
+    return http_cache.file_response(request, path, "image/webp", etag=etag,
+                                    cache_control=http_cache.SHORT)
 
 
 @app.delete("/api/sessions/{name}")
 async def delete_session(name: str):
     """Usuń sesję."""
     session_dir = data_dir() / "sessions" / name
+    try:
+        frames = load_session_meta(name).get("frames", [])
+    except (FileNotFoundError, ValueError):
+        frames = []
     if session_dir.exists():
         shutil.rmtree(session_dir)
+    forget_session(name)
+    release_frames(frames)
     return {"ok": True}
 
 
 @app.delete("/api/sessions/{name}/frames/{filename}")
 async def delete_frame(name: str, filename: str):
     """Usuń pojedynczą klatkę z sesji i zaktualizuj session.json."""
-    session_dir = data_dir() / "sessions" / name
-    filepath = session_dir / "frames" / filename
-    if not filepath.exists():
+    src = frame_source(name, filename)
+    if src is None:
         raise HTTPException(404, "Frame not found")
 
-    filepath.unlink()
+    try:
+        removed = [f for f in load_session_meta(name).get("frames", [])
+                   if f.get("filename") == filename]
+    except FileNotFoundError:
+        removed = []
+    # Klatka ze spakowanego archiwum znika tylko z metadanych (miejsce odzyska repack)
+    if isinstance(src, Path):
+        src.unlink()
+        release_frames(removed)
 
-    meta_file = session_dir / "session.json"
-    if meta_file.exists():
-        meta = json.loads(meta_file.read_text())
+    def _drop(meta: dict):
         meta["frames"] = [f for f in meta.get("frames", []) if f["filename"] != filename]
         meta["frame_count"] = len(meta["frames"])
         for i, f in enumerate(meta["frames"]):
@@ -346,7 +686,11 @@ async def delete_frame(name: str, filename: str):
             meta["selected_frames"] = [
                 i for i in range(len(meta["frames"]))
             ]
-        meta_file.write_text(json.dumps(meta, indent=2))
+
+    try:
+        await aupdate_session_meta(name, _drop)
+    except FileNotFoundError:
+        pass
 
     return {"ok": True}
 
@@ -357,30 +701,23 @@ async def delete_frame(name: str, filename: str):
 async def get_frame_similarity(name: str, threshold: float = 90.0):
     """Compute pairwise similarity between frames using perceptual hashing."""
     import imagehash
-    from PIL import Image
 
-    session_dir = data_dir() / "sessions" / name
-    meta_file = session_dir / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404, "Session not found")
-
-    meta = json.loads(meta_file.read_text())
+    meta = _read_meta(name, "Session not found")
     frames = meta.get("frames", [])
-    frames_dir = session_dir / "frames"
 
     # Compute perceptual hashes
     hashes = []
     for f in frames:
-        fp = frames_dir / f["filename"]
-        if fp.exists():
-            try:
-                img = Image.open(fp)
-                h = imagehash.phash(img, hash_size=16)
-                hashes.append({"index": f["index"], "filename": f["filename"], "hash": str(h), "hash_obj": h})
-            except Exception as e:
-                logger.warning("Failed to hash frame %s: %s", f["filename"], e)
-                hashes.append({"index": f["index"], "filename": f["filename"], "hash": None, "hash_obj": None})
-        else:
+        try:
+            img = open_frame_image(name, f["filename"])
+        except FileNotFoundError:
+            hashes.append({"index": f["index"], "filename": f["filename"], "hash": None, "hash_obj": None})
+            continue
+        try:
+            h = imagehash.phash(img, hash_size=16)
+            hashes.append({"index": f["index"], "filename": f["filename"], "hash": str(h), "hash_obj": h})
+        except Exception as e:
+            logger.warning("Failed to hash frame %s: %s", f["filename"], e)
             hashes.append({"index": f["index"], "filename": f["filename"], "hash": None, "hash_obj": None})
 
     # Pairwise comparison
@@ -427,21 +764,23 @@ async def upload_screenshots(files: list[UploadFile] = File(...)):
     frames = []
     for i, f in enumerate(sorted(files, key=lambda x: x.filename)):
         content = await f.read()
-        img = Image.open(io.BytesIO(content))
+        # PNG zapisywany bez ponownego kodowania; inne formaty konwertowane raz
+        png, width, height = normalize_png(content, mode=None)
         filename = f"frame_{i:04d}.png"
-        img.save(session_dir / "frames" / filename, "PNG")
+        sha = store_frame(session_dir / "frames", filename, png)
         frames.append({
             "index": i,
             "timestamp": i * 1.0,
             "filename": filename,
-            "width": img.width,
-            "height": img.height,
+            "width": width,
+            "height": height,
             "change_pct": 100.0 if i == 0 else 0.0,
-            "mouse_x": img.width // 2,
-            "mouse_y": img.height // 2,
-            "suggested_center_x": img.width // 2,
-            "suggested_center_y": img.height // 2,
+            "mouse_x": width // 2,
+            "mouse_y": height // 2,
+            "suggested_center_x": width // 2,
+            "suggested_center_y": height // 2,
             "input_events": [],
+            "sha256": sha,
         })
 
     meta = {
@@ -453,10 +792,60 @@ async def upload_screenshots(files: list[UploadFile] = File(...)):
         "frames": frames,
         "input_log": [],
     }
-    (session_dir / "session.json").write_text(json.dumps(meta, indent=2))
+    save_session_meta(name, meta)
+    thumbs.schedule_thumbs(name, [f["filename"] for f in frames])
+    focus.request_focus(name)
     return {"name": name, "frame_count": len(frames)}
 
 
+# ─── API: Session bundles (przenoszenie sesji między maszynami) ──────────────
+
+@app.get("/api/sessions/{name}/bundle")
+async def export_session_bundle(name: str):
+    """Strumieniuj sesję jako bundle .xeen.tgz (metadane, klatki, napisy, środki)."""
+    try:
+        chunks = iter_bundle(name)
+    except FileNotFoundError:
+        raise HTTPException(404, "Session not found")
+    return StreamingResponse(chunks, media_type="application/gzip", headers={
+        "Content-Disposition": f'attachment; filename="{name}{BUNDLE_SUFFIX}"',
+    })
+
+
+@app.post("/api/sessions/import")
+async def import_session_bundle(request: Request, name: str | None = None):
+    """Zaimportuj bundle przesłany jako surowe body (strumieniowo, stała pamięć)."""
+    reader = StreamReader()
+    task = asyncio.ensure_future(asyncio.to_thread(_import_bundle_stream, reader, name))
+    try:
+        async for chunk in request.stream():
+            if not await asyncio.to_thread(reader.feed, chunk):
+                break
+    except BaseException:
+        # Klient się rozłączył — importer zobaczy ucięty strumień i posprząta staging
+        reader.feed_eof()
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+    reader.feed_eof()
+    try:
+        result = await task
+    except BundleError as e:
+        raise HTTPException(400, str(e))
+    except FileExistsError as e:
+        raise HTTPException(409, f"Session already exists: {e}")
+    meta = load_session_meta(result["name"])
+    thumbs.schedule_thumbs(result["name"], [f["filename"] for f in meta.get("frames", [])])
+    focus.request_focus(result["name"])
+    return result
+
+
+def _import_bundle_stream(reader: StreamReader, name: str | None) -> dict:
+    try:
+        return import_bundle(reader, name)
+    finally:
+        reader.close()
+
+
 # ─── API: Tab 1 - Frame Selection ────────────────────────────────────────────
 
 class FrameSelection(BaseModel):
@@ -466,12 +855,10 @@ class FrameSelection(BaseModel):
 @app.post("/api/sessions/{name}/select")
 async def save_frame_selection(name: str, selection: FrameSelection):
     """Zapisz wybór klatek."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
-    meta["selected_frames"] = selection.selected_indices
-    meta_file.write_text(json.dumps(meta, indent=2))
+    def _select(meta: dict):
+        meta["selected_frames"] = selection.selected_indices
+
+    await _update_meta(name, _select)
     return {"ok": True, "selected": len(selection.selected_indices)}
 
 
@@ -483,15 +870,22 @@ class FrameUpdate(BaseModel):
 @app.post("/api/sessions/{name}/update-frames")
 async def update_frames(name: str, req: FrameUpdate):
     """Aktualizuj listę klatek (po usunięciu/przywróceniu)."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
-    meta["frames"] = req.frames
-    meta["frame_count"] = len(req.frames)
-    if req.selected_frames is not None:
-        meta["selected_frames"] = req.selected_frames
-    meta_file.write_text(json.dumps(meta, indent=2))
+    def _replace(meta: dict):
+        # Klient zwykle odsyła lekkie klatki — zachowaj OCR/zdarzenia ze starego dokumentu
+        old = {f["filename"]: f for f in meta.get("frames", []) if "filename" in f}
+        for f in req.frames:
+            prev = old.get(f.get("filename"))
+            if prev is None:
+                continue
+            for key in HEAVY_FRAME_FIELDS:
+                if key not in f and key in prev:
+                    f[key] = prev[key]
+        meta["frames"] = req.frames
+        meta["frame_count"] = len(req.frames)
+        if req.selected_frames is not None:
+            meta["selected_frames"] = req.selected_frames
+
+    await _update_meta(name, _replace)
     logger.info(f"🗑️ **Frames updated** for session `{name}`: {len(req.frames)} frames")
     return {"ok": True, "frame_count": len(req.frames)}
 
@@ -511,15 +905,14 @@ class CenterMarks(BaseModel):
 @app.post("/api/sessions/{name}/centers")
 async def save_centers(name: str, marks: CenterMarks):
     """Zapisz oznaczenia środków."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
     centers = {}
     for m in marks.marks:
         centers[str(m.frame_index)] = {"x": m.center_x, "y": m.center_y}
-    meta["custom_centers"] = centers
-    meta_file.write_text(json.dumps(meta, indent=2))
+
+    def _set_centers(meta: dict):
+        meta["custom_centers"] = centers
+
+    await _update_meta(name, _set_centers)
     return {"ok": True}
 
 
@@ -536,30 +929,153 @@ class CropRequest(BaseModel):
     custom_w: int | None = None
     custom_h: int | None = None
     frame_indices: list[int] | None = None  # None = wszystkie zaznaczone
-    focus_mode: str = "screen"  # "screen" | "mouse" | "keyboard" | "application"
+    focus_mode: str = "screen"  # "screen" | "mouse" | "keyboard" | "application" | "auto"
     zoom_level: float = 1.0  # 1.0 - 10.0
     mouse_padding: int = 100  # piksele wokół myszy
     custom_centers: dict | None = None  # {"0": {"x":..,"y":..}, ..} — nadpisuje session.json
+    watermark: bool = False  # wypal znak wodny z branding.json (pliki *_wm.png)
 
 
 @app.post("/api/sessions/{name}/crop-preview")
 async def crop_preview(name: str, req: CropRequest):
-    """Generuj podgląd przyciętych klatek."""
+    """Generuj podgląd przyciętych klatek.
+
+    Każdy plik podglądu niesie klucz renderu (skrót klatki, prostokąt, rozmiar
+    docelowy, filtr, wersja brandingu) — jeśli plik na dysku ma ten sam klucz,
+    jest używany ponownie bez dekodowania i kodowania klatki.
+    """
+    meta = _read_meta(name)
+    (target_w, target_h), items = _crop_outputs(name, meta, req, await _auto_focus(name, req.focus_mode))
+    statuses = await _render_crop_outputs(name, items)
+
+    results = [entry for (_, _, entry), st in zip(items, statuses) if st != crop_render.MISSING]
+    reused = statuses.count(crop_render.REUSED)
+    return {"previews": results, "target": {"w": target_w, "h": target_h}, "reused": reused}
+
+
+# Aktywne strumienie podglądu: klucz klienta → sygnał anulowania
+_crop_streams: dict[str, asyncio.Event] = {}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/sessions/{name}/crop-preview/stream")
+async def crop_preview_stream(name: str, req: CropRequest, order: str = "completion",
+                              stream: str | None = None):
+    """Strumieniuj podgląd przycięcia (Server-Sent Events) — klatka po klatce.
+
+    Każde zdarzenie ``preview`` niesie to samo co wpis ``previews`` z
+    ``crop-preview`` plus ``url``, wysyłane zaraz po wyrenderowaniu klatki:
+    ``order=completion`` (domyślnie) w kolejności ukończenia, ``order=request``
+    w kolejności klatek. Rozłączenie klienta albo nowy strumień z tym samym
+    ``stream`` anuluje klatki, których render jeszcze się nie zaczął.
+    """
+    if order not in ("completion", "request"):
+        raise HTTPException(400, "order must be 'completion' or 'request'")
+    meta = _read_meta(name)
+    (target_w, target_h), items = _crop_outputs(name, meta, req, await _auto_focus(name, req.focus_mode))
+    target = {"w": target_w, "h": target_h}
+
+    cancel = asyncio.Event()
+    if stream:
+        previous = _crop_streams.get(stream)
+        if previous is not None:
+            previous.set()
+        _crop_streams[stream] = cancel
+
+    tasks: dict[str, list[dict]] = {}
+    slots = []  # (klatka, pozycja wyjścia w zadaniu klatki) dla każdego wpisu items
+    for filename, spec, _ in items:
+        slots.append((filename, len(tasks.setdefault(filename, []))))
+        tasks[filename].append(spec)
+
+    def payload(pos: int, status: str) -> dict:
+        _, spec, entry = items[pos]
+        url = f"/api/sessions/{name}/preview/{entry['filename']}?v={spec['key'][:12]}"
+        return {**entry, "url": url, "status": status}
+
+    async def events():
+        futures = {asyncio.wrap_future(crop_render.submit_frame(name, fn, outs)): fn
+                   for fn, outs in tasks.items()}
+        pending = set(futures)
+        ready: dict[str, list[str]] = {}
+        next_pos = sent = reused = 0
+        try:
+            yield _sse("start", {"count": len(items), "target": target, "order": order})
+            while pending and not cancel.is_set():
+                cancelled = asyncio.ensure_future(cancel.wait())
+                done, _ = await asyncio.wait(pending | {cancelled},
+                                             return_when=asyncio.FIRST_COMPLETED)
+                cancelled.cancel()
+                finished = []
+                for fut in done - {cancelled}:
+                    pending.discard(fut)
+                    fn = futures[fut]
+                    try:
+                        ready[fn] = fut.result()
+                    except BrokenProcessPool:
+                        ready[fn] = await asyncio.to_thread(crop_render.render_frame, name, fn, tasks[fn])
+                    finished.append(fn)
+
+                if order == "request":
+                    positions = []
+                    while next_pos < len(items) and slots[next_pos][0] in ready:
+                        positions.append(next_pos)
+                        next_pos += 1
+                else:
+                    positions = [pos for pos, (fn, _) in enumerate(slots) if fn in finished]
+
+                for pos in positions:
+                    fn, nth = slots[pos]
+                    status = ready[fn][nth]
+                    if status == crop_render.MISSING:
+                        continue
+                    if status == crop_render.REUSED:
+                        reused += 1
+                        storage.touch(Path(items[pos][1]["path"]))
+                    sent += 1
+                    yield _sse("preview", payload(pos, status))
+
+            if cancel.is_set():
+                yield _sse("cancelled", {"sent": sent})
+            else:
+                yield _sse("done", {"count": sent, "reused": reused, "target": target})
+        finally:
+            for fut in pending:
+                fut.cancel()
+            if stream and _crop_streams.get(stream) is cancel:
+                del _crop_streams[stream]
+            storage.schedule_enforce()
 
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
 
-    # Rozmiar docelowy
+
+def _crop_target(req: CropRequest) -> tuple[int, int]:
     if req.preset and req.preset in CROP_PRESETS:
-        target_w = CROP_PRESETS[req.preset]["w"]
-        target_h = CROP_PRESETS[req.preset]["h"]
-    elif req.custom_w and req.custom_h:
-        target_w = req.custom_w
-        target_h = req.custom_h
-    else:
-        target_w, target_h = 1920, 1080
+        return CROP_PRESETS[req.preset]["w"], CROP_PRESETS[req.preset]["h"]
+    if req.custom_w and req.custom_h:
+        return req.custom_w, req.custom_h
+    return 1920, 1080
+
+
+async def _auto_focus(name: str, focus_mode: str) -> dict | None:
+    """Punkty fokusu ``auto`` z focus.json (przeliczane tylko, gdy sesja się zmieniła)."""
+    if focus_mode != "auto":
+        return None
+    return await asyncio.to_thread(focus.session_focus, name)
+
+
+def _crop_outputs(name: str, meta: dict, req: CropRequest, focus_points: dict | None = None,
+                  out_dir: Path | None = None) -> tuple[tuple[int, int], list]:
+    """Zaplanuj pliki podglądu: [(klatka źródłowa, opis wyjścia, wpis odpowiedzi)].
+
+    ``out_dir`` redirects the files (same names) away from ``preview/``,
+    e.g. into an export job's private directory.
+    """
+    target_w, target_h = _crop_target(req)
 
     # Które klatki
     selected = req.frame_indices or meta.get("selected_frames", list(range(meta["frame_count"])))
@@ -567,92 +1083,69 @@ async def crop_preview(name: str, req: CropRequest):
     custom_centers = req.custom_centers if req.custom_centers is not None else meta.get("custom_centers", {})
     frames = meta.get("frames", [])
 
-    preview_dir = data_dir() / "sessions" / name / "preview"
+    preview_dir = out_dir or data_dir() / "sessions" / name / "preview"
     preview_dir.mkdir(exist_ok=True)
 
-    results = []
-    for idx in selected:
-        if idx >= len(frames):
-            continue
+    # Wszystkie prostokąty naraz, z metadanych — obrazy dekodujemy tylko do renderu
+    plan = plan_crops(
+        frames, selected, target_w, target_h,
+        focus_mode=req.focus_mode, zoom_level=req.zoom_level,
+        mouse_padding=req.mouse_padding, custom_centers=custom_centers,
+        size_of=header_size_reader(name), focus=focus_points,
+    )
+
+    branding = _active_branding() if req.watermark else None
+    suffix = "_wm" if branding else ""
+    wm_version = _branding_fingerprint() if branding else None
+
+    items = []
+    for i, (idx, box) in enumerate(plan):
         frame = frames[idx]
-        filepath = data_dir() / "sessions" / name / "frames" / frame["filename"]
-        if not filepath.exists():
+        version = frame_version(name, frame)
+        if version is None:
             continue
-
-        img = Image.open(filepath)
-        iw, ih = img.size
-
-        # Wybierz środek — custom_centers mają priorytet nad wszystkimi trybami
-        custom_center = custom_centers.get(str(idx))
-        if custom_center:
-            cx, cy = custom_center["x"], custom_center["y"]
-        elif req.focus_mode == "mouse":
-            cx = frame.get("mouse_x", iw // 2)
-            cy = frame.get("mouse_y", ih // 2)
-        elif req.focus_mode == "keyboard":
-            cx = frame.get("suggested_center_x", iw // 2)
-            cy = int(ih * 0.75)
-        elif req.focus_mode == "application":
-            cx = frame.get("suggested_center_x", iw // 2)
-            cy = int(ih * 0.25)
-        else:  # screen
-            cx = frame.get("suggested_center_x", iw // 2)
-            cy = frame.get("suggested_center_y", ih // 2)
-
-        # Oblicz region przycinania — zawsze zachowuj target aspect ratio
-        # zoom_level > 1 = mniejszy wycinek (bardziej przybliżony)
-        aspect = target_w / target_h
-        if req.focus_mode == "mouse":
-            # Bazuj na mouse_padding jako % krótszego boku, skaluj przez zoom
-            shortest_edge = min(iw, ih)
-            base_px = (req.mouse_padding / 100.0) * shortest_edge  # konwersja % -> piksele
-            base_zoomed = base_px / req.zoom_level
-            # Dopasuj do aspect ratio targetu
-            if aspect >= 1:  # szerszy niż wysoki
-                crop_h = int(base_zoomed)
-                crop_w = int(crop_h * aspect)
-            else:
-                crop_w = int(base_zoomed)
-                crop_h = int(crop_w / aspect)
-        else:
-            if iw / ih > aspect:
-                crop_h = int(ih / req.zoom_level)
-                crop_w = int(crop_h * aspect)
-            else:
-                crop_w = int(iw / req.zoom_level)
-                crop_h = int(crop_w / aspect)
-
-        # Ogranicz do rozmiarów obrazu (zachowując aspect ratio)
-        if crop_w > iw:
-            crop_w = iw
-            crop_h = int(crop_w / aspect)
-        if crop_h > ih:
-            crop_h = ih
-            crop_w = int(crop_h * aspect)
-        crop_w = max(1, crop_w)
-        crop_h = max(1, crop_h)
-
-        # Wyśrodkuj na wybranym punkcie, nie wychodź poza obraz
-        left = max(0, min(cx - crop_w // 2, iw - crop_w))
-        top = max(0, min(cy - crop_h // 2, ih - crop_h))
-
-        cropped = img.crop((left, top, left + crop_w, top + crop_h))
-        cropped = cropped.resize((target_w, target_h), Image.LANCZOS)
-
-        preview_name = f"crop_{idx:04d}_{target_w}x{target_h}.png"
-        cropped.save(preview_dir / preview_name, "PNG")
-
-        results.append({
-            "index": idx,
+        preview_name = f"crop_{idx:04d}_{target_w}x{target_h}{suffix}.png"
+        key = make_key("crop", version, box, [target_w, target_h], "lanczos", wm_version)
+        spec = crop_render.output_spec(preview_dir / preview_name, box, (target_w, target_h),
+                                       key, branding)
+        items.append((frame["filename"], spec, {
+            **plan.rect(i),
             "filename": preview_name,
-            "crop": {"left": left, "top": top, "w": crop_w, "h": crop_h},
-            "center": {"x": cx, "y": cy},
             "target": {"w": target_w, "h": target_h},
             "focus_mode": req.focus_mode,
             "zoom_level": req.zoom_level,
-        })
+        }))
+    return (target_w, target_h), items
+
+
+async def _render_crop_outputs(name: str, items: list) -> list[str]:
+    """Wyrenderuj zaplanowane wyjścia (każda klatka dekodowana raz); statusy w kolejności ``items``."""
+    pending: dict[str, list[dict]] = {}
+    for filename, spec, _ in items:
+        pending.setdefault(filename, []).append(spec)
+    done = await asyncio.to_thread(crop_render.render_frames, name, pending)
 
-    return {"previews": results, "target": {"w": target_w, "h": target_h}}
+    statuses = []
+    for filename, spec, _ in items:
+        status = done[filename].pop(0)
+        if status == crop_render.REUSED:
+            storage.touch(Path(spec["path"]))
+        statuses.append(status)
+    storage.schedule_enforce()
+    return statuses
+
+
+def _active_branding() -> dict | None:
+    """Branding do wypalenia w eksporcie — None, gdy nie ma logo ani stopki."""
+    try:
+        from xeen.branding import load_branding
+        branding = load_branding()
+    except Exception as e:
+        logger.warning(f"⚠️ Watermark failed: {e}")
+        return None
+    if branding.get("logo") or branding.get("footer_text"):
+        return branding
+    return None
 
 
 @app.post("/api/sessions/{name}/video-preview")
@@ -666,10 +1159,7 @@ async def generate_video_preview(name: str, req: CropRequest):
     logger.info(f"   - **Zoom level**: `{req.zoom_level}x`")
     logger.info(f"   - **Mouse padding**: `{req.mouse_padding}px`")
     
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404, "Session not found")
-    meta = json.loads(meta_file.read_text())
+    meta = _read_meta(name, "Session not found")
 
     # Użyj tylko pierwszej zaznaczonej klatki
     selected = req.frame_indices or meta.get("selected_frames", [0])
@@ -682,9 +1172,9 @@ async def generate_video_preview(name: str, req: CropRequest):
 
     # Pobierz dane klatki
     frame = meta["frames"][first_frame_idx]
-    frame_path = data_dir() / "sessions" / name / "frames" / frame["filename"]
-    
-    if not frame_path.exists():
+    try:
+        img = open_frame_image(name, frame["filename"])
+    except FileNotFoundError:
         raise HTTPException(404, "Frame file not found")
 
     # Twórz miniaturę z 10x mniejszą rozdzielczością
@@ -704,72 +1194,37 @@ async def generate_video_preview(name: str, req: CropRequest):
     preview_filename = f"preview_{first_frame_idx}_{req.preset}_{timestamp}.jpg"
     preview_path = preview_dir / preview_filename
 
-    # Szybkie generowanie miniatury
-    img = Image.open(frame_path)
-    iw, ih = img.size
-
     # req.custom_centers (inline) mają priorytet nad session.json
     custom_centers = req.custom_centers if req.custom_centers is not None else meta.get("custom_centers", {})
 
-    # Wybierz środek — custom_centers mają priorytet nad wszystkimi trybami
-    custom_center = custom_centers.get(str(first_frame_idx))
-    if custom_center:
-        cx, cy = custom_center["x"], custom_center["y"]
-    elif req.focus_mode == "mouse":
-        cx = frame.get("mouse_x", iw // 2)
-        cy = frame.get("mouse_y", ih // 2)
-    elif req.focus_mode == "keyboard":
-        cx = frame.get("suggested_center_x", iw // 2)
-        cy = int(ih * 0.75)
-    elif req.focus_mode == "application":
-        cx = frame.get("suggested_center_x", iw // 2)
-        cy = int(ih * 0.25)
-    else:  # screen
-        cx = frame.get("suggested_center_x", iw // 2)
-        cy = frame.get("suggested_center_y", ih // 2)
-
-    # Oblicz region przycinania — zawsze zachowuj target aspect ratio
-    aspect = small_target_w / small_target_h
+    # Ten sam planer co crop-preview i xeen auto — identyczne kadrowanie
+    plan = plan_crops(
+        meta["frames"], [first_frame_idx], small_target_w, small_target_h,
+        focus_mode=req.focus_mode, zoom_level=req.zoom_level,
+        mouse_padding=req.mouse_padding, custom_centers=custom_centers,
+        size_of=lambda f: img.size, focus=await _auto_focus(name, req.focus_mode),
+    )
+    rect = plan.rect(0)
+    cx, cy = rect["center"]["x"], rect["center"]["y"]
     if req.focus_mode == "mouse":
-        shortest_edge = min(iw, ih)
-        base_px = (req.mouse_padding / 100.0) * shortest_edge  # konwersja % -> piksele
-        base_zoomed = base_px / req.zoom_level
-        if aspect >= 1:
-            crop_h = int(base_zoomed)
-            crop_w = int(crop_h * aspect)
-        else:
-            crop_w = int(base_zoomed)
-            crop_h = int(crop_w / aspect)
-        logger.info(f"   - **Crop base**: `{base_px:.0f}px` ({req.mouse_padding}% of {shortest_edge}px) → zoomed `{base_zoomed:.0f}px`")
-        logger.info(f"   - **Screen size**: `{iw}x{ih}px`")
+        logger.info(f"   - **Crop base**: `{rect['crop']['h']}px` ({req.mouse_padding}% of shorter edge, zoom {req.zoom_level}x)")
+        logger.info(f"   - **Screen size**: `{img.width}x{img.height}px`")
+
+    # Wytnij i zmniejsz szybko (bez LANCZOS dla szybkości). Przy dużym pomniejszeniu
+    # pracuj na zmniejszonej kopii klatki z pamięci — kolejne podglądy bez dekodowania PNG
+    box, small_size = plan.box(0), (small_target_w, small_target_h)
+    factor = crop_render.reduction_factor(box, small_size)
+    if factor > 1:
+        version = frame_version(name, frame)
+        source = await asyncio.to_thread(crop_render.working_copy, name, frame["filename"], version, factor)
+        box = tuple(v / factor for v in box)
     else:
-        if iw / ih > aspect:
-            crop_h = int(ih / req.zoom_level)
-            crop_w = int(crop_h * aspect)
-        else:
-            crop_w = int(iw / req.zoom_level)
-            crop_h = int(crop_w / aspect)
-
-    # Ogranicz do rozmiarów obrazu (zachowując aspect ratio)
-    if crop_w > iw:
-        crop_w = iw
-        crop_h = int(crop_w / aspect)
-    if crop_h > ih:
-        crop_h = ih
-        crop_w = int(crop_h * aspect)
-    crop_w = max(1, crop_w)
-    crop_h = max(1, crop_h)
-
-    # Wyśrodkuj na wybranym punkcie, nie wychodź poza obraz
-    left = max(0, min(cx - crop_w // 2, iw - crop_w))
-    top = max(0, min(cy - crop_h // 2, ih - crop_h))
-
-    # Wytnij i zmniejsz szybko (bez LANCZOS dla szybkości)
-    cropped = img.crop((left, top, left + crop_w, top + crop_h))
-    cropped = cropped.resize((small_target_w, small_target_h), Image.BILINEAR)  # Szybsze niż LANCZOS
+        source = img
+    cropped = crop_render.crop_resize(source, box, small_size, Image.BILINEAR, crop_render.FAST_GAP)
     
     # Zapisz z umiarkowaną jakością dla szybkości
     cropped.save(preview_path, "JPEG", quality=85, optimize=True)
+    storage.schedule_enforce()
     
     # Log performance metrics
     end_time = datetime.now()
@@ -791,7 +1246,7 @@ async def generate_video_preview(name: str, req: CropRequest):
         "focus_mode": req.focus_mode,
         "zoom_level": req.zoom_level,
         "center": {"x": cx, "y": cy},
-        "crop": {"left": left, "top": top, "w": crop_w, "h": crop_h},
+        "crop": rect["crop"],
         "target": {"w": small_target_w, "h": small_target_h},
         "settings": {
             "preset": req.preset,
@@ -804,6 +1259,7 @@ async def generate_video_preview(name: str, req: CropRequest):
 
 @app.get("/api/sessions/{name}/preview/{filename}")
 async def get_preview_image(
+    request: Request,
     name: str,
     filename: str,
     watermark: int = 0,
@@ -820,43 +1276,89 @@ async def get_preview_image(
     filepath = data_dir() / "sessions" / name / "preview" / filename
     if not filepath.exists():
         raise HTTPException(404)
+    storage.touch(filepath)
 
     # Fast path: no processing needed
     if not watermark and quality >= 95:
-        return FileResponse(filepath, media_type="image/jpeg" if filename.endswith(".jpg") else "image/png")
-
-    import io
-    img = Image.open(filepath).convert("RGB")
-
+        source_type = "image/jpeg" if filename.endswith(".jpg") else "image/png"
+        mime, variant = _negotiate_variant(request, name, "preview", filename, source_type)
+        if variant is not None:
+            return _variant_response(request, variant, mime, None, http_cache.REVALIDATE)
+        return http_cache.file_response(request, filepath, source_type, headers=VARY_ACCEPT)
+
+    quality = max(10, min(95, quality))
+    overrides = {}
     if watermark:
-        try:
-            from xeen.branding import load_branding, apply_watermark
-            branding = load_branding()
-            # Override with inline params if provided
-            if wm_pos is not None:
-                branding["logo_position"] = wm_pos
-            if wm_px is not None:
-                branding["logo_position_x"] = wm_px
-            if wm_py is not None:
-                branding["logo_position_y"] = wm_py
-            if wm_text is not None:
-                branding["footer_text"] = wm_text or None
-            if wm_tc is not None:
-                branding["footer_color"] = wm_tc
-            if wm_fs is not None:
-                branding["footer_font_size"] = wm_fs
-            if wm_bg is not None:
-                branding["footer_bg"] = wm_bg
-            img = apply_watermark(img, branding)
-        except Exception:
-            pass
-
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=max(10, min(95, quality)), optimize=True)
-    buf.seek(0)
+        overrides = _normalize_wm_overrides(wm_pos, wm_px, wm_py, wm_text, wm_tc, wm_fs, wm_bg)
+    # Format wyjściowy z Accept (AVIF/WebP), domyślnie JPEG — część klucza cache
+    mime = variants.negotiate(request.headers.get("accept")) or "image/jpeg"
+    key = make_key(
+        "preview", str(filepath), file_signature(filepath), quality,
+        _branding_fingerprint() if watermark else None, overrides, mime,
+    )
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": http_cache.REVALIDATE, **VARY_ACCEPT}
+    if http_cache.is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    def render() -> bytes:
+        img = Image.open(filepath).convert("RGB")
+        if watermark:
+            try:
+                from xeen.branding import load_branding, apply_watermark
+                branding = load_branding()
+                branding.update(overrides)
+                img = apply_watermark(img, branding)
+            except Exception:
+                pass
+        if mime != "image/jpeg":
+            return variants.encode(img.convert("RGB"), mime, quality)
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+
+    data, hit = await asyncio.to_thread(_preview_cache.get_or_render, key, render)
+    headers["X-Cache"] = "HIT" if hit else "MISS"
+    return Response(data, media_type=mime, headers=headers)
+
+
+# Wyrenderowane podglądy (znak wodny / rekompresja), klucz: plik + parametry + jakość + format
+_preview_cache = RenderCache(
+    "preview", config.RENDER_CACHE_MEM_BYTES, config.RENDER_CACHE_DISK_BYTES, suffix=".img")
+
+
+def _normalize_wm_overrides(pos, px, py, text, tc, fs, bg) -> dict:
+    """Parametry inline znaku wodnego w postaci kanonicznej (klucz cache + branding)."""
+    overrides = {}
+    if pos is not None:
+        overrides["logo_position"] = pos.strip().lower()
+    if px is not None:
+        overrides["logo_position_x"] = round(px, 4)
+    if py is not None:
+        overrides["logo_position_y"] = round(py, 4)
+    if text is not None:
+        overrides["footer_text"] = text or None
+    if tc is not None:
+        overrides["footer_color"] = tc.strip().lower()
+    if fs is not None:
+        overrides["footer_font_size"] = fs
+    if bg is not None:
+        overrides["footer_bg"] = bg.strip().lower()
+    return overrides
+
+
+def _branding_fingerprint() -> list:
+    """Wersja konfiguracji brandingu: branding.json + plik logo (zmiana → nowy klucz)."""
+    from xeen.branding import load_branding
 
-    from fastapi.responses import StreamingResponse
-    return StreamingResponse(buf, media_type="image/jpeg")
+    parts = []
+    cfg = data_dir() / "branding.json"
+    if cfg.exists():
+        parts.append(file_signature(cfg))
+    logo = load_branding().get("logo")
+    if logo and Path(logo).exists():
+        parts.append([logo, file_signature(Path(logo))])
+    return parts
 
 
 # ─── API: Tab 4 - Multi-version generation ───────────────────────────────────
@@ -868,17 +1370,33 @@ class MultiVersionRequest(BaseModel):
 
 @app.post("/api/sessions/{name}/generate-versions")
 async def generate_versions(name: str, req: MultiVersionRequest):
-    """Generuj wiele wersji (presetów) naraz."""
-    results = {}
+    """Generuj wiele wersji (presetów) naraz.
+
+    Wyjścia wszystkich presetów są grupowane po klatce źródłowej — każda klatka
+    jest dekodowana raz, a klatki renderują się równolegle.
+    """
+    meta = _read_meta(name)
+    planned = []
     for preset in req.presets:
-        if preset not in CROP_PRESETS:
+        if preset not in CROP_PRESETS or any(p == preset for p, _, _ in planned):
             continue
         crop_req = CropRequest(preset=preset, frame_indices=req.frame_indices)
-        preview = await crop_preview(name, crop_req)
+        target, items = _crop_outputs(name, meta, crop_req)
+        planned.append((preset, target, items))
+
+    statuses = await _render_crop_outputs(
+        name, [item for _, _, items in planned for item in items])
+
+    results = {}
+    pos = 0
+    for preset, (target_w, target_h), items in planned:
+        preset_statuses = statuses[pos:pos + len(items)]
+        pos += len(items)
         results[preset] = {
             "label": CROP_PRESETS[preset]["label"],
-            "previews": preview["previews"],
-            "target": preview["target"],
+            "previews": [entry for (_, _, entry), st in zip(items, preset_statuses)
+                         if st != crop_render.MISSING],
+            "target": {"w": target_w, "h": target_h},
         }
     return results
 
@@ -916,22 +1434,19 @@ class CaptionGenerateRequest(BaseModel):
 @app.get("/api/sessions/{name}/captions")
 async def get_captions(name: str):
     """Pobierz napisy sesji."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
+    meta = _read_meta(name)
     return {"captions": meta.get("captions", [])}
 
 
 @app.post("/api/sessions/{name}/captions")
 async def save_captions(name: str, payload: CaptionsPayload):
     """Zapisz napisy sesji."""
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
-    meta["captions"] = [c.dict() for c in payload.captions]
-    meta_file.write_text(json.dumps(meta, indent=2))
+    captions = [c.dict() for c in payload.captions]
+
+    def _set_captions(meta: dict):
+        meta["captions"] = captions
+
+    await _update_meta(name, _set_captions)
     logger.info(f"💬 **Captions saved**: `{len(payload.captions)}` for session `{name}`")
     return {"ok": True, "count": len(payload.captions)}
 
@@ -942,10 +1457,7 @@ async def generate_captions(name: str, req: CaptionGenerateRequest, x_llm_api_ke
     import os
     import base64
 
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
-    meta = json.loads(meta_file.read_text())
+    meta = _read_meta(name)
     frames = meta.get("frames", [])
     selected = req.frame_indices or list(range(len(frames)))
 
@@ -984,13 +1496,13 @@ async def generate_captions(name: str, req: CaptionGenerateRequest, x_llm_api_ke
         if not frame:
             continue
 
-        frame_path = data_dir() / "sessions" / name / "frames" / frame["filename"]
-        if not frame_path.exists():
+        try:
+            frame_bytes = read_frame_bytes(name, frame["filename"])
+        except FileNotFoundError:
             continue
 
         # Encode image as base64
-        with open(frame_path, "rb") as f:
-            img_b64 = base64.b64encode(f.read()).decode()
+        img_b64 = base64.b64encode(frame_bytes).decode()
 
         try:
             response = await litellm.acompletion(
@@ -1045,11 +1557,174 @@ class ExportRequest(BaseModel):
     transition: float = 0.3
     fps: int = 2
     quality: int = 70
-    focus_mode: str = "screen"  # "screen" | "mouse" | "keyboard" | "application"
+    focus_mode: str = "screen"  # "screen" | "mouse" | "keyboard" | "application" | "auto"
     zoom_level: float = 1.0  # 1.0 - 10.0
     mouse_padding: int = 100  # piksele wokół myszy
     watermark: bool = False
     transitions: dict | None = None  # {frame_index_str: {type, duration}} per-frame transitions
+    camera: bool = False  # wirtualna kamera: płynny przejazd między kadrami (video/webm)
+    camera_fps: int = 25
+    camera_easing: str = "ease_in_out"  # "linear" | "ease_in_out" | "ease_out"
+    camera_pan: float | None = None  # czas przejazdu [s]; None = 40% duration_per_frame
+
+
+def _video_codec_args(fmt: str, quality: int) -> list[str]:
+    """Argumenty kodeka ffmpeg dla ``video`` (H.264) i ``webm`` (VP9)."""
+    if fmt == "webm":
+        crf = max(10, min(50, 60 - quality // 2))
+        return ['-c:v', 'libvpx-vp9', '-crf', str(crf), '-b:v', '0']
+    crf = max(18, min(40, 50 - quality // 3))
+    return ['-c:v', 'libx264', '-crf', str(crf), '-pix_fmt', 'yuv420p', '-movflags', '+faststart']
+
+
+# Przejścia potrzebują płynności — strumień z przejściami ma co najmniej tyle fps
+TRANSITION_FPS = 25
+
+
+def _export_crop_request(req: ExportRequest) -> "CropRequest":
+    return CropRequest(
+        preset=req.preset,
+        frame_indices=req.frame_indices,
+        focus_mode=req.focus_mode,
+        zoom_level=req.zoom_level,
+        mouse_padding=req.mouse_padding,
+        watermark=req.watermark,
+    )
+
+
+def _render_still(name: str, filename: str, spec: dict) -> "Image.Image":
+    """Kadr eksportu w pamięci: z pliku podglądu o zgodnym kluczu, inaczej z klatki źródłowej."""
+    path = Path(spec["path"])
+    if png_render_key(path) == spec["key"]:
+        with Image.open(path) as img:
+            return img.convert("RGB")
+    with open_frame_image(name, filename) as img:
+        frame = crop_render.crop_resize(img.convert("RGB"), spec["box"], spec["size"])
+    if spec.get("branding"):
+        from xeen.branding import apply_watermark
+        try:
+            frame = apply_watermark(frame, spec["branding"]).convert("RGB")
+        except Exception as e:
+            logger.warning(f"⚠️ Watermark failed: {e}")
+    return frame
+
+
+def _still_frames(name: str, items: list, tr_map: dict, duration: float, fps: int):
+    """Strumień klatek eksportu: każdy kadr trzymany ``duration`` s, przejścia syntetyzowane w locie.
+
+    Timing matches the xfade export: a transition into the next shot takes
+    its frames out of the previous shot's hold. Each shot is rendered once
+    and its hold repeats the same image.
+    """
+    hold = max(1, round(duration * fps))
+    prev = None
+    for filename, spec, entry in items:
+        try:
+            frame = _render_still(name, filename, spec)
+        except FileNotFoundError:
+            continue
+        if prev is not None:
+            tr_cfg = tr_map.get(str(entry["index"])) or {}
+            tr_type = tr_cfg.get("type", "none")
+            between = []
+            if tr_type != "none":
+                between = _make_transition_frames(prev, frame, tr_type,
+                                                  float(tr_cfg.get("duration", 0.3)), fps)
+            for _ in range(max(1, hold - len(between))):
+                yield prev
+            yield from between
+        prev = frame
+    if prev is not None:
+        for _ in range(hold):
+            yield prev
+
+
+def _checked(frames, job: jobs.Job):
+    """Przepuść strumień klatek, sprawdzając anulowanie zadania przed każdą klatką."""
+    for frame in frames:
+        job.check()
+        yield frame
+
+
+async def _encode_stream(stream, output_path: Path, size: tuple[int, int], fps: int,
+                         req: ExportRequest, job: jobs.Job, total_frames: int) -> int:
+    """Zakoduj strumień klatek w zadaniu: postęp z ``-progress``, ffmpeg zabijany przy anulowaniu."""
+    job.set_stage("encode")
+    try:
+        return await asyncio.to_thread(
+            ffmpeg_pipe.encode_frames, _checked(stream, job), output_path, size, fps,
+            _video_codec_args(req.format, req.quality),
+            on_progress=job.ffmpeg_progress(total_frames=total_frames), on_process=job.attach,
+        )
+    except (RuntimeError, jobs.JobCancelled):
+        output_path.unlink(missing_ok=True)
+        job.check()  # ffmpeg zabity przez anulowanie → JobCancelled, nie fallback
+        raise
+
+
+async def _pipe_export(name: str, req: ExportRequest, output_path: Path,
+                       job: jobs.Job) -> int | None:
+    """Eksport kadrów MP4/WebM przez surowy potok do ffmpeg (bez plików PNG pomiędzy).
+
+    Returns the number of encoded frames, or None when ffmpeg failed (the
+    caller falls back to the PNG + xfade export).
+    """
+    meta = _read_meta(name)
+    crop_req = _export_crop_request(req)
+    size, items = _crop_outputs(name, meta, crop_req, await _auto_focus(name, req.focus_mode))
+    tr_map = req.transitions or {}
+    has_transitions = any((cfg or {}).get("type", "none") != "none" for cfg in tr_map.values())
+    fps = max(1, req.fps)
+    if has_transitions:
+        fps = max(fps, TRANSITION_FPS)
+    stream = _still_frames(name, items, tr_map, req.duration_per_frame, fps)
+    total = len(items) * max(1, round(req.duration_per_frame * fps))
+    try:
+        return await _encode_stream(stream, output_path, size, fps, req, job, total)
+    except RuntimeError as e:
+        logger.warning(f"⚠️ Raw pipe export failed, falling back to PNG frames: {e}")
+        return None
+
+
+async def _camera_export(name: str, req: ExportRequest, size: tuple[int, int],
+                         output_path: Path, job: jobs.Job) -> int | None:
+    """Eksport wirtualną kamerą: klatki renderowane w pamięci prosto do stdin ffmpeg.
+
+    Returns the number of encoded frames, or None when ffmpeg failed (the
+    caller falls back to the still-frame export).
+    """
+    meta = _read_meta(name, fields=(EVENTS,))
+    frames = meta.get("frames", [])
+    selected = req.frame_indices or meta.get("selected_frames", list(range(meta["frame_count"])))
+    custom_centers = meta.get("custom_centers", {})
+    # Środek z kliknięć / ruchu myszy, chyba że klatka ma własny środek
+    # (w trybie auto zdarzenia wejścia są już zważone przez analizę fokusu)
+    pointer = camera.pointer_centers(frames, selected) if req.focus_mode != "auto" else {}
+    centers = {**pointer, **custom_centers}
+    plan = plan_crops(
+        frames, selected, *size,
+        focus_mode=req.focus_mode, zoom_level=req.zoom_level,
+        mouse_padding=req.mouse_padding, custom_centers=centers,
+        size_of=header_size_reader(name), focus=await _auto_focus(name, req.focus_mode),
+    )
+    shots = camera.available_shots(name, camera.shots_from_plan(plan, frames, custom_centers))
+
+    branding = _active_branding() if req.watermark else None
+
+    def watermark(img: Image.Image) -> Image.Image:
+        from xeen.branding import apply_watermark
+        return apply_watermark(img, branding).convert("RGB")
+
+    fps = max(1, req.camera_fps)
+    pan = req.camera_pan if req.camera_pan is not None else 0.4 * req.duration_per_frame
+    stream = camera.render_camera(name, shots, size, fps, req.duration_per_frame, pan,
+                                  req.camera_easing, watermark if branding else None)
+    total = camera.path_length(shots, fps, req.duration_per_frame)
+    try:
+        return await _encode_stream(stream, output_path, size, fps, req, job, total)
+    except RuntimeError as e:
+        logger.warning(f"⚠️ Camera export failed, falling back to still frames: {e}")
+        return None
 
 
 def _make_transition_frames(img_a: "Image.Image", img_b: "Image.Image",
@@ -1102,9 +1777,10 @@ def _make_transition_frames(img_a: "Image.Image", img_b: "Image.Image",
 
 
 def _ffmpeg_xfade_export(previews, tr_map, preview_dir, output_path,
-                         duration_per_frame, fps, tw, th, codec, extra_args=None):
+                         duration_per_frame, fps, tw, th, codec, extra_args=None, job=None):
     """Build and run an ffmpeg command using xfade filter for transitions.
-    Falls back to simple concat when no transitions are configured or xfade fails."""
+    Falls back to simple concat when no transitions are configured or xfade fails.
+    With ``job``, ffmpeg's progress is reported to it and cancelling the job kills ffmpeg."""
     import tempfile
 
     # Map xfade transition names (ffmpeg) from our internal names
@@ -1127,6 +1803,10 @@ def _ffmpeg_xfade_export(previews, tr_map, preview_dir, output_path,
         tr_configs.append((tr_type, tr_dur))
 
     has_any = any(t != "none" for t, _ in tr_configs)
+    hooks = {}
+    if job is not None:
+        total = len(previews) * duration_per_frame - sum(d for _, d in tr_configs)
+        hooks = {"on_progress": job.ffmpeg_progress(total_seconds=total), "on_process": job.attach}
 
     if not has_any:
         # Simple concat path (no transitions)
@@ -1141,11 +1821,12 @@ def _ffmpeg_xfade_export(previews, tr_map, preview_dir, output_path,
             list_file = f.name
         try:
             cmd = [
-                'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_file,
+                ffmpeg_pipe.FFMPEG, '-y', *ffmpeg_pipe.PROGRESS_ARGS,
+                '-f', 'concat', '-safe', '0', '-i', list_file,
                 '-vf', f'scale={tw}:{th}:force_original_aspect_ratio=decrease,pad={tw}:{th}:(ow-iw)/2:(oh-ih)/2',
                 '-c:v', codec, '-r', str(fps),
             ] + (extra_args or []) + [str(output_path)]
-            subprocess.run(cmd, capture_output=True, check=True)
+            ffmpeg_pipe.run(cmd, **hooks)
         finally:
             Path(list_file).unlink(missing_ok=True)
         return
@@ -1155,7 +1836,7 @@ def _ffmpeg_xfade_export(previews, tr_map, preview_dir, output_path,
     # transition overlap from the NEXT clip. We give each input exactly
     # duration_per_frame seconds; xfade will consume the overlap from both sides.
     n = len(previews)
-    cmd = ['ffmpeg', '-y']
+    cmd = [ffmpeg_pipe.FFMPEG, '-y', *ffmpeg_pipe.PROGRESS_ARGS]
     for p in previews:
         fpath = preview_dir / p["filename"]
         # -framerate sets the input frame rate for the still image loop
@@ -1208,83 +1889,131 @@ def _ffmpeg_xfade_export(previews, tr_map, preview_dir, output_path,
     cmd += (extra_args or [])
     cmd += [str(output_path)]
 
-    try:
-        result = subprocess.run(cmd, capture_output=True)
-        if result.returncode != 0:
-            raise RuntimeError(
-                f"ffmpeg xfade failed (rc={result.returncode}): "
-                f"{result.stderr.decode(errors='replace')[-600:]}"
-            )
-    except FileNotFoundError:
-        raise RuntimeError("ffmpeg not found")
+    ffmpeg_pipe.run(cmd, **hooks)
 
 
 @app.post("/api/sessions/{name}/export")
 @log_request
-@log_process_step("export_generation")
-async def export_session(name: str, req: ExportRequest):
-    """Eksportuj jako wideo, GIF, WebM lub ZIP."""
-    start_time = datetime.now()
-    logger.info(f"📦 **Starting export** for session `{name}`")
-    logger.info(f"   - **Format**: `{req.format.upper()}`")
-    logger.info(f"   - **Preset**: `{req.preset}`")
-    logger.info(f"   - **Frames**: `{len(req.frame_indices) if req.frame_indices else 'all'}`")
-    logger.info(f"   - **Duration/frame**: `{req.duration_per_frame}s`")
-    logger.info(f"   - **FPS**: `{req.fps}`")
-    logger.info(f"   - **Quality**: `{req.quality}%`")
-    logger.info(f"   - **Focus mode**: `{req.focus_mode}`")
-    logger.info(f"   - **Zoom level**: `{req.zoom_level}x`")
+async def export_session(name: str, req: ExportRequest, wait: bool = False):
+    """Zleć eksport (wideo, GIF, WebM, ZIP) jako zadanie w tle.
+
+    Returns ``202`` with the job id at once; progress, result and
+    cancellation go through ``/api/jobs/{id}``. ``?wait=true`` keeps the
+    old synchronous contract: the response is the finished export.
+
+    Requests are deduplicated by ``_export_fingerprint``: an identical
+    export still in progress is attached to (its job id is returned), and
+    an identical finished one whose file still exists is returned at once
+    (``200`` with ``result``) — ``reused`` tells the two apart from a new job.
+    """
+    key = await asyncio.to_thread(_export_fingerprint, name, req)
+    job, reused = jobs.job_queue().submit("export", name, req.dict(), key=key,
+                                          reuse=_export_available)
+    if reused:
+        logger.info(f"♻️ **Export reused** for session `{name}`: job `{job.id}` ({job.status})")
+    else:
+        logger.info(f"📥 **Export queued** for session `{name}` as job `{job.id}`")
+    status = {"job_id": job.id, "status": job.status, "status_url": f"/api/jobs/{job.id}",
+              "reused": reused}
+    if not wait:
+        if job.status == jobs.DONE:
+            return {**status, "result": job.result}  # gotowy wynik — bez kolejki
+        return JSONResponse(status_code=202, content=status)
+    job = await asyncio.to_thread(jobs.job_queue().wait, job)  # także zadanie innego workera
+    if job.status == jobs.CANCELLED:
+        raise HTTPException(409, "Export cancelled")
+    if job.status != jobs.DONE:
+        raise HTTPException(500, f"Export failed: {job.error}")
+    return {**job.result, "job_id": job.id, "reused": reused}
+
+
+def _export_fingerprint(name: str, req: ExportRequest) -> str:
+    """Odcisk eksportu: parametry + wszystko z sesji, od czego zależy plik wynikowy.
+
+    Covers the selected frames (content hash or file version, plus their
+    metadata — suggested centers and input events drive focus and camera),
+    manual centers, captions, the preset size and, when watermarking, the
+    branding config. Any change gives a new key, i.e. a fresh export.
+    """
+    meta = _read_meta(name, fields=(EVENTS,))
+    frames = meta.get("frames", [])
+    selected = req.frame_indices or meta.get("selected_frames", list(range(meta["frame_count"])))
+    sources = []
+    for idx in selected:
+        if not 0 <= idx < len(frames):
+            continue
+        frame = frames[idx]
+        sources.append([idx, frame_version(name, frame), frame])
+    branding = _branding_fingerprint() if req.watermark and _active_branding() else None
+    return make_key(
+        "export", req.dict(), CROP_PRESETS.get(req.preset), sources,
+        meta.get("custom_centers", {}), meta.get("captions", []), branding,
+    )
 
-    meta_file = data_dir() / "sessions" / name / "session.json"
-    if not meta_file.exists():
-        raise HTTPException(404)
 
-    # Najpierw generuj przycięte klatki z focus mode i zoom
-    crop_req = CropRequest(
-        preset=req.preset, 
-        frame_indices=req.frame_indices,
-        focus_mode=req.focus_mode,
-        zoom_level=req.zoom_level,
-        mouse_padding=req.mouse_padding
-    )
-    crop_result = await crop_preview(name, crop_req)
+def _export_available(job: jobs.Job) -> bool:
+    """Wynik zakończonego eksportu nadaje się do ponownego użycia, jeśli plik wciąż istnieje."""
+    filename = (job.result or {}).get("filename")
+    return bool(filename) and (data_dir() / "exports" / filename).is_file()
 
-    preview_dir = data_dir() / "sessions" / name / "preview"
-    export_dir = data_dir() / "exports"
-    export_dir.mkdir(exist_ok=True)
 
-    preset_info = CROP_PRESETS.get(req.preset, {"w": 1920, "h": 1080})
-    tw, th = preset_info["w"], preset_info["h"]
+async def _export_crops(name: str, req: ExportRequest, work_dir: Path) -> dict:
+    """Kadry eksportu w prywatnym katalogu zadania; wynik jak z ``crop_preview``.
 
-    # Apply watermark to preview frames in-place if requested
-    if req.watermark:
+    Editor previews (SSE) and concurrent exports rewrite ``preview/`` files
+    of the same name with other settings, so the export never reads them
+    after an await. Matching previews are hard-linked in first — the render
+    cache still skips them, and re-rendering replaces only the link.
+    """
+    crop_req = _export_crop_request(req)
+    meta = _read_meta(name)
+    (target_w, target_h), items = _crop_outputs(
+        name, meta, crop_req, await _auto_focus(name, crop_req.focus_mode), out_dir=work_dir)
+    preview_dir = data_dir() / "sessions" / name / "preview"
+    for _, spec, entry in items:
         try:
-            from xeen.branding import load_branding, apply_watermark
-            branding = load_branding()
-            if branding.get("logo") or branding.get("footer_text"):
-                for p in crop_result["previews"]:
-                    fpath = preview_dir / p["filename"]
-                    if fpath.exists():
-                        wm_img = apply_watermark(Image.open(fpath), branding)
-                        wm_img.save(fpath, "PNG")
-                logger.info(f"🌊 **Watermark applied** to `{len(crop_result['previews'])}` frames")
-        except Exception as e:
-            logger.warning(f"⚠️ Watermark failed: {e}")
+            os.link(preview_dir / entry["filename"], spec["path"])
+        except OSError:
+            pass  # brak podglądu albo inny system plików — wyrenderuje się od zera
+    statuses = await _render_crop_outputs(name, items)
+    results = [entry for (_, _, entry), st in zip(items, statuses) if st != crop_render.MISSING]
+    return {"previews": results, "target": {"w": target_w, "h": target_h},
+            "reused": statuses.count(crop_render.REUSED)}
+
+
+async def _file_export(name: str, req: ExportRequest, stem: str, size: tuple[int, int],
+                       job: jobs.Job) -> Path:
+    """Eksport z plików: przycięte klatki z wypalonym znakiem wodnym (cache renderu) → GIF/ZIP/wideo."""
+    export_dir = data_dir() / "exports"
+    work_dir = Path(tempfile.mkdtemp(dir=export_dir, prefix=f".{job.id}."))
+    try:
+        return await _encode_crops(name, req, stem, size, job, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    # Helper: resolve per-frame transition config
+async def _encode_crops(name: str, req: ExportRequest, stem: str, size: tuple[int, int],
+                        job: jobs.Job, preview_dir: Path) -> Path:
+    """Wyrenderuj kadry do ``preview_dir`` (katalog zadania) i złóż z nich plik eksportu."""
+    export_dir = data_dir() / "exports"
+    tw, th = size
     tr_map = req.transitions or {}  # {"frame_idx_str": {"type": ..., "duration": ...}}
 
+    job.set_stage("render")
+    crop_result = await _export_crops(name, req, preview_dir)
+    job.set_stage("encode")
+    logger.info(f"   - **Crop cache**: `{crop_result['reused']}/{len(crop_result['previews'])}` reused")
+
     if req.format == "gif":
         # Generuj GIF z przejściami (PIL)
-        output_name = f"{name}_{req.preset}_{timestamp}.gif"
+        output_name = f"{stem}.gif"
         output_path = export_dir / output_name
         previews = crop_result["previews"]
         raw_images = [Image.open(preview_dir / p["filename"]).convert("RGB") for p in previews]
 
         gif_frames = []
         gif_durations = []
+        job.check()
         frame_ms = int(req.duration_per_frame * 1000)
 
         for i, img in enumerate(raw_images):
@@ -1316,7 +2045,7 @@ async def export_session(name: str, req: ExportRequest):
 
     elif req.format == "webm":
         # Generuj WebM z przejściami (ffmpeg xfade)
-        output_name = f"{name}_{req.preset}_{timestamp}.webm"
+        output_name = f"{stem}.webm"
         output_path = export_dir / output_name
         previews = crop_result["previews"]
         crf = max(10, min(50, 60 - req.quality // 2))
@@ -1324,9 +2053,11 @@ async def export_session(name: str, req: ExportRequest):
             _ffmpeg_xfade_export(
                 previews, tr_map, preview_dir, output_path,
                 req.duration_per_frame, req.fps, tw, th,
-                codec='libvpx-vp9', extra_args=['-crf', str(crf), '-b:v', '0']
+                codec='libvpx-vp9', extra_args=['-crf', str(crf), '-b:v', '0'], job=job,
             )
         except Exception:
+            output_path.unlink(missing_ok=True)
+            job.check()
             # Fallback: GIF
             output_name = output_name.replace('.webm', '.gif')
             output_path = export_dir / output_name
@@ -1338,7 +2069,7 @@ async def export_session(name: str, req: ExportRequest):
                 )
 
     elif req.format == "zip":
-        output_name = f"{name}_{req.preset}_{timestamp}.zip"
+        output_name = f"{stem}.zip"
         output_path = export_dir / output_name
         import zipfile
         with zipfile.ZipFile(output_path, 'w') as zf:
@@ -1347,7 +2078,7 @@ async def export_session(name: str, req: ExportRequest):
                 zf.write(fpath, p["filename"])
 
     else:  # video (mp4)
-        output_name = f"{name}_{req.preset}_{timestamp}.mp4"
+        output_name = f"{stem}.mp4"
         output_path = export_dir / output_name
         previews = crop_result["previews"]
         crf = max(18, min(40, 50 - req.quality // 3))
@@ -1356,9 +2087,12 @@ async def export_session(name: str, req: ExportRequest):
                 previews, tr_map, preview_dir, output_path,
                 req.duration_per_frame, req.fps, tw, th,
                 codec='libx264',
-                extra_args=['-crf', str(crf), '-pix_fmt', 'yuv420p', '-movflags', '+faststart']
+                extra_args=['-crf', str(crf), '-pix_fmt', 'yuv420p', '-movflags', '+faststart'],
+                job=job,
             )
         except Exception:
+            output_path.unlink(missing_ok=True)
+            job.check()
             # Fallback: GIF
             output_name = output_name.replace('.mp4', '.gif')
             output_path = export_dir / output_name
@@ -1369,6 +2103,61 @@ async def export_session(name: str, req: ExportRequest):
                     duration=int(req.duration_per_frame * 1000), loop=0,
                 )
 
+    return output_path
+
+
+def _export_job(job: jobs.Job) -> dict:
+    """Runner zadania ``export`` — działa w wątku workera kolejki, z własną pętlą zdarzeń."""
+    return asyncio.run(_run_export(job.session, ExportRequest(**job.params), job))
+
+
+@log_process_step("export_generation")
+async def _run_export(name: str, req: ExportRequest, job: jobs.Job) -> dict:
+    """Wykonaj eksport, raportując etapy zadaniu; zwraca opis gotowego pliku."""
+    start_time = datetime.now()
+    logger.info(f"📦 **Starting export** for session `{name}` (job `{job.id}`)")
+    logger.info(f"   - **Format**: `{req.format.upper()}`")
+    logger.info(f"   - **Preset**: `{req.preset}`")
+    logger.info(f"   - **Frames**: `{len(req.frame_indices) if req.frame_indices else 'all'}`")
+    logger.info(f"   - **Duration/frame**: `{req.duration_per_frame}s`")
+    logger.info(f"   - **FPS**: `{req.fps}`")
+    logger.info(f"   - **Quality**: `{req.quality}%`")
+    logger.info(f"   - **Focus mode**: `{req.focus_mode}`")
+    logger.info(f"   - **Zoom level**: `{req.zoom_level}x`")
+
+    job.set_stage("prepare")
+    _read_meta(name)
+
+    export_dir = data_dir() / "exports"
+    export_dir.mkdir(exist_ok=True)
+
+    preset_info = CROP_PRESETS.get(req.preset, {"w": 1920, "h": 1080})
+    tw, th = preset_info["w"], preset_info["h"]
+
+    # Id zadania w nazwie — równoległe eksporty tej samej sesji nie nadpisują się
+    stem = f"{name}_{req.preset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.id}"
+
+    # MP4/WebM: klatki renderowane w procesie i przesyłane surowo na stdin ffmpeg
+    # (kamera albo kadry z przejściami) — bez plików PNG pomiędzy
+    streamed = None
+    if req.format in ("video", "webm"):
+        ext = "webm" if req.format == "webm" else "mp4"
+        suffix = "_camera" if req.camera else ""
+        output_name = f"{stem}{suffix}.{ext}"
+        output_path = export_dir / output_name
+        if req.camera:
+            streamed = await _camera_export(name, req, (tw, th), output_path, job)
+        else:
+            streamed = await _pipe_export(name, req, output_path, job)
+        if streamed is not None:
+            logger.info(f"   - **Streamed**: `{streamed}` raw frames → ffmpeg")
+
+    if streamed is None:
+        # Ścieżka plikowa (GIF/ZIP, albo gdy ffmpeg z potoku zawiódł)
+        output_path = await _file_export(name, req, stem, (tw, th), job)
+        output_name = output_path.name
+
+    job.set_stage("finalize")
     # Log export completion
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
@@ -1389,12 +2178,62 @@ async def export_session(name: str, req: ExportRequest):
     }
 
 
+# ─── API: Jobs ───────────────────────────────────────────────────────────────
+
+jobs.job_queue().register("export", _export_job)
+
+
+def _get_job(job_id: str) -> jobs.Job:
+    job = jobs.job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@app.get("/api/jobs")
+async def list_jobs(session: str | None = None):
+    """Zadania w tle (najnowsze najpierw), opcjonalnie jednej sesji."""
+    return {"jobs": [job.to_dict() for job in jobs.job_queue().list(session)]}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status zadania: etap, postęp (0–1), wynik albo błąd."""
+    return _get_job(job_id).to_dict()
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Anuluj zadanie — czekające nie wystartuje, trwające zabija swój proces ffmpeg."""
+    _get_job(job_id)
+    return jobs.job_queue().cancel(job_id).to_dict()
+
+
 @app.get("/api/exports/{filename}")
-async def download_export(filename: str):
+async def download_export(request: Request, filename: str):
+    """Pobierz eksport (ETag/304 i Range — wznawianie pobierania, przewijanie wideo)."""
     filepath = data_dir() / "exports" / filename
     if not filepath.exists():
         raise HTTPException(404)
-    return FileResponse(filepath, filename=filename)
+    storage.touch(filepath)
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return http_cache.file_response(request, filepath, media_type, ranges=True,
+                                    filename=filename, cache_control=http_cache.SHORT)
+
+
+# ─── API: Storage (budżet plików pochodnych) ─────────────────────────────────
+
+@app.get("/api/storage")
+async def get_storage_stats():
+    """Statystyki dysku: pliki pochodne (podglądy, miniatury, eksporty) i źródła."""
+    return await asyncio.to_thread(storage.storage_stats)
+
+
+@app.post("/api/storage/enforce")
+async def enforce_storage(budget_mb: int | None = None, dry_run: bool = False):
+    """Usuń najdawniej używane pliki pochodne ponad budżet (klatki źródłowe nigdy)."""
+    budget = budget_mb * 1024 * 1024 if budget_mb is not None else None
+    return await asyncio.to_thread(storage.enforce_budget, budget, dry_run)
 
 
 @app.get("/api/social-links")
@@ -1413,8 +2252,6 @@ class BrowserCaptureFrame(BaseModel):
 @app.post("/api/capture/frame")
 async def capture_frame_from_browser(frame: BrowserCaptureFrame):
     """Receive a single frame from browser Screen Capture API."""
-    import base64
-
     session_dir = data_dir() / "sessions" / frame.session_name
     session_dir.mkdir(parents=True, exist_ok=True)
     (session_dir / "frames").mkdir(exist_ok=True)
@@ -1422,16 +2259,18 @@ async def capture_frame_from_browser(frame: BrowserCaptureFrame):
     # Decode base64 image
     img_data = frame.image_data.split(",", 1)[-1]  # strip data:image/png;base64,
     img_bytes = base64.b64decode(img_data)
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    png, width, height = normalize_png(img_bytes, mode="RGB")
 
     filename = f"frame_{frame.frame_index:04d}.png"
-    img.save(session_dir / "frames" / filename, "PNG")
+    sha = store_frame(session_dir / "frames", filename, png)
+    thumbs.request_thumb(frame.session_name, filename)
 
     return {
         "ok": True,
         "filename": filename,
-        "width": img.width,
-        "height": img.height,
+        "width": width,
+        "height": height,
+        "sha256": sha,
     }
 
 
@@ -1465,6 +2304,7 @@ async def finalize_browser_capture(req: BrowserCaptureFinalize):
                 "suggested_center_x": img.width // 2,
                 "suggested_center_y": img.height // 2,
                 "input_events": [],
+                "sha256": sha256_file(fpath),
             })
 
     meta = {
@@ -1476,7 +2316,8 @@ async def finalize_browser_capture(req: BrowserCaptureFinalize):
         "frames": frames,
         "input_log": [],
     }
-    (session_dir / "session.json").write_text(json.dumps(meta, indent=2))
+    save_session_meta(req.session_name, meta)
+    focus.request_focus(req.session_name)
     return {"name": req.session_name, "frame_count": len(frames)}
 
 
@@ -0,0 +1,433 @@
+"""Session metadata access with a process-wide, mtime-validated cache.
+
+Every reader of session metadata (server endpoints, auto pipeline, CLI) goes
+through :func:`load_session_meta`. Parsed documents are kept in an LRU cache
+bounded by a byte budget and revalidated against the file's mtime, size and
+inode on each lookup, so writes from other processes are picked up.
+
+Storage layout (``"layout": 2``)::
+
+    session.json   core: name, created_at, duration, settings, captions, ...
+    frames.json    per-frame metadata without heavy fields
+    ocr.json       {filename: ocr_text}
+    events.json    {"frames": {filename: input_events}, "input_log": [...]}
+
+Sidecars are parsed only when a caller asks for them via ``fields``. Legacy
+single-file sessions (everything inside session.json) load transparently and
+are converted on their next write or by ``xeen migrate``.
+
+Writes are atomic (temp file + ``os.replace``) and read-modify-write cycles
+go through :func:`update_session_meta` / :func:`aupdate_session_meta`, which
+serialize updates per session with in-process locks and an ``flock`` on
+``.session.lock`` so several uvicorn workers can share one data directory.
+"""
+
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Callable, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows — tylko blokady wewnątrz procesu
+    fcntl = None
+
+from xeen.config import get_data_dir, META_CACHE_BYTES, COMPACT_JSON
+
+META_FILENAME = "session.json"
+FRAMES_FILENAME = "frames.json"
+OCR_FILENAME = "ocr.json"
+EVENTS_FILENAME = "events.json"
+LOCK_FILENAME = ".session.lock"
+
+LAYOUT_VERSION = 2
+
+# Grupy pól dla projekcji (parametr ``fields``); rdzeń sesji jest zawsze ładowany
+FRAMES = "frames"
+OCR = "ocr_text"
+EVENTS = "input_events"
+INPUT_LOG = "input_log"
+ALL_FIELDS = (FRAMES, OCR, EVENTS, INPUT_LOG)
+DEFAULT_FIELDS = (FRAMES,)
+HEAVY_FRAME_FIELDS = (OCR, EVENTS)
+
+T = TypeVar("T")
+
+
+def _signature(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class MetaCache:
+    """LRU cache of parsed session.json documents, bounded by total file size."""
+
+    def __init__(self, max_bytes: int = META_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[tuple, dict, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: Path) -> dict:
+        """Return parsed JSON for ``path``. Raises FileNotFoundError if missing."""
+        key = str(path)
+        sig = _signature(path.stat())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == sig:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # fstat na otwartym pliku — sygnatura odpowiada dokładnie odczytanej treści
+        with open(path, "rb") as f:
+            sig = _signature(os.fstat(f.fileno()))
+            raw = f.read()
+        meta = json.loads(raw)
+        self._store(key, sig, meta, len(raw))
+        return meta
+
+    def put(self, path: Path, meta: dict) -> None:
+        """Prime the cache with a document that was just written to ``path``."""
+        st = path.stat()
+        self._store(str(path), _signature(st), meta, st.st_size)
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.pop(str(path), None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def invalidate_prefix(self, prefix: Path) -> None:
+        """Drop every entry under a directory (e.g. a deleted session)."""
+        p = str(prefix).rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(p)]:
+                self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _store(self, key: str, sig: tuple, meta: dict, nbytes: int) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (sig, meta, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+
+
+_cache = MetaCache()
+
+
+def get_meta_cache() -> MetaCache:
+    """Zwróć globalny (per-proces) cache metadanych sesji."""
+    return _cache
+
+
+def session_dir(name: str) -> Path:
+    return get_data_dir() / "sessions" / name
+
+
+def meta_path(name: str) -> Path:
+    return session_dir(name) / META_FILENAME
+
+
+def session_exists(name: str) -> bool:
+    return meta_path(name).exists()
+
+
+def is_legacy(core: dict) -> bool:
+    """Czy dokument to stary, jednoplikowy session.json (wszystko w jednym pliku)."""
+    return core.get("layout") != LAYOUT_VERSION
+
+
+def _load_part(path: Path, default):
+    try:
+        return _cache.get(path)
+    except FileNotFoundError:
+        return default
+
+
+def load_session_meta(
+    name: str,
+    fields: tuple[str, ...] | list[str] | set[str] = DEFAULT_FIELDS,
+    mutable: bool = False,
+) -> dict:
+    """Wczytaj metadane sesji przez cache.
+
+    ``fields`` selects which sidecar-backed parts to attach to the core
+    document: ``"frames"``, ``"ocr_text"`` / ``"input_events"`` (merged into
+    each frame, implies frames) and ``"input_log"``. Legacy single-file
+    sessions always return the full document.
+
+    The returned dict shares data with the cache and must be treated as
+    read-only; pass ``mutable=True`` to get a private deep copy for mutation.
+    Raises FileNotFoundError when the session does not exist.
+    """
+    core = _cache.get(meta_path(name))
+    if is_legacy(core):
+        return copy.deepcopy(core) if mutable else core
+
+    fields = set(fields)
+    sdir = session_dir(name)
+    meta = dict(core)
+    if fields & {FRAMES, OCR, EVENTS}:
+        frames = _load_part(sdir / FRAMES_FILENAME, [])
+        ocr = _load_part(sdir / OCR_FILENAME, {}) if OCR in fields else None
+        events = _load_part(sdir / EVENTS_FILENAME, {}) if fields & {EVENTS, INPUT_LOG} else None
+        if ocr is not None or (EVENTS in fields and events is not None):
+            frame_events = (events or {}).get("frames", {}) if EVENTS in fields else None
+            merged = []
+            for f in frames:
+                f = dict(f)
+                if ocr is not None:
+                    f[OCR] = ocr.get(f["filename"], "")
+                if frame_events is not None:
+                    f[EVENTS] = frame_events.get(f["filename"], [])
+                merged.append(f)
+            frames = merged
+        meta["frames"] = frames
+    if INPUT_LOG in fields:
+        events = _load_part(sdir / EVENTS_FILENAME, {})
+        meta[INPUT_LOG] = events.get(INPUT_LOG, [])
+    return copy.deepcopy(meta) if mutable else meta
+
+
+def session_summary(name: str) -> dict:
+    """Skrócony opis sesji do listingu — czyta tylko rdzeń (session.json)."""
+    meta = load_session_meta(name, fields=())
+    settings = meta.get("settings") or {}
+    return {
+        "name": meta.get("name", name),
+        "created_at": meta.get("created_at", ""),
+        "frame_count": int(meta.get("frame_count", 0) or 0),
+        "duration": float(meta.get("duration", 0) or 0),
+        "source": settings.get("source", "capture"),
+        "has_captions": bool(meta.get("captions")),
+    }
+
+
+def iter_session_summaries():
+    """Yield summaries of every session in the data dir (skips broken entries)."""
+    sessions_dir = get_data_dir() / "sessions"
+    with os.scandir(sessions_dir) as it:
+        # Katalogi z kropką to staging (np. trwający import bundla)
+        names = [e.name for e in it if e.is_dir() and not e.name.startswith(".")]
+    for name in names:
+        try:
+            yield session_summary(name)
+        except (FileNotFoundError, NotADirectoryError, ValueError):
+            continue
+
+
+def list_frame_files(name: str) -> set[str]:
+    """Nazwy plików w katalogu frames/ — jeden scandir zamiast exists() per klatka."""
+    try:
+        with os.scandir(session_dir(name) / "frames") as it:
+            return {e.name for e in it}
+    except FileNotFoundError:
+        return set()
+
+
+def split_session_meta(meta: dict) -> tuple[dict, list | None, dict | None, dict | None]:
+    """Rozdziel pełny dokument na (core, frames, ocr, events).
+
+    A sidecar is returned as None when ``meta`` carries no data for it, so that
+    saving a partially loaded document never wipes existing sidecars.
+    """
+    core = {k: v for k, v in meta.items() if k not in (FRAMES, INPUT_LOG)}
+    core["layout"] = LAYOUT_VERSION
+
+    frames = meta.get(FRAMES)
+    light = ocr = frame_events = None
+    if frames is not None:
+        light = [{k: v for k, v in f.items() if k not in HEAVY_FRAME_FIELDS} for f in frames]
+        if any(OCR in f for f in frames):
+            ocr = {f["filename"]: f[OCR] for f in frames if f.get(OCR)}
+        if any(EVENTS in f for f in frames):
+            frame_events = {f["filename"]: f[EVENTS] for f in frames if f.get(EVENTS)}
+
+    events = None
+    if frame_events is not None or INPUT_LOG in meta:
+        events = {"frames": frame_events, INPUT_LOG: meta.get(INPUT_LOG)}
+    return core, light, ocr, events
+
+
+def dumps_meta(meta: dict, compact: bool | None = None) -> str:
+    """Serializuj metadane — z wcięciami lub kompaktowo (XEEN_COMPACT_JSON)."""
+    if compact is None:
+        compact = COMPACT_JSON
+    if compact:
+        return json.dumps(meta, separators=(",", ":"), ensure_ascii=False)
+    return json.dumps(meta, indent=2, ensure_ascii=False)
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write ``data`` to a temp file in the same directory, fsync, then rename over ``path``."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _write_part(path: Path, value, compact: bool | None) -> None:
+    """Atomowo zapisz jedną część metadanych, pomijając zapis bez zmian."""
+    try:
+        if _cache.get(path) == value:
+            return
+    except (FileNotFoundError, ValueError):
+        pass
+    atomic_write_bytes(path, dumps_meta(value, compact).encode("utf-8"))
+    _cache.put(path, value)
+
+
+def save_session_meta(name: str, meta: dict, compact: bool | None = None) -> Path:
+    """Atomowo zapisz metadane sesji (core + sidecary) i odśwież cache.
+
+    Sidecars are written first and session.json last, so a reader never sees
+    a core document that points at sidecars which do not exist yet. Parts that
+    ``meta`` does not carry (e.g. OCR after a light load) are left untouched.
+    """
+    sdir = session_dir(name)
+    core, frames, ocr, events = split_session_meta(meta)
+    if frames is not None:
+        _write_part(sdir / FRAMES_FILENAME, frames, compact)
+    if ocr is not None:
+        _write_part(sdir / OCR_FILENAME, ocr, compact)
+    if events is not None:
+        previous = _load_part(sdir / EVENTS_FILENAME, {})
+        merged = {
+            "frames": events["frames"] if events["frames"] is not None else previous.get("frames", {}),
+            INPUT_LOG: events[INPUT_LOG] if events[INPUT_LOG] is not None else previous.get(INPUT_LOG, []),
+        }
+        _write_part(sdir / EVENTS_FILENAME, merged, compact)
+    path = meta_path(name)
+    _write_part(path, core, compact)
+    return path
+
+
+def migrate_session(name: str, compact: bool | None = None) -> bool:
+    """Przekonwertuj jednoplikową sesję do układu core + sidecary.
+
+    Returns True when the session was migrated, False when it already used
+    the split layout. Raises FileNotFoundError when the session does not exist.
+    """
+    with session_lock(name):
+        core = _cache.get(meta_path(name))
+        if not is_legacy(core):
+            return False
+        save_session_meta(name, copy.deepcopy(core), compact)
+    return True
+
+
+# ─── Locking ─────────────────────────────────────────────────────────────────
+
+_thread_locks: dict[str, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+_async_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Lock]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _thread_lock(name: str) -> threading.RLock:
+    with _thread_locks_guard:
+        lock = _thread_locks.get(name)
+        if lock is None:
+            lock = _thread_locks[name] = threading.RLock()
+        return lock
+
+
+@contextmanager
+def session_lock(name: str):
+    """Exclusive per-session lock: thread lock + cross-process ``flock``.
+
+    Raises FileNotFoundError when the session directory does not exist.
+    """
+    sdir = session_dir(name)
+    if not sdir.is_dir():
+        raise FileNotFoundError(str(sdir))
+    with _thread_lock(name):
+        if fcntl is None:
+            yield
+            return
+        with open(sdir / LOCK_FILENAME, "a+b") as lf:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def async_session_lock(name: str):
+    """Per-session asyncio lock (per event loop) — kolejkuje żądania bez blokowania wątków."""
+    loop = asyncio.get_running_loop()
+    locks = _async_locks.setdefault(loop, {})
+    lock = locks.get(name)
+    if lock is None:
+        lock = locks[name] = asyncio.Lock()
+    async with lock:
+        yield
+
+
+def update_session_meta(name: str, mutate: Callable[[dict], T]) -> T:
+    """Read-modify-write session.json under the session lock.
+
+    ``mutate`` receives a private copy of the metadata and edits it in place;
+    its return value is passed through. Raises FileNotFoundError when the
+    session does not exist.
+    """
+    with session_lock(name):
+        meta = load_session_meta(name, fields=DEFAULT_FIELDS, mutable=True)
+        result = mutate(meta)
+        save_session_meta(name, meta)
+    return result
+
+
+async def aupdate_session_meta(name: str, mutate: Callable[[dict], T]) -> T:
+    """Async wariant :func:`update_session_meta` — I/O i ``flock`` w wątku roboczym."""
+    async with async_session_lock(name):
+        return await asyncio.to_thread(update_session_meta, name, mutate)
+
+
+def forget_session(name: str) -> None:
+    """Usuń z cache wszystkie wpisy sesji (po usunięciu katalogu)."""
+    _cache.invalidate_prefix(session_dir(name))
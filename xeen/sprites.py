@@ -0,0 +1,100 @@
+"""Thumbnail sprite sheets: one WebP atlas for a whole grid of session cards.
+
+The landing page shows a 3×3 grid of frames for each recent session; fetching
+every thumbnail separately costs dozens of requests. A sprite sheet packs the
+first ``per_session`` frames of each requested session into a single image —
+one row per session, square cells center-cropped ("cover") — and a JSON layout
+tells the client where each frame sits.
+
+The layout is cheap (session metadata only); the atlas is rendered on first
+request and kept in a ``RenderCache``. Its key covers every input — session
+names, the chosen frames and their content hashes (or file versions for older
+sessions) — so editing, deleting or re-capturing frames yields a new key and
+the stale atlas is simply never asked for again.
+"""
+
+import io
+
+from PIL import Image, ImageOps
+
+from xeen import thumbs
+from xeen.archive import frame_source, frame_version, open_frame_image
+from xeen.render_cache import make_key
+from xeen.session_store import load_session_meta
+
+SPRITE_CELL = 160
+SPRITE_QUALITY = 72
+MAX_SESSIONS = 48
+MAX_PER_SESSION = 25
+
+
+def sprite_layout(names: list[str], per_session: int = 9) -> dict:
+    """Rozmieszczenie klatek w atlasie (wiersz na sesję) + klucz wersji atlasu.
+
+    Sessions that do not exist are skipped; missing frame files are left out
+    of the layout.
+    """
+    per_session = max(1, min(per_session, MAX_PER_SESSION))
+    sessions: dict[str, list[dict]] = {}
+    cells: list[list] = []
+    row = 0
+    for name in names[:MAX_SESSIONS]:
+        try:
+            frames = load_session_meta(name).get("frames", [])
+        except FileNotFoundError:
+            continue
+        entries = []
+        for frame in frames:
+            if len(entries) >= per_session:
+                break
+            version = frame_version(name, frame)
+            if version is None:
+                continue
+            col = len(entries)
+            entries.append({
+                "index": frame.get("index"),
+                "filename": frame["filename"],
+                "x": col * SPRITE_CELL,
+                "y": row * SPRITE_CELL,
+                "w": SPRITE_CELL,
+                "h": SPRITE_CELL,
+            })
+            cells.append([name, frame["filename"], version])
+        sessions[name] = entries
+        row += 1
+
+    return {
+        "key": make_key("sprite", list(sessions), per_session, SPRITE_CELL, SPRITE_QUALITY, cells),
+        "cell": SPRITE_CELL,
+        "width": per_session * SPRITE_CELL,
+        "height": max(1, row) * SPRITE_CELL,
+        "per_session": per_session,
+        "sessions": sessions,
+    }
+
+
+def _cell_image(name: str, filename: str) -> Image.Image:
+    """Źródło komórki: gotowa miniatura, a gdy jej brak — sama klatka."""
+    thumb = thumbs.thumb_name(filename)
+    if frame_source(name, thumb, "thumbs") is not None:
+        img = open_frame_image(name, thumb, "thumbs")
+    else:
+        thumbs.request_thumb(name, filename)
+        img = open_frame_image(name, filename)
+    return img.convert("RGB")
+
+
+def render_sprite(layout: dict) -> bytes:
+    """Zbuduj atlas WebP według ``sprite_layout`` (synchronicznie)."""
+    atlas = Image.new("RGB", (layout["width"], layout["height"]), (40, 42, 54))
+    size = (layout["cell"], layout["cell"])
+    for name, entries in layout["sessions"].items():
+        for e in entries:
+            try:
+                img = _cell_image(name, e["filename"])
+            except (FileNotFoundError, OSError):
+                continue
+            atlas.paste(ImageOps.fit(img, size, Image.LANCZOS), (e["x"], e["y"]))
+    buf = io.BytesIO()
+    atlas.save(buf, "WEBP", quality=SPRITE_QUALITY, method=4)
+    return buf.getvalue()
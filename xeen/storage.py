@@ -0,0 +1,199 @@
+"""Storage budget manager for derived artifacts.
+
+Derived files — crop previews, video-preview JPEGs, thumbnails, tiles,
+auto-crop leftovers, exports and render caches — can always be regenerated, so they are kept under a
+byte budget (``XEEN_STORAGE_BUDGET_MB``) and evicted least-recently-used first.
+Source frames (``frames/``, ``frames.xpk``, ``~/.xeen/blobs``) and session
+metadata are never touched.
+
+Last access is recorded in the file's atime (set explicitly with
+:func:`touch`, so it works on ``noatime`` mounts); a file's recency is
+``max(atime, mtime)``. Files younger than ``XEEN_STORAGE_MIN_AGE`` seconds are
+never evicted, so a preview cannot disappear between ``crop-preview`` and the
+export that reads it.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from xeen import config
+from xeen.config import get_data_dir
+
+# Katalogi pochodne wewnątrz sessions/<name>/
+SESSION_DERIVED_DIRS = ("preview", "thumbs", "auto_crop", "tiles", "variants")
+EXPORTS = "exports"
+CACHE = "cache"  # <data>/cache/<namespace>/ — cache'e renderów (xeen.render_cache)
+
+log = logging.getLogger("xeen.storage")
+
+# Nie zapisuj atime częściej niż raz na tyle sekund dla tego samego pliku
+_TOUCH_RESOLUTION = 60.0
+# Minimalny odstęp między automatycznymi przebiegami eviction
+_ENFORCE_INTERVAL = 60.0
+
+
+class DerivedFile(NamedTuple):
+    path: Path
+    size: int
+    last_access: float
+    category: str
+    session: str | None
+
+
+def touch(path: Path) -> None:
+    """Zapisz czas ostatniego dostępu do pliku pochodnego (atime, mtime bez zmian)."""
+    try:
+        st = path.stat()
+        now = time.time()
+        if now - st.st_atime > _TOUCH_RESOLUTION:
+            os.utime(path, ns=(int(now * 1e9), st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def _scan_dir(d: Path, category: str, session: str | None, out: list[DerivedFile]) -> None:
+    try:
+        entries = list(os.scandir(d))
+    except OSError:
+        return
+    for e in entries:
+        try:
+            if not e.is_file(follow_symlinks=False):
+                continue
+            st = e.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        out.append(DerivedFile(Path(e.path), st.st_size,
+                               max(st.st_atime, st.st_mtime), category, session))
+
+
+def scan_derived() -> list[DerivedFile]:
+    """Zbierz wszystkie pliki pochodne (sesje + exports)."""
+    data = get_data_dir()
+    files: list[DerivedFile] = []
+    try:
+        sessions = [e for e in os.scandir(data / "sessions") if e.is_dir()]
+    except OSError:
+        sessions = []
+    for s in sessions:
+        for folder in SESSION_DERIVED_DIRS:
+            _scan_dir(Path(s.path) / folder, folder, s.name, files)
+    _scan_dir(data / EXPORTS, EXPORTS, None, files)
+    try:
+        namespaces = [e.path for e in os.scandir(data / CACHE) if e.is_dir()]
+    except OSError:
+        namespaces = []
+    for ns in namespaces:
+        _scan_dir(Path(ns), CACHE, None, files)
+    return files
+
+
+def _source_bytes() -> dict:
+    """Rozmiar danych źródłowych (tylko do statystyk — nigdy nie są usuwane)."""
+    from xeen.archive import ARCHIVE_FILENAME
+
+    data = get_data_dir()
+    frames = archives = 0
+    try:
+        sessions = [e for e in os.scandir(data / "sessions") if e.is_dir()]
+    except OSError:
+        sessions = []
+    for s in sessions:
+        sdir = Path(s.path)
+        try:
+            archives += (sdir / ARCHIVE_FILENAME).stat().st_size
+        except OSError:
+            pass
+        try:
+            for e in os.scandir(sdir / "frames"):
+                try:
+                    frames += e.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+        except OSError:
+            pass
+    return {"frames_bytes": frames, "archives_bytes": archives}
+
+
+def storage_stats() -> dict:
+    """Statystyki użycia dysku: pliki pochodne per kategoria, źródła i budżet."""
+    files = scan_derived()
+    categories = {c: {"files": 0, "bytes": 0} for c in SESSION_DERIVED_DIRS + (EXPORTS, CACHE)}
+    for f in files:
+        categories[f.category]["files"] += 1
+        categories[f.category]["bytes"] += f.size
+    derived = sum(f.size for f in files)
+    budget = config.STORAGE_BUDGET_BYTES
+    return {
+        "budget_bytes": budget,
+        "derived_bytes": derived,
+        "derived_files": len(files),
+        "over_budget": bool(budget) and derived > budget,
+        "oldest_access": min((f.last_access for f in files), default=None),
+        "categories": categories,
+        "sources": _source_bytes(),
+    }
+
+
+def enforce_budget(budget: int | None = None, dry_run: bool = False,
+                   min_age: float | None = None) -> dict:
+    """Usuń najdawniej używane pliki pochodne, aż suma zmieści się w budżecie.
+
+    ``budget`` defaults to ``config.STORAGE_BUDGET_BYTES``; 0 means unlimited.
+    """
+    budget = config.STORAGE_BUDGET_BYTES if budget is None else budget
+    min_age = config.STORAGE_MIN_AGE if min_age is None else min_age
+    files = scan_derived()
+    total = sum(f.size for f in files)
+    result = {"budget_bytes": budget, "before_bytes": total, "evicted": 0,
+              "freed_bytes": 0, "dry_run": dry_run}
+    if budget and total > budget:
+        cutoff = time.time() - min_age
+        for f in sorted(files, key=lambda f: f.last_access):
+            if total <= budget:
+                break
+            if f.last_access > cutoff:
+                break  # reszta jest jeszcze młodsza
+            if not dry_run:
+                try:
+                    f.path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+            total -= f.size
+            result["evicted"] += 1
+            result["freed_bytes"] += f.size
+    result["after_bytes"] = total
+    return result
+
+
+_enforce_lock = threading.Lock()
+_last_enforce = 0.0
+
+
+def schedule_enforce() -> None:
+    """Po zapisie pliku pochodnego: uruchom eviction w tle (najwyżej raz na minutę)."""
+    global _last_enforce
+    if not config.STORAGE_BUDGET_BYTES:
+        return
+    now = time.monotonic()
+    with _enforce_lock:
+        if now - _last_enforce < _ENFORCE_INTERVAL:
+            return
+        _last_enforce = now
+    threading.Thread(target=_enforce_quietly, daemon=True, name="xeen-storage").start()
+
+
+def _enforce_quietly() -> None:
+    try:
+        result = enforce_budget()
+        if result["evicted"]:
+            log.info("storage: evicted %d derived files (%d bytes)",
+                     result["evicted"], result["freed_bytes"])
+    except Exception:
+        log.exception("storage: budget enforcement failed")
@@ -0,0 +1,81 @@
+"""Thumbnail service: background generation with single-flight deduplication.
+
+Thumbnails (320 px wide WebP in ``sessions/<name>/thumbs/``) are generated in
+a small worker pool — at ingest time for uploads, browser captures and
+bundle imports, and on demand for anything still missing. Concurrent requests
+for the same thumbnail share one job (one decode, one encode), and HTTP
+handlers wait for it only up to a deadline before answering with a
+placeholder, so a landing grid full of missing thumbs never blocks the event
+loop.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+from PIL import Image
+
+from xeen.archive import open_frame_image
+from xeen.session_store import session_dir
+from xeen.workers import single_flight
+
+THUMB_WIDTH = 320
+THUMB_QUALITY = 75
+THUMB_SUFFIX = "_thumb.webp"
+
+_placeholder: bytes | None = None
+
+
+def thumb_name(frame_filename: str) -> str:
+    return frame_filename.rsplit(".", 1)[0] + THUMB_SUFFIX
+
+
+def frame_name(thumb_filename: str) -> str:
+    return thumb_filename[: -len(THUMB_SUFFIX)] + ".png"
+
+
+def thumb_path(name: str, thumb_filename: str) -> Path:
+    return session_dir(name) / "thumbs" / thumb_filename
+
+
+def make_thumbnail(img: Image.Image) -> Image.Image:
+    """Zmniejsz klatkę do szerokości THUMB_WIDTH (zachowując proporcje)."""
+    th = max(1, int(img.height * (THUMB_WIDTH / img.width)))
+    return img.resize((THUMB_WIDTH, th), Image.LANCZOS, reducing_gap=3.0)
+
+
+def render_thumb(name: str, frame_filename: str) -> Path:
+    """Wygeneruj miniaturę klatki (synchronicznie). Raises FileNotFoundError."""
+    path = thumb_path(name, thumb_name(frame_filename))
+    buf = io.BytesIO()
+    with open_frame_image(name, frame_filename) as img:
+        make_thumbnail(img).save(buf, "WEBP", quality=THUMB_QUALITY)
+    path.parent.mkdir(exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(buf.getvalue())
+    os.replace(tmp, path)
+    return path
+
+
+def request_thumb(name: str, frame_filename: str) -> Future:
+    """Zleć miniaturę; równoległe żądania tej samej miniatury dostają ten sam Future."""
+    return single_flight(("thumb", name, frame_filename), render_thumb, name, frame_filename)
+
+
+def schedule_thumbs(name: str, frame_filenames) -> None:
+    """Po imporcie klatek: wygeneruj brakujące miniatury w tle (fire-and-forget)."""
+    for filename in frame_filenames:
+        if not thumb_path(name, thumb_name(filename)).exists():
+            request_thumb(name, filename)
+
+
+def placeholder_bytes() -> bytes:
+    """Neutralny szary placeholder WebP (16:9), zwracany zanim miniatura będzie gotowa."""
+    global _placeholder
+    if _placeholder is None:
+        buf = io.BytesIO()
+        Image.new("RGB", (THUMB_WIDTH, THUMB_WIDTH * 9 // 16), (40, 42, 54)).save(buf, "WEBP", quality=50)
+        _placeholder = buf.getvalue()
+    return _placeholder
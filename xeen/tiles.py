@@ -0,0 +1,126 @@
+"""Deep-zoom tile pyramid for frames.
+
+Level ``z = levels - 1`` is the full-resolution frame; every level below halves
+it, down to ``z = 0`` which fits in a single tile. Tiles are ``TILE_SIZE``
+squares (edge tiles are smaller), rendered lazily on first request straight
+from the source region (crop first, then downscale) and cached as WebP in the
+session's derived ``tiles/`` directory, so the storage budget manager can
+evict them like any other preview.
+
+Every tile is keyed by a short *version* derived from the source file's stat
+signature, which doubles as the ETag: a re-captured or unpacked frame gets new
+tiles, and unchanged ones revalidate with a bare ``304``.
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from xeen.archive import open_frame_image
+from xeen.session_store import session_dir
+
+TILE_SIZE = 256
+TILE_QUALITY = 80
+TILES_DIR = "tiles"
+
+# Kilka ostatnio zdekodowanych klatek — kafelki jednego widoku dzielą dekodowanie PNG
+_DECODED_MAX = 4
+_decoded: OrderedDict[tuple, Image.Image] = OrderedDict()
+_decoded_lock = threading.Lock()
+
+
+def tile_levels(width: int, height: int) -> int:
+    """Liczba poziomów piramidy: od jednego kafelka do pełnej rozdzielczości."""
+    levels = 1
+    while max(width, height) > TILE_SIZE << (levels - 1):
+        levels += 1
+    return levels
+
+
+def level_size(width: int, height: int, z: int, levels: int) -> tuple[int, int]:
+    scale = 1 << (levels - 1 - z)
+    return (width + scale - 1) // scale, (height + scale - 1) // scale
+
+
+def tile_etag(version: str, z: int, x: int, y: int) -> str:
+    return f'"{version}-{z}-{x}-{y}"'
+
+
+def _decode(name: str, filename: str, version: str) -> Image.Image:
+    key = (name, filename, version)
+    with _decoded_lock:
+        img = _decoded.get(key)
+        if img is not None:
+            _decoded.move_to_end(key)
+            return img
+    img = open_frame_image(name, filename)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    img.load()
+    with _decoded_lock:
+        _decoded[key] = img
+        while len(_decoded) > _DECODED_MAX:
+            _decoded.popitem(last=False)
+    return img
+
+
+def tile_info(name: str, filename: str) -> dict:
+    """Wymiary i liczba poziomów piramidy. Raises FileNotFoundError."""
+    with open_frame_image(name, filename) as img:
+        w, h = img.size
+    levels = tile_levels(w, h)
+    return {
+        "width": w,
+        "height": h,
+        "tile_size": TILE_SIZE,
+        "levels": levels,
+        "format": "webp",
+        "sizes": [level_size(w, h, z, levels) for z in range(levels)],
+    }
+
+
+def tile_path(name: str, filename: str, version: str, z: int, x: int, y: int) -> Path:
+    stem = filename.rsplit(".", 1)[0]
+    return session_dir(name) / TILES_DIR / f"{stem}.{version}.{z}.{x}.{y}.webp"
+
+
+def render_tile(name: str, filename: str, version: str, z: int, x: int, y: int) -> Path:
+    """Zwróć ścieżkę kafelka, renderując go przy pierwszym żądaniu.
+
+    Raises FileNotFoundError for missing frames and ValueError for
+    coordinates outside the pyramid.
+    """
+    path = tile_path(name, filename, version, z, x, y)
+    if path.exists():
+        return path
+
+    img = _decode(name, filename, version)
+    w, h = img.size
+    levels = tile_levels(w, h)
+    if not 0 <= z < levels:
+        raise ValueError(f"z must be in 0..{levels - 1}")
+    lw, lh = level_size(w, h, z, levels)
+    if not (0 <= x * TILE_SIZE < lw and 0 <= y * TILE_SIZE < lh):
+        raise ValueError("Tile outside of level bounds")
+
+    scale = 1 << (levels - 1 - z)
+    out_w = min(TILE_SIZE, lw - x * TILE_SIZE)
+    out_h = min(TILE_SIZE, lh - y * TILE_SIZE)
+    span = TILE_SIZE * scale
+    box = (x * span, y * span, min(w, (x + 1) * span), min(h, (y + 1) * span))
+    tile = img.crop(box)
+    if tile.size != (out_w, out_h):
+        tile = tile.resize((out_w, out_h), Image.LANCZOS, reducing_gap=3.0)
+
+    buf = io.BytesIO()
+    tile.save(buf, "WEBP", quality=TILE_QUALITY, method=4)
+    path.parent.mkdir(exist_ok=True)
+    # Plik pochodny — rename wystarcza (bez fsync), równoległe żądania nie widzą połówek
+    tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(buf.getvalue())
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,135 @@
+"""Content-negotiated modern-format variants (AVIF / WebP) of served images.
+
+Frames and previews are stored as PNG/JPEG — the lossless originals are what
+exports read and they are never modified. For display, clients that list
+``image/avif`` or ``image/webp`` in ``Accept`` get a lossy variant instead,
+typically 3–10× smaller for screen recordings.
+
+Variants are encoded once, in the shared background pool (single-flight per
+variant), into the session's derived ``variants/`` directory, so the storage
+budget manager can evict them like any other preview. Until a variant exists
+the original is served, so negotiation never adds latency. If a variant turns
+out no smaller than its original, an empty marker file is written and the
+original keeps being served for that version.
+
+Every variant file name carries the source *version* (its stat signature):
+a re-captured or unpacked frame simply gets new variants.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+from PIL import Image, features
+
+from xeen.archive import frame_source, open_frame_image, source_version
+from xeen.session_store import session_dir
+from xeen.workers import single_flight
+
+VARIANTS_DIR = "variants"
+
+AVIF = "image/avif"
+WEBP = "image/webp"
+
+# mime → (format Pillow, rozszerzenie, parametry kodera)
+FORMATS = {
+    AVIF: ("AVIF", "avif", {"quality": 60, "speed": 8}),
+    WEBP: ("WEBP", "webp", {"quality": 82, "method": 4}),
+}
+
+_avif: bool | None = None
+
+
+def avif_supported() -> bool:
+    """Czy Pillow potrafi zapisywać AVIF (wbudowany od Pillow 11.3, opcjonalny)."""
+    global _avif
+    if _avif is None:
+        try:
+            _avif = bool(features.check_module("avif"))
+        except (ValueError, KeyError):
+            _avif = False
+    return _avif
+
+
+def negotiate(accept: str | None, source_type: str | None = None) -> str | None:
+    """Wybierz format wariantu z nagłówka Accept; None = serwuj oryginał.
+
+    Only explicitly listed types with ``q > 0`` count — ``*/*`` and
+    ``image/*`` keep the original, so plain HTTP clients and downloads get
+    exactly what is stored. AVIF wins over WebP at equal ``q``.
+    """
+    if not accept:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept.lower().split(","):
+        mime, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        weights[mime] = q
+    candidates = [m for m in (AVIF, WEBP)
+                  if weights.get(m, 0) > 0 and m != source_type
+                  and (m != AVIF or avif_supported())]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda m: weights[m])
+
+
+def variant_path(name: str, folder: str, filename: str, version: str, mime: str) -> Path:
+    stem = filename.rsplit(".", 1)[0]
+    return session_dir(name) / VARIANTS_DIR / f"{folder}__{stem}.{version}.{FORMATS[mime][1]}"
+
+
+def encode(img: Image.Image, mime: str, quality: int | None = None) -> bytes:
+    fmt, _, params = FORMATS[mime]
+    if quality is not None:
+        params = {**params, "quality": quality}
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def render_variant(name: str, folder: str, filename: str, version: str, mime: str) -> Path:
+    """Zakoduj wariant (synchronicznie). Pusty plik = wariant nieopłacalny."""
+    path = variant_path(name, folder, filename, version, mime)
+    src = frame_source(name, filename, folder)
+    if src is None:
+        raise FileNotFoundError(f"{name}/{folder}/{filename}")
+    original_size = src.stat().st_size if isinstance(src, Path) else len(src)
+    with open_frame_image(name, filename, folder) as img:
+        data = encode(img, mime)
+    if len(data) >= original_size:
+        data = b""
+    path.parent.mkdir(exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return path
+
+
+def request_variant(name: str, folder: str, filename: str, version: str, mime: str) -> Future:
+    return single_flight(("variant", name, folder, filename, version, mime),
+                         render_variant, name, folder, filename, version, mime)
+
+
+def lookup(name: str, folder: str, filename: str, mime: str) -> Path | None:
+    """Gotowy wariant albo None (wtedy zleca jego wygenerowanie w tle).
+
+    Raises FileNotFoundError when the source itself does not exist.
+    """
+    version = source_version(name, filename, folder)
+    path = variant_path(name, folder, filename, version, mime)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        request_variant(name, folder, filename, version, mime)
+        return None
+    return path if size else None
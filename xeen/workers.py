@@ -0,0 +1,45 @@
+"""Shared background worker pool with single-flight job deduplication.
+
+Used for derived-image work that must never run on the event loop
+(thumbnails, modern-format variants). ``single_flight`` returns the already
+running Future when the same key is submitted again, so N concurrent requests
+for one artifact cost one decode and one encode.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable
+
+from xeen import config
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_inflight: dict[Hashable, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def background_pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.THUMB_WORKERS,
+                                           thread_name_prefix="xeen-worker")
+        return _executor
+
+
+def single_flight(key: Hashable, fn: Callable, *args) -> Future:
+    """Zleć ``fn(*args)``; dopóki zadanie trwa, ten sam klucz zwraca ten sam Future."""
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        if fut is not None:
+            return fut
+        fut = background_pool().submit(fn, *args)
+        _inflight[key] = fut
+
+    def _done(_):
+        with _inflight_lock:
+            if _inflight.get(key) is fut:
+                del _inflight[key]
+
+    fut.add_done_callback(_done)
+    return fut